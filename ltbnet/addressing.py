@@ -0,0 +1,178 @@
+"""Hierarchical IP address planning with one subnet per Region"""
+
+import math
+import bisect
+import ipaddress
+
+DEFAULT_SUPERNET = '192.168.0.0/16'
+
+# largest prefix length given to a group when the prefix length is sized automatically
+MAX_PREFIXLEN = 24
+
+# prefix length of the point-to-point subnets of links between routers
+TRANSIT_PREFIXLEN = 30
+
+
+class AddressPlan(object):
+    """
+    Address plan allocating one subnet of a supernet to each group of hosts
+
+    The first host address of each subnet is reserved for a gateway. Explicit IPs are kept. A group whose explicit
+    IPs fall in a free subnet gets that subnet. Explicit IPs outside the subnet of their group get its prefix length
+    and are listed in `outside`.
+    """
+    def __init__(self, supernet=DEFAULT_SUPERNET, prefixlen=None):
+        self.supernet = ipaddress.ip_network(supernet)
+        self.prefixlen = prefixlen
+
+        if prefixlen is not None and not self.supernet.prefixlen <= prefixlen <= self.supernet.max_prefixlen:
+            raise ValueError('Prefix length /{p} does not fit in supernet {s}'.format(p=prefixlen, s=self.supernet))
+
+        self.groups = []  # group names in order
+        self.hosts = {}  # group -> list of (key, explicit interface or None)
+
+        self.subnets = {}  # group -> subnet
+        self.addresses = {}  # host key -> (ip, prefixlen)
+        self.transits = {}  # transit key -> subnet
+        self.outside = {}  # group -> host keys of explicit IPs outside its subnet
+
+        self._allocated = []  # sorted (first, last) integer ranges of allocated subnets
+        self._cursor = int(self.supernet.network_address)
+
+    def add_group(self, group, hosts):
+        """Add a group of hosts as a list of (key, explicit IP or None). IPs may have a /prefixlen suffix."""
+        if group not in self.hosts:
+            self.groups.append(group)
+            self.hosts[group] = []
+
+        for key, ip in hosts:
+            intf = ipaddress.ip_interface(ip) if ip else None
+            self.hosts[group].append((key, intf))
+
+    def solve(self):
+        """Allocate the subnets and the addresses of all groups. Return self."""
+        # explicit IPs by integer value, for locating those owned by other groups
+        owners = {}
+        for group in self.groups:
+            for key, intf in self.hosts[group]:
+                if intf is not None:
+                    owners[int(intf.ip)] = group
+        explicit = sorted(owners)
+
+        def foreign(subnet, group):
+            lo = bisect.bisect_left(explicit, int(subnet.network_address))
+            hi = bisect.bisect_right(explicit, int(subnet.broadcast_address))
+            return any(owners[ip] != group for ip in explicit[lo:hi])
+
+        for group in self.groups:
+            hosts = self.hosts[group]
+            prefixlen = self.group_prefixlen(len(hosts))
+
+            subnet = None
+            hint = next((intf.ip for _, intf in hosts if intf is not None and intf.ip in self.supernet), None)
+            if hint is not None:
+                candidate = ipaddress.ip_network('{}/{}'.format(hint, prefixlen), strict=False)
+                if self.is_free(candidate) and not foreign(candidate, group):
+                    subnet = candidate
+
+            while subnet is None:
+                candidate = self.next_free(prefixlen)
+                if not foreign(candidate, group):
+                    subnet = candidate
+                self._cursor = int(candidate.broadcast_address) + 1
+
+            self.reserve(subnet)
+            self.subnets[group] = subnet
+            self.assign(group, subnet, owners)
+
+        return self
+
+    def group_prefixlen(self, n_hosts):
+        """Return the prefix length of a group of `n_hosts` hosts"""
+        # network, broadcast and gateway addresses
+        bits = max(2, int(math.ceil(math.log2(n_hosts + 3))))
+        needed = self.supernet.max_prefixlen - bits
+
+        if self.prefixlen is None:
+            return max(self.supernet.prefixlen, min(MAX_PREFIXLEN, needed))
+        if self.prefixlen > needed:
+            raise ValueError('Subnets of prefix length /{p} cannot hold {n} hosts'.format(p=self.prefixlen,
+                                                                                          n=n_hosts))
+        return self.prefixlen
+
+    def is_free(self, subnet):
+        """Check if `subnet` is in the supernet and does not overlap allocated subnets"""
+        if not subnet.subnet_of(self.supernet):
+            return False
+        first, last = int(subnet.network_address), int(subnet.broadcast_address)
+        pos = bisect.bisect_left(self._allocated, (first, last))
+        if pos > 0 and self._allocated[pos - 1][1] >= first:
+            return False
+        if pos < len(self._allocated) and self._allocated[pos][0] <= last:
+            return False
+        return True
+
+    def next_free(self, prefixlen):
+        """Return the next free subnet of `prefixlen` after the cursor"""
+        size = 2 ** (self.supernet.max_prefixlen - prefixlen)
+        start = self._cursor
+        end = int(self.supernet.broadcast_address)
+
+        while True:
+            start = -(-start // size) * size  # align up
+            if start + size - 1 > end:
+                raise ValueError('Supernet {s} has no free /{p} subnet left'.format(s=self.supernet, p=prefixlen))
+
+            subnet = ipaddress.ip_network((start, prefixlen))
+            if self.is_free(subnet):
+                return subnet
+            start += size
+
+    def reserve(self, subnet):
+        bisect.insort(self._allocated, (int(subnet.network_address), int(subnet.broadcast_address)))
+
+    def assign(self, group, subnet, owners):
+        """Assign addresses to the hosts of `group` in `subnet`, skipping the gateway and explicit IPs"""
+        gateway = self.gateway(group)
+        free = (ip for ip in subnet.hosts()
+                if ip != gateway and int(ip) not in owners)
+
+        for key, intf in self.hosts[group]:
+            if intf is None:
+                ip = next(free, None)
+                if ip is None:
+                    raise ValueError('Subnet {s} of group <{g}> is full'.format(s=subnet, g=group))
+                self.addresses[key] = (str(ip), subnet.prefixlen)
+            elif intf.network.prefixlen != intf.max_prefixlen:
+                # explicit prefix length
+                self.addresses[key] = (str(intf.ip), intf.network.prefixlen)
+            else:
+                self.addresses[key] = (str(intf.ip), subnet.prefixlen)
+                if intf.ip not in subnet:
+                    self.outside.setdefault(group, []).append(key)
+
+    def gateway(self, group):
+        """Return the gateway address reserved in the subnet of `group`"""
+        subnet = self.subnets[group]
+        return next(iter(subnet.hosts()))
+
+    def transit(self, key):
+        """Allocate a point-to-point subnet after the solved groups. Return the two addresses as (ip, prefixlen)."""
+        subnet = self.next_free(TRANSIT_PREFIXLEN)
+        self._cursor = int(subnet.broadcast_address) + 1
+        self.reserve(subnet)
+        self.transits[key] = subnet
+
+        first, second = list(subnet.hosts())[:2]
+        return (str(first), subnet.prefixlen), (str(second), subnet.prefixlen)
+
+    def routes(self, group, routed=False):
+        """
+        Return routes of the hosts in `group` as a list of (destination, gateway or None for on-link)
+
+        Hosts of routed groups reach their own subnet on-link and the rest of the supernet through the gateway.
+        Hosts of other groups need no routes: they reach the subnet of their address on-link.
+        """
+        if routed:
+            return [(str(self.subnets[group]), None), (str(self.supernet), str(self.gateway(group)))]
+        return []
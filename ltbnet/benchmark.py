@@ -0,0 +1,167 @@
+"""
+Offline benchmark of the LTBNet config-to-topology path
+
+The benchmark times parsing, `Network.setup`, building the network with the Mininet stand-in and
+`Network.dump_sw_port_node` on the bundled configs and on generated ones. It runs on ordinary Linux hosts without
+root or Mininet, stores the results in JSON and reports phases that became slower than the previous results.
+"""
+
+import os
+import gc
+import sys
+import json
+import glob
+import time
+import socket
+import argparse
+import tempfile
+
+from ltbnet.network import Network
+from ltbnet.parser import iter_config
+from ltbnet.generator import generate
+from ltbnet.profiler import StartupProfiler
+from ltbnet import standin
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+# case name -> config file in `DATA_DIR` or keyword arguments of `ltbnet.generator.generate`
+CASES = {'config_5pmu': 'config_5pmu.csv',
+         'config_wecc_fixidx': 'config_wecc_fixidx.csv',
+         'synthetic_1k': {'n_region': 10, 'n_switch': 2, 'n_pmu': 50},
+         'synthetic_10k': {'n_region': 100, 'n_switch': 2, 'n_pmu': 50},
+         }
+
+
+def case_rows(case):
+    """Return a function creating the row iterator of a benchmark case, or None if its config file is missing"""
+    source = CASES[case]
+    if isinstance(source, dict):
+        return lambda: generate(**source)
+
+    path = os.path.join(DATA_DIR, source)
+    if not os.path.isfile(path):
+        return None
+    return lambda: iter_config(path)
+
+
+def run_case(case, repeat=3):
+    """
+    Time the topology build of a benchmark case `repeat` times
+
+    Returns
+    -------
+    dict
+        minimum and median wall time of each phase, and the network size
+    """
+    rows = case_rows(case)
+    if rows is None:
+        return None
+
+    walls = {}
+    size = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(repeat):
+            gc.collect()
+            profiler = StartupProfiler()
+
+            with profiler.phase('total'):
+                network = Network().setup(rows(), profiler)
+                with profiler.phase('mininet'):
+                    net = standin.Mininet(topo=network)
+                with profiler.phase('dump_sw_port_node'):
+                    network.dump_sw_port_node(net, os.path.join(tmp, 'sw_port_node.csv'))
+
+            for r in profiler.records:
+                walls.setdefault(r['phase'].split('.')[-1] if r['component'] is None else r['phase'],
+                                 []).append(r['wall'])
+
+            size = {'PMU': network.PMU.n, 'Switch': network.Switch.n, 'Link': network.Link.n}
+
+    phases = {}
+    for phase, values in walls.items():
+        values = sorted(values)
+        phases[phase] = {'min': values[0], 'median': values[len(values) // 2]}
+
+    return {'size': size, 'repeat': repeat, 'phases': phases}
+
+
+def compare(results, baseline, threshold=1.25, floor=0.01):
+    """Return (case, phase, baseline, current) for phases whose minimum wall time grew by more than `threshold`
+    times. Phases faster than `floor` seconds in both runs are ignored."""
+    slower = []
+    for case, result in results['cases'].items():
+        base = baseline.get('cases', {}).get(case)
+        if not result or not base:
+            continue
+        for phase, value in result['phases'].items():
+            old = base['phases'].get(phase)
+            if old is None or max(old['min'], value['min']) < floor:
+                continue
+            if value['min'] > old['min'] * threshold:
+                slower.append((case, phase, old['min'], value['min']))
+    return slower
+
+
+def latest_results(results_dir, exclude=None):
+    """Return the path of the latest stored results in `results_dir` other than `exclude`"""
+    files = sorted(f for f in glob.glob(os.path.join(results_dir, '*.json')) if f != exclude)
+    return files[-1] if files else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark building LTBNet topologies offline')
+    parser.add_argument('cases', nargs='*', default=list(CASES),
+                        help='benchmark cases (default: all). Choices: ' + ', '.join(CASES))
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions per case')
+    parser.add_argument('--results_dir', default=os.path.join(os.path.expanduser('~'), '.cache', 'ltbnet', 'bench'),
+                        help='directory to store results in (default: %(default)s)')
+    parser.add_argument('--baseline', help='results file to compare with (default: the latest stored results)')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio reported as a regression (default: %(default)s)')
+
+    args = parser.parse_args()
+
+    for case in args.cases:
+        if case not in CASES:
+            parser.error('unknown case <{}>'.format(case))
+
+    results = {'host': socket.gethostname(),
+               'time': time.time(),
+               'python': sys.version.split()[0],
+               'cases': {}}
+
+    for case in args.cases:
+        result = run_case(case, args.repeat)
+        results['cases'][case] = result
+        if result is None:
+            print('{:<20} skipped: config file not found'.format(case))
+            continue
+        phases = result['phases']
+        print('{c:<20} {n:>6} PMUs  total {t:8.3f} s  setup {s:8.3f} s  mininet {m:8.3f} s'.format(
+            c=case, n=result['size']['PMU'], t=phases['total']['min'],
+            s=phases['total']['min'] - phases['mininet']['min'] - phases['dump_sw_port_node']['min'],
+            m=phases['mininet']['min']))
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    fname = os.path.join(args.results_dir, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    baseline = args.baseline or latest_results(args.results_dir)
+
+    with open(fname, 'w') as f:
+        json.dump(results, f, indent=4)
+    print('Results stored in {}'.format(fname))
+
+    if not baseline:
+        return
+
+    with open(baseline) as f:
+        slower = compare(results, json.load(f), args.threshold)
+
+    for case, phase, old, new in slower:
+        print('Regression: {c} {p} {o:.4f} s -> {n:.4f} s'.format(c=case, p=phase, o=old, n=new))
+    if slower:
+        sys.exit(1)
+    print('No regression against {}'.format(baseline))
+
+
+if __name__ == '__main__':
+    main()
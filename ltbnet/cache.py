@@ -0,0 +1,159 @@
+"""Compiled topology cache of set-up Network objects"""
+
+import os
+import glob
+import pickle
+import hashlib
+
+from ltbnet.utils import log
+from ltbnet.network import Network, HAVE_MININET
+from ltbnet.addressing import DEFAULT_SUPERNET
+from ltbnet.parser import iter_config
+from ltbnet.profiler import NULL_PROFILER
+
+CACHE_VERSION = 1
+
+
+
+def default_cache_dir():
+    """Return the cache directory from `LTBNET_CACHE_DIR` or `~/.cache/ltbnet`"""
+    return os.environ.get('LTBNET_CACHE_DIR',
+                          os.path.join(os.path.expanduser('~'), '.cache', 'ltbnet'))
+
+
+def mininet_version():
+    """Return the version of the installed Mininet, or an empty string without Mininet"""
+    try:
+        from mininet.net import VERSION
+    except ImportError:
+        return ''
+    return VERSION
+
+
+def config_hash(file, path='', options=''):
+    """Return the content hash of a config file combined with the cache version, the sources of the whole LTBNet
+    package, the Mininet version and the setup `options` string"""
+    h = hashlib.sha256()
+    h.update(str(CACHE_VERSION).encode())
+    h.update(options.encode())
+    h.update(mininet_version().encode())
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(glob.glob(os.path.join(here, '*.py'))):
+        h.update(os.path.basename(name).encode())
+        with open(name, 'rb') as f:
+            h.update(f.read())
+
+    with open(os.path.join(path, file), 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def cache_prefix(file, path='', options=''):
+    """Return the file name prefix of the caches of a config file with the setup `options`. It holds the base name
+    and a hash of the absolute path and of the options, so that configs of the same name and runs with other options
+    keep their own caches."""
+    key = hashlib.sha256('{p}\0{o}'.format(p=os.path.abspath(os.path.join(path, file)), o=options).encode())
+    return '{b}-{k}-'.format(b=os.path.basename(file), k=key.hexdigest()[:8])
+
+
+def cache_file(file, path='', cache_dir=None, digest=None, options=''):
+    """Return the path of the cache file for a config file"""
+    cache_dir = cache_dir or default_cache_dir()
+    digest = digest or config_hash(file, path, options)
+    return os.path.join(cache_dir, '{p}{h}.pickle'.format(p=cache_prefix(file, path, options), h=digest[:16]))
+
+
+def load_network(file, path='', cache_dir=None, digest=None, options=''):
+    """Load the set-up Network of a config file from the cache. Return None if not cached."""
+    fname = cache_file(file, path, cache_dir, digest, options)
+    if not os.path.isfile(fname):
+        return None
+
+    try:
+        with open(fname, 'rb') as f:
+            network = pickle.load(f)
+    except Exception as e:
+        log.warn('*** Ignoring unreadable topology cache {f}: {e}\n'.format(f=fname, e=e))
+        return None
+
+    if not isinstance(network, Network):
+        return None
+
+    log.debug('*** Loaded topology cache {}\n'.format(fname))
+    return network
+
+
+def save_network(network, file, path='', cache_dir=None, digest=None, options=''):
+    """Save a set-up Network to the cache and remove stale caches of the same config file and options"""
+    fname = cache_file(file, path, cache_dir, digest, options)
+    cache_dir = os.path.dirname(fname)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+
+        prefix = cache_prefix(file, path, options)
+        for old in glob.glob(os.path.join(cache_dir, glob.escape(prefix) + '*.pickle')):
+            if old != fname and len(os.path.basename(old)) == len(os.path.basename(fname)):
+                os.remove(old)
+
+        # write to a temporary file first so that readers never see a partial cache
+        tmp = fname + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(network, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fname)
+    except OSError as e:
+        log.warn('*** Cannot write topology cache {f}: {e}\n'.format(f=fname, e=e))
+        return None
+
+    log.debug('*** Saved topology cache {}\n'.format(fname))
+    return fname
+
+
+def setup_network(file, path='', use_cache=True, cache_dir=None, profiler=NULL_PROFILER,
+                  supernet=DEFAULT_SUPERNET, prefixlen=None):
+    """
+    Return a set-up Network for a config file, loading it from the cache when the file is unchanged
+
+    Without Mininet, the network is set up without topology and the cache is not used.
+
+    Parameters
+    ----------
+    file : str
+        config file name
+    path : str
+        directory of the config file
+    use_cache : bool
+        load from and save to the cache
+    cache_dir : str
+        cache directory. Defaults to `default_cache_dir()`
+    profiler : StartupProfiler
+        profiler of the setup phases
+    supernet : str
+        supernet of the Region subnets
+    prefixlen : int
+        prefix length of the Region subnets. Sized by the host count if None
+
+    Returns
+    -------
+    Network
+    """
+    if not HAVE_MININET:
+        return Network(supernet, prefixlen).setup(iter_config(file, path), profiler, topology=False)
+
+    if not use_cache:
+        return Network(supernet, prefixlen).setup(iter_config(file, path), profiler)
+
+    with profiler.phase('load_cache'):
+        options = '{}/{}'.format(supernet, prefixlen)
+        digest = config_hash(file, path, options=options)
+        network = load_network(file, path, cache_dir, digest, options)
+
+    if network is None:
+        network = Network(supernet, prefixlen).setup(iter_config(file, path), profiler)
+        with profiler.phase('save_cache'):
+            save_network(network, file, path, cache_dir, digest, options)
+
+    return network
@@ -0,0 +1,229 @@
+"""
+Link capacity planning for the synchrophasor streams of the PMUs
+
+Every PMU streams C37.118 data frames to the PDC of its Region and to any extra subscribing PDCs over the
+shortest-delay path. The bytes per second of a stream follow from the frame layout declared in
+`MiniPMU.config_pmu` and the reporting rate. The loads of all streams to one PDC are summed up its shortest-delay
+tree from the leaves to the root with NumPy, separately for each direction of each link.
+"""
+
+import json
+
+import numpy as np
+
+from ltbnet.latency import LinkGraph
+
+# reporting rate declared by `MiniPMU.config_pmu` and the rates checked by default
+DATA_RATE = 30
+RATES = (30, 60, 120)
+
+# utilization above which a link is flagged
+MAX_UTILIZATION = 0.8
+
+# per-frame overhead of one data frame per TCP segment: Ethernet header 14, IPv4 header 20 and TCP header with the
+# timestamp option 32 bytes
+HEADER_BYTES = 14 + 20 + 32
+
+
+def data_frame_size(phasor_num=1, analog_num=1, digital_num=1, num_pmu=1, floating=True):
+    """
+    Return the size in bytes of a C37.118.2 data frame
+
+    The defaults match the configuration frame of `MiniPMU.config_pmu` for one bus: one PMU with one phasor, one
+    analog value and one digital status word, all in floating point. A MiniPMU with several buses sends one PMU
+    block per bus, with `num_pmu` the number of buses.
+    """
+    # SYNC, FRAMESIZE, IDCODE, SOC, FRACSEC and CHK
+    common = 2 + 2 + 2 + 4 + 4 + 2
+
+    phasor = 8 if floating else 4
+    value = 4 if floating else 2
+    # STAT, phasors, FREQ, DFREQ, analog values and digital words
+    per_pmu = 2 + phasor * phasor_num + 2 * value + value * analog_num + 2 * digital_num
+
+    return common + num_pmu * per_pmu
+
+
+def stream_bps(rate=DATA_RATE, frame_size=None):
+    """Return the bits per second of one PMU stream including the protocol headers"""
+    frame_size = frame_size if frame_size is not None else data_frame_size()
+    return (frame_size + HEADER_BYTES) * 8 * rate
+
+
+def parse_subscriptions(specs):
+    """
+    Parse subscriptions given as `PDC=SOURCE[,SOURCE...]` strings into a dict of PDC -> list of sources
+
+    A source is a PMU idx, a Region name or `*` for all PMUs.
+    """
+    out = {}
+    for spec in specs or ():
+        pdc, _, sources = spec.partition('=')
+        if not pdc or not sources:
+            raise ValueError('Invalid subscription <{}>. Expected PDC=SOURCE[,SOURCE...]'.format(spec))
+        out.setdefault(pdc.strip(), []).extend(s.strip() for s in sources.split(',') if s.strip())
+    return out
+
+
+def streams(network, subscriptions=None):
+    """
+    Return the PMU streams as a dict of PDC idx -> set of PMU idx
+
+    Each PMU streams to the PDCs of its Region and to the PDCs subscribing to it, its Region or `*`.
+    """
+    pmu, pdc = network.PMU, network.PDC
+
+    out = {idx: set() for idx in pdc.idx}
+    by_region = {}
+    for idx, region in zip(pmu.idx, pmu.region):
+        by_region.setdefault(region, []).append(idx)
+
+    for idx, region in zip(pdc.idx, pdc.region):
+        out[idx].update(by_region.get(region, ()))
+
+    for idx, sources in (subscriptions or {}).items():
+        if idx not in out:
+            raise ValueError('Subscriber <{}> is not a PDC'.format(idx))
+        for source in sources:
+            if source == '*':
+                out[idx].update(pmu.idx)
+            elif source in by_region:
+                out[idx].update(by_region[source])
+            elif pmu.lookup_index(source) >= 0:
+                out[idx].add(source)
+            else:
+                raise ValueError('Subscription source <{}> is neither a PMU nor a Region'.format(source))
+
+    return out
+
+
+def plan(network, subscriptions=None, rates=RATES, max_utilization=MAX_UTILIZATION, graph=None):
+    """
+    Route every PMU stream to its PDCs and add up the load of each link
+
+    Parameters
+    ----------
+    network : Network
+        set-up network
+    subscriptions : dict
+        extra PDC -> list of sources as returned by `parse_subscriptions`
+    rates : tuple of int
+        reporting rates in frames per second to evaluate
+    max_utilization : float
+        utilization above which a link is flagged
+    graph : LinkGraph
+        link graph of `network`, built if None
+
+    Returns
+    -------
+    dict
+        report with the per-stream rates, a `links` list sorted by the rate at which each link saturates, and
+        the PMU streams that cannot reach a PDC
+    """
+    graph = graph or LinkGraph(network)
+    n_edge = len(graph.link)
+
+    # number of streams over each edge in the directions u -> v and v -> u
+    forward = np.zeros(n_edge)
+    backward = np.zeros(n_edge)
+    unreachable = []
+
+    for pdc_idx, pmus in streams(network, subscriptions).items():
+        if not pmus:
+            continue
+        parent, edge, levels = graph.tree(graph.index[pdc_idx])
+
+        count = np.zeros(graph.n)
+        targets = np.array([graph.index[idx] for idx in sorted(pmus)], dtype=int)
+        reached = (parent[targets] >= 0)
+        np.add.at(count, targets[reached], 1.)
+        unreachable.extend((idx, pdc_idx) for idx, ok in zip(sorted(pmus), reached.tolist()) if not ok)
+
+        # streams flow from the leaves to the PDC at the root
+        for level in reversed(levels):
+            p, e, c = parent[level], edge[level], count[level]
+            np.add.at(count, p, c)
+            up = graph.u[e] == level
+            np.add.at(forward, e[up], c[up])
+            np.add.at(backward, e[~up], c[~up])
+
+    load = np.maximum(forward, backward)  # streams in the busier direction
+    bps = {rate: stream_bps(rate) for rate in rates}
+    capacity = graph.bw * 1e6
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        saturation = np.where(load > 0, capacity / (load * stream_bps(1)), np.inf)
+
+    order = np.lexsort((-load, saturation))
+    links = []
+    for e in order.tolist():
+        if not load[e]:
+            continue
+        item = {'link': graph.link[e],
+                'from': graph.nodes[graph.u[e]],
+                'to': graph.nodes[graph.v[e]],
+                'bw_mbps': float(graph.bw[e]) if np.isfinite(graph.bw[e]) else None,
+                'streams': int(load[e]),
+                'streams_forward': int(forward[e]),
+                'streams_backward': int(backward[e]),
+                'saturation_fps': round(float(saturation[e]), 1) if np.isfinite(saturation[e]) else None,
+                'load_mbps': {},
+                'utilization': {},
+                'flagged': [],
+                }
+        for rate in rates:
+            mbps = load[e] * bps[rate] / 1e6
+            utilization = mbps / graph.bw[e]
+            item['load_mbps'][rate] = round(float(mbps), 4)
+            item['utilization'][rate] = round(float(utilization), 4)
+            if utilization > max_utilization:
+                item['flagged'].append(rate)
+        links.append(item)
+
+    return {'frame_bytes': data_frame_size(),
+            'header_bytes': HEADER_BYTES,
+            'stream_kbps': {rate: round(bps[rate] / 1e3, 3) for rate in rates},
+            'rates': list(rates),
+            'max_utilization': max_utilization,
+            'links': links,
+            'unreachable': [{'pmu': p, 'pdc': c} for p, c in unreachable],
+            }
+
+
+def format_table(report, limit=None):
+    """Return the links of a capacity plan as a text table, at most `limit` of them"""
+    rates = report['rates']
+    header = '{:<20} {:<12} {:<12} {:>9} {:>7} {:>9}'.format(
+        'Link', 'From', 'To', 'BW(Mbps)', 'Streams', 'Max fps')
+    header += ''.join(' {:>9}'.format('{}fps'.format(rate)) for rate in rates)
+    lines = ['Stream: {f} B frame + {h} B headers, {k}'.format(
+        f=report['frame_bytes'], h=report['header_bytes'],
+        k=', '.join('{} kbps at {} fps'.format(report['stream_kbps'][r], r) for r in rates)),
+        '', header, '-' * len(header)]
+
+    for item in report['links'][:limit]:
+        line = '{:<20} {:<12} {:<12} {:>9} {:>7} {:>9}'.format(
+            item['link'], item['from'], item['to'],
+            '-' if item['bw_mbps'] is None else '{:.1f}'.format(item['bw_mbps']), item['streams'],
+            '-' if item['saturation_fps'] is None else '{:.0f}'.format(item['saturation_fps']))
+        for rate in rates:
+            cell = '{:.0%}'.format(item['utilization'][rate])
+            line += ' {:>9}'.format(cell + ('!' if rate in item['flagged'] else ''))
+        lines.append(line)
+
+    if limit is not None and len(report['links']) > limit:
+        lines.append('... {} more links'.format(len(report['links']) - limit))
+
+    flagged = {rate: sum(rate in item['flagged'] for item in report['links']) for rate in rates}
+    lines.append('')
+    lines.append('Links over {u:.0%} utilization: {f}'.format(
+        u=report['max_utilization'], f=', '.join('{} at {} fps'.format(flagged[r], r) for r in rates)))
+    if report['unreachable']:
+        lines.append('{} PMU streams cannot reach their PDC'.format(len(report['unreachable'])))
+    return '\n'.join(lines)
+
+
+def dump_json(report, path):
+    """Write a capacity plan to a JSON file"""
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
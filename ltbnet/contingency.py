@@ -0,0 +1,264 @@
+"""
+Single link and switch outage (N-1) analysis of the PMU streams
+
+The PMU streams are the PMU-PDC pairs of the capacity planner. Bridges and articulation points of the link graph
+are found with Tarjan's algorithm. Each outage is then evaluated incrementally on the shortest-delay trees of the
+PDCs: only the streams whose path crosses the outaged element are affected. Behind a bridge they are stranded.
+Otherwise the cut-off subtree is re-attached with a Dijkstra search seeded from its surviving boundary, and the
+other trees and nodes are left as they are.
+"""
+
+import json
+import time
+import heapq
+
+from ltbnet.latency import LinkGraph
+from ltbnet.capacity import streams
+
+
+def bridges_and_articulation_points(graph):
+    """Return the bridge edges and the articulation point nodes of a LinkGraph as two sets of positions"""
+    n = graph.n
+    disc = [-1] * n
+    low = [0] * n
+    bridges, points = set(), set()
+    timer = 0
+
+    for root in range(n):
+        if disc[root] >= 0:
+            continue
+        disc[root] = low[root] = timer
+        timer += 1
+        root_children = 0
+        stack = [(root, -1, iter(graph.adjacency[root]))]
+
+        while stack:
+            u, parent_edge, neighbors = stack[-1]
+            for v, e in neighbors:
+                if e == parent_edge:
+                    continue
+                if disc[v] < 0:
+                    disc[v] = low[v] = timer
+                    timer += 1
+                    if u == root:
+                        root_children += 1
+                    stack.append((v, e, iter(graph.adjacency[v])))
+                    break
+                low[u] = min(low[u], disc[v])
+            else:
+                stack.pop()
+                if not stack:
+                    continue
+                p = stack[-1][0]
+                low[p] = min(low[p], low[u])
+                if low[u] > disc[p]:
+                    bridges.add(parent_edge)
+                if p != root and low[u] >= disc[p]:
+                    points.add(p)
+
+        if root_children > 1:
+            points.add(root)
+
+    return bridges, points
+
+
+class StreamTree(object):
+    """Shortest-delay tree of one PDC with the PMU streams it receives"""
+    def __init__(self, graph, pdc, pmus):
+        self.graph = graph
+        self.pdc = pdc
+
+        metrics = graph.accumulate(graph.index[pdc])
+        self.parent = metrics['parent'].tolist()
+        self.edge = metrics['edge'].tolist()
+        self.delay = metrics['delay'].tolist()
+        self.link_delay = graph.delay.tolist()
+
+        self.children = [[] for _ in range(graph.n)]
+        for node, p in enumerate(self.parent):
+            if p >= 0:
+                self.children[p].append(node)
+
+        # streamed PMU positions on the path through each node and each edge
+        self.through_node = {}
+        self.through_edge = {}
+        self.pmus = []
+        for idx in sorted(pmus):
+            t = graph.index[idx]
+            if metrics['hops'][t] < 0:
+                continue
+            self.pmus.append(t)
+            node = t
+            while self.parent[node] >= 0:
+                self.through_edge.setdefault(self.edge[node], []).append(t)
+                node = self.parent[node]
+                self.through_node.setdefault(node, []).append(t)
+
+    def subtree(self, root):
+        """Return the nodes of the subtree below and including `root`"""
+        out = [root]
+        for node in out:
+            out.extend(self.children[node])
+        return out
+
+    def reroute(self, cut, removed_edge=-1, removed_node=-1):
+        """
+        Return the new delays of the nodes in `cut` as a dict, without the unreachable ones
+
+        `cut` are the nodes whose tree path crosses the removed edge or node. They are re-attached with a Dijkstra
+        search within `cut` seeded from their neighbors outside of it.
+        """
+        graph = self.graph
+        inside = set(cut)
+        delay = self.link_delay
+
+        heap = []
+        for v in cut:
+            best = None
+            for w, e in graph.adjacency[v]:
+                if e == removed_edge or w == removed_node or w in inside:
+                    continue
+                d = self.delay[w]
+                if d != d:  # unreachable in the tree
+                    continue
+                d += delay[e]
+                if best is None or d < best:
+                    best = d
+            if best is not None:
+                heap.append((best, v))
+        heapq.heapify(heap)
+
+        out = {}
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in out:
+                continue
+            out[u] = d
+            for v, e in graph.adjacency[u]:
+                if v in inside and v not in out and e != removed_edge and v != removed_node:
+                    heapq.heappush(heap, (d + delay[e], v))
+        return out
+
+
+def outage(trees, element, bridge=False, is_node=False):
+    """
+    Evaluate the outage of one edge or node position on the stream trees
+
+    Returns
+    -------
+    (list, list)
+        stranded (PDC, PMU position) pairs and the delay increases of the rerouted pairs
+    """
+    stranded, increase = [], []
+    for tree in trees:
+        through = tree.through_node if is_node else tree.through_edge
+        pmus = through.get(element)
+        if not pmus:
+            continue
+
+        if bridge:
+            stranded.extend((tree.pdc, t) for t in pmus)
+            continue
+
+        if is_node:
+            cut = [node for child in tree.children[element] for node in tree.subtree(child)]
+            delays = tree.reroute(cut, removed_node=element)
+        else:
+            # the end of the edge farther from the PDC
+            u, v = int(tree.graph.u[element]), int(tree.graph.v[element])
+            cut = tree.subtree(u if tree.edge[u] == element else v)
+            delays = tree.reroute(cut, removed_edge=element)
+
+        for t in pmus:
+            if t in delays:
+                increase.append(delays[t] - tree.delay[t])
+            else:
+                stranded.append((tree.pdc, t))
+
+    return stranded, increase
+
+
+def analyze(network, subscriptions=None, graph=None):
+    """
+    Evaluate every single link and switch or router outage
+
+    Parameters
+    ----------
+    network : Network
+        set-up network
+    subscriptions : dict
+        extra PDC subscriptions as in `ltbnet.capacity.plan`
+    graph : LinkGraph
+        link graph of `network`, built if None
+
+    Returns
+    -------
+    dict
+        report with the bridges, the articulation points and the outages that strand or delay PMU streams,
+        ranked by the number of stranded streams and the largest delay increase
+    """
+    t0 = time.perf_counter()
+    graph = graph or LinkGraph(network)
+    bridges, points = bridges_and_articulation_points(graph)
+
+    trees = [StreamTree(graph, pdc, pmus) for pdc, pmus in streams(network, subscriptions).items() if pmus]
+
+    elements = [('Link', e, e in bridges, False) for e in range(len(graph.link))]
+    for record in (network.Switch, network.Router):
+        elements.extend((record._name, graph.index[idx], graph.index[idx] in points, True) for idx in record.idx)
+
+    outages = []
+    for kind, element, critical, is_node in elements:
+        stranded, increase = outage(trees, element, critical and not is_node, is_node)
+        if not stranded and not increase:
+            continue
+        increase.sort()
+        outages.append({'element': graph.nodes[element] if is_node else graph.link[element],
+                        'type': kind,
+                        'critical': critical,
+                        'stranded': len(stranded),
+                        'stranded_pmus': sorted({graph.nodes[t] for _, t in stranded}),
+                        'rerouted': len(increase),
+                        'delay_increase_ms_max': round(increase[-1], 3) if increase else None,
+                        'delay_increase_ms_median': round(increase[len(increase) // 2], 3) if increase else None,
+                        })
+
+    outages.sort(key=lambda x: (-x['stranded'], -(x['delay_increase_ms_max'] or 0.), x['element']))
+
+    return {'streams': sum(len(tree.pmus) for tree in trees),
+            'bridges': sorted(graph.link[e] for e in bridges),
+            'articulation_points': sorted(graph.nodes[p] for p in points),
+            'outages': outages,
+            'elapsed_s': round(time.perf_counter() - t0, 3),
+            }
+
+
+def format_table(report, limit=None):
+    """Return the outages of a contingency report as a text table, at most `limit` of them"""
+    header = '{:<20} {:<8} {:>8} {:>9} {:>9} {:>14} {:>14}'.format(
+        'Element', 'Type', 'Critical', 'Stranded', 'Rerouted', 'Max +delay(ms)', 'Med +delay(ms)')
+    lines = [header, '-' * len(header)]
+
+    def fmt(value):
+        return '-' if value is None else '{:.3f}'.format(value)
+
+    for item in report['outages'][:limit]:
+        lines.append('{:<20} {:<8} {:>8} {:>9} {:>9} {:>14} {:>14}'.format(
+            item['element'], item['type'], 'yes' if item['critical'] else '', item['stranded'], item['rerouted'],
+            fmt(item['delay_increase_ms_max']), fmt(item['delay_increase_ms_median'])))
+
+    if limit is not None and len(report['outages']) > limit:
+        lines.append('... {} more outages'.format(len(report['outages']) - limit))
+
+    lines.append('')
+    lines.append('{s} streams, {b} bridges, {a} articulation points, {o} outages affecting streams, '
+                 'analyzed in {t:.3f} s'.format(s=report['streams'], b=len(report['bridges']),
+                                                a=len(report['articulation_points']), o=len(report['outages']),
+                                                t=report['elapsed_s']))
+    return '\n'.join(lines)
+
+
+def dump_json(report, path):
+    """Write a contingency report to a JSON file"""
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,318 @@
+"""
+Proactive forwarding from the known topology
+
+Instead of a controller learning MAC locations from the first frames, `FlowPlan` computes the forwarding of every
+switch from the Network: the output port towards each host follows the shortest-delay tree of the switch the host is
+attached to, over switch-to-switch links only, as in the latency analysis. Broadcast and unknown frames are flooded
+along a spanning tree of the switches so that loops of the topology do not multiply them. The flows are replaced on
+each switch with one `ovs-ofctl replace-flows` and every host gets static ARP entries for all other hosts with one
+`ip -batch`, so that no frame has to reach a controller.
+
+Hosts and Router interfaces without a MAC in the config get a locally administered one derived from their IP with
+`assign_macs`, which must be called before the Mininet network is built. Static ARP entries are limited to the hosts
+that talk to each other, the PMUs and the PDCs they stream to, and to their gateways, among the addresses each
+interface reaches on-link. The number of entries thus grows with the number of streams rather than with the square of
+the subnet size. Other hosts resolve each other with normal ARP over the flooding flows.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import ipaddress
+
+import numpy as np
+
+from ltbnet.utils import log
+from ltbnet.latency import LinkGraph
+from ltbnet.capacity import streams
+
+# priorities of the unicast flows and of the flooding flow
+UNICAST_PRIORITY = 100
+FLOOD_PRIORITY = 1
+
+
+def host_mac(ip):
+    """Return the locally administered MAC `02:00:` followed by the four octets of IPv4 address `ip`"""
+    octets = ipaddress.IPv4Address(ip.split('/')[0]).packed
+    return '02:00:' + ':'.join('{:02x}'.format(b) for b in octets)
+
+
+def assign_macs(network):
+    """
+    Set the MAC of every Mininet host and Router interface without one from its IP. Return the number of assigned
+    MACs.
+    """
+    count = 0
+    for record in (network.PDC, network.PMU, network.Router):
+        for name, ip, mac in zip(record.mn_name, record.ip, record.mac):
+            if mac or not ip or name in network.interfaces:
+                continue
+            network.nodeInfo(name)['mac'] = host_mac(ip)
+            count += 1
+
+    # Router interfaces have their addresses in the link parameters
+    for _, _, info in network.links(withInfo=True):
+        for params, addr in (('params1', 'addr1'), ('params2', 'addr2')):
+            ip = (info.get(params) or {}).get('ip')
+            if ip and not info.get(addr):
+                info[addr] = host_mac(ip)
+                count += 1
+    return count
+
+
+class FlowPlan(object):
+    """
+    Static flows of the switches and static ARP entries of the hosts of a built Mininet network
+
+    Parameters
+    ----------
+    network : Network
+        set-up network
+    net : mininet.net.Mininet
+        network built from `network`, with the host MACs of the config or from `assign_macs`
+    graph : LinkGraph
+        link graph of `network`, built if None
+    subscriptions : dict
+        extra PDC -> list of sources as returned by `capacity.parse_subscriptions`, whose streams also get static
+        ARP entries
+    """
+    def __init__(self, network, net, graph=None, subscriptions=None):
+        self.network = network
+        self.net = net
+        graph = graph or LinkGraph(network)
+
+        switches = {node.name for node in net.switches}
+        self.flows = {name: [] for name in sorted(switches)}  # switch name -> flow lines
+        self.arp = {}  # host name -> `ip neigh` batch lines
+        self.unattached = []  # hosts without a MAC, an IP or a switch
+
+        # port of each switch towards a neighbor node, and the host interfaces attached to switches
+        ports = {}
+        attachments = []  # (host interface, switch name, switch port)
+        pairs = []
+        blocked = set()  # (port, switch name) not flooded
+        for link in net.links:
+            a, b = link.intf1, link.intf2
+            na, nb = a.node.name, b.node.name
+            if (na, nb) in ports:
+                # parallel links are not used
+                blocked.update(((a.node.ports[a], na), (b.node.ports[b], nb)))
+                continue
+            ports[(na, nb)] = a.node.ports[a]
+            ports[(nb, na)] = b.node.ports[b]
+            if na in switches and nb in switches:
+                pairs.append((na, nb))
+            elif na in switches:
+                attachments.append((b, na, ports[(na, nb)]))
+            elif nb in switches:
+                attachments.append((a, nb, ports[(nb, na)]))
+
+        # shortest-delay trees over switch-to-switch edges only
+        name = [self.network.to_canonical(idx) for idx in graph.nodes]
+        removed = {e for e, (u, v) in enumerate(zip(graph.u.tolist(), graph.v.tolist()))
+                   if name[u] not in switches or name[v] not in switches}
+
+        hosts = {}  # switch name -> list of (host MAC, host port)
+        addresses = []  # (host name, IP interface, MAC, interface name)
+        for intf, switch, port in attachments:
+            ip, mac = self.address(intf)
+            if not ip or not mac:
+                continue
+            hosts.setdefault(switch, []).append((mac, port))
+            addresses.append((intf.node.name, ipaddress.IPv4Interface(ip), mac, intf.name))
+
+        named = {host for host, _, _, _ in addresses}
+        self.unattached = [host.name for host in net.hosts if host.name not in named]
+
+        for switch, macs in hosts.items():
+            for mac, port in macs:
+                self.flows[switch].append(self.unicast(mac, port))
+
+            parent, _, _ = graph.tree(graph.index[self.idx(switch)], removed)
+            for v, p in enumerate(parent.tolist()):
+                if p < 0 or name[v] not in switches:
+                    continue
+                port = ports.get((name[v], name[p]))
+                if port is None:
+                    continue
+                self.flows[name[v]].extend(self.unicast(mac, port) for mac, _ in macs)
+
+        # flood on all ports but the switch-to-switch ones outside of a spanning forest
+        tree = set()
+        done = set()
+        for switch in sorted(switches):
+            if switch in done:
+                continue
+            parent, _, _ = graph.tree(graph.index[self.idx(switch)], removed)
+            for v, p in enumerate(parent.tolist()):
+                if name[v] in switches and (p >= 0 or name[v] == switch):
+                    done.add(name[v])
+                    if p >= 0:
+                        tree.add(frozenset((name[v], name[p])))
+
+        for a, b in pairs:
+            if frozenset((a, b)) not in tree:
+                blocked.update(((ports[(a, b)], a), (ports[(b, a)], b)))
+
+        for node in net.switches:
+            out = sorted(port for intf, port in node.ports.items()
+                         if intf.name != 'lo' and (port, node.name) not in blocked)
+            actions = ','.join('output:{}'.format(port) for port in out) or 'drop'
+            self.flows[node.name].append('priority={},actions={}'.format(FLOOD_PRIORITY, actions))
+
+        self.static_arp(addresses, self.peers(subscriptions))
+
+        if self.unattached:
+            log.warn('*** No proactive forwarding to hosts without a MAC, an IP or a switch: {}\n'.format(
+                ', '.join(self.unattached)))
+
+    def address(self, intf):
+        """
+        Return the IP with prefix length and the MAC of a host interface
+
+        They are those of the running interface if known, else those of the topology: the link parameters of Router
+        interfaces or the host parameters of the default interface. A missing MAC is derived from the IP.
+        """
+        ip = getattr(intf, 'ip', None)
+        if ip and getattr(intf, 'prefixLen', None):
+            ip = '{}/{}'.format(ip, intf.prefixLen)
+        mac = getattr(intf, 'mac', None)
+
+        host = intf.node.name
+        other = intf.link.intf2 if intf.link.intf1 is intf else intf.link.intf1
+        info = self.network.linkInfo(host, other.node.name) or {}
+        params = info.get('params1' if info.get('node1') == host else 'params2') or {}
+        if not ip:
+            ip = params.get('ip')
+        if not ip and intf is intf.node.defaultIntf():
+            ip = self.network.nodeInfo(host).get('ip')
+            mac = mac or self.network.nodeInfo(host).get('mac')
+
+        if ip and '/' not in ip:
+            ip = '{}/32'.format(ip)
+        if ip and not mac:
+            mac = host_mac(ip)
+        return ip, mac
+
+    def peers(self, subscriptions=None):
+        """Return the Mininet host names each PMU and PDC streams with, as a dict of name -> set of names"""
+        pmu, pdc = self.network.PMU, self.network.PDC
+        out = {}
+        for pdc_idx, pmus in streams(self.network, subscriptions).items():
+            a = pdc.mn_name[pdc.lookup_index(pdc_idx)]
+            for pmu_idx in pmus:
+                b = pmu.mn_name[pmu.lookup_index(pmu_idx)]
+                out.setdefault(a, set()).add(b)
+                out.setdefault(b, set()).add(a)
+        return out
+
+    def static_arp(self, addresses, peers):
+        """
+        Add the static ARP entries of every host interface for the interfaces it talks to on-link
+
+        A PMU or PDC interface gets entries for the interfaces of its stream peers `peers` and of the Routers, and a
+        Router interface for the interfaces of the hosts with peers. Interfaces reach on-link the interfaces in their
+        subnet, and default interfaces also those in the on-link routes of their host.
+        """
+        ips = np.array([int(ip.ip) for _, ip, _, _ in addresses], dtype=np.int64)
+        routers = set(self.network.Router.mn_name)
+
+        by_host = {}  # host name -> rows of its interfaces in `addresses`
+        for i, (host, _, _, _) in enumerate(addresses):
+            by_host.setdefault(host, []).append(i)
+
+        gateways = [i for name in routers for i in by_host.get(name, ())]
+        talkers = [i for name in peers for i in by_host.get(name, ())]
+
+        neigh = 'neigh replace {ip} lladdr {mac} dev {dev} nud permanent'
+        for host, ip, _, dev in addresses:
+            if host in routers:
+                candidates = talkers
+            else:
+                candidates = gateways + [i for name in peers.get(host, ()) for i in by_host.get(name, ())]
+            if not candidates:
+                continue
+
+            subnets = [ip.network]
+            if dev == str(self.net.get(host).defaultIntf()):
+                subnets.extend(ipaddress.IPv4Network(dst) for dst, gateway in self.network.routes.get(host, ())
+                               if gateway is None)
+
+            candidates = np.unique(np.array(candidates, dtype=np.int64))
+            reached = np.zeros(len(candidates), dtype=bool)
+            for subnet in subnets:
+                lo, hi = int(subnet.network_address), int(subnet.broadcast_address)
+                reached |= (ips[candidates] >= lo) & (ips[candidates] <= hi)
+
+            lines = self.arp.setdefault(host, [])
+            for t in candidates[reached].tolist():
+                other, other_ip, mac, _ = addresses[t]
+                if other != host:
+                    lines.append(neigh.format(ip=other_ip.ip, mac=mac, dev=dev))
+
+    def idx(self, switch):
+        """Return the Switch idx of Mininet switch name `switch`"""
+        return self.network.Switch.idx[self.network.Switch.lookup_index(switch, canonical=True)]
+
+    @staticmethod
+    def unicast(mac, port):
+        """Return the flow forwarding frames to `mac` out of `port`"""
+        return 'priority={},dl_dst={},actions=output:{}'.format(UNICAST_PRIORITY, mac, port)
+
+    @property
+    def n_flows(self):
+        return sum(len(lines) for lines in self.flows.values())
+
+    @property
+    def n_arp(self):
+        return sum(len(lines) for lines in self.arp.values())
+
+    def install(self, concurrent=False):
+        """
+        Replace the flows of every switch and add the static ARP entries of every host. Return the elapsed seconds.
+
+        With `concurrent`, the `ovs-ofctl` and `ip` processes run concurrently, started with `node.popen`, instead
+        of one after another in the node shells.
+        """
+        t_start = time.perf_counter()
+
+        tmp = tempfile.mkdtemp(prefix='ltbnet-flows-')
+        try:
+            jobs = []
+            for i, (switch, lines) in enumerate(self.flows.items()):
+                path = os.path.join(tmp, '{}.flows'.format(i))
+                jobs.append((self.net.get(switch), ['ovs-ofctl', 'replace-flows', switch, path], path, lines))
+            for i, (host, lines) in enumerate(self.arp.items()):
+                if not lines:
+                    continue
+                path = os.path.join(tmp, '{}.ip'.format(i))
+                jobs.append((self.net.get(host), ['ip', '-force', '-batch', path], path, lines))
+
+            procs = []
+            for node, args, path, lines in jobs:
+                with open(path, 'w') as f:
+                    f.write('\n'.join(lines) + '\n')
+                if concurrent:
+                    procs.append((node, node.popen(args)))
+                else:
+                    self.check(node, node.cmd(' '.join(args)))
+
+            for node, proc in procs:
+                out, err = proc.communicate()
+                self.check(node, (out or b'') + (err or b''))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        elapsed = time.perf_counter() - t_start
+        log.info('*** Installed {f} flows on {s} switches and {a} static ARP entries on {h} hosts in {t:.1f} ms\n'
+                 .format(f=self.n_flows, s=len(self.flows), a=self.n_arp, h=len(self.arp), t=elapsed * 1000))
+        return elapsed
+
+    @staticmethod
+    def check(node, out):
+        """Log the output of a flow or ARP batch as an error"""
+        if isinstance(out, bytes):
+            out = out.decode(errors='replace')
+        if out and out.strip():
+            log.error('*** Proactive forwarding on {n}: {o}\n'.format(n=node.name, o=out.strip()))
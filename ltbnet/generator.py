@@ -0,0 +1,184 @@
+"""
+Synthetic LTBNet config generator for scaling tests
+
+A generated network has `n_region` Regions. Each Region has `n_switch` switches in a star around its core switch,
+`n_pmu` PMUs on every switch and a Region PDC on the core switch. The core switches form a ring, and a system PDC
+on the core switch of the first Region sits on top of the Region PDCs. Region coordinates are taken from the Region
+rows of a reference config.
+"""
+
+import os
+import sys
+import csv
+import json
+import random
+import argparse
+
+from ltbnet.parser import FIELDS, iter_config
+
+DEFAULT_REFERENCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                                 'config_wecc_fixidx.csv')
+
+# ranges of random link parameters: delay (ms), bandwidth (Mbps), loss (%) and jitter (ms)
+BACKBONE = {'delay': (5., 30.), 'bw': (100., 1000.), 'loss': (0., 0.5), 'jitter': (0., 2.)}
+ACCESS = {'delay': (1., 5.), 'bw': (10., 100.), 'loss': (0., 1.), 'jitter': (0., 1.)}
+
+
+def reference_regions(path=DEFAULT_REFERENCE):
+    """Return (name, longitude, latitude) of the Region rows in a config file. Return an empty list if the file
+    does not exist."""
+    if not path or not os.path.isfile(path):
+        return []
+    return [(row['Idx'], row['Longitude'], row['Latitude']) for row in iter_config(path)
+            if row['Type'] == 'Region']
+
+
+def row(**fields):
+    """Return a typed config row with the given fields and None for the others"""
+    out = {key: None for key, _ in FIELDS}
+    out['Status'] = 1
+    out.update(fields)
+    return out
+
+
+def generate(n_region=15, n_switch=2, n_pmu=10, seed=0, reference=DEFAULT_REFERENCE, backbone=BACKBONE,
+             access=ACCESS):
+    """
+    Yield typed config rows of a synthetic network
+
+    Parameters
+    ----------
+    n_region : int
+        number of Regions
+    n_switch : int
+        number of switches per Region
+    n_pmu : int
+        number of PMUs per switch
+    seed : int
+        random seed of coordinates and link parameters
+    reference : str
+        config file whose Region rows provide the Region coordinates. Regions are placed on a grid if None.
+    backbone, access : dict
+        ranges of `delay`, `bw`, `loss` and `jitter` of switch-to-switch links and of host links
+
+    Returns
+    -------
+    generator of dict
+    """
+    rng = random.Random(seed)
+    regions = reference_regions(reference)
+
+    def link(idx, fr, to, ranges):
+        return row(Idx=idx, Type='Link', Name=idx, From=fr, To=to,
+                   Delay='{:.1f}ms'.format(rng.uniform(*ranges['delay'])),
+                   BW=round(rng.uniform(*ranges['bw']), 1),
+                   Loss=round(rng.uniform(*ranges['loss']), 2),
+                   Jitter='{:.1f}ms'.format(rng.uniform(*ranges['jitter'])))
+
+    def near(value, spread):
+        return round(value + rng.uniform(-spread, spread), 4)
+
+    # Region names and coordinates
+    plan = []
+    for r in range(n_region):
+        if regions:
+            base, lon, lat = regions[r % len(regions)]
+            cycle = r // len(regions)
+            if cycle:
+                plan.append(('{}{}'.format(base, cycle), near(lon, 1.), near(lat, 1.)))
+            else:
+                plan.append((base, lon, lat))
+        else:
+            plan.append(('R{}'.format(r), float(r % 10), float(r // 10)))
+
+    pmu_idx = 0
+    for r, (region, lon, lat) in enumerate(plan):
+        yield row(Idx=region, Type='Region', Region=region, Name=region, Longitude=lon, Latitude=lat)
+
+        core = 'S_{}'.format(region)
+        switches = [core] + ['{}_{}'.format(core, s) for s in range(1, n_switch)]
+        for s, switch in enumerate(switches):
+            yield row(Idx=switch, Type='Switch', Region=region, Name=switch,
+                      Longitude=near(lon, .5) if s else lon, Latitude=near(lat, .5) if s else lat)
+            if s:
+                yield link('L_{}'.format(switch), switch, core, backbone)
+
+        pdc = 'C_{}'.format(region)
+        yield row(Idx=pdc, Type='PDC', Region=region, Name=pdc, Longitude=lon, Latitude=lat)
+        yield link('L_{}'.format(pdc), pdc, core, access)
+
+        if r == 0:
+            yield row(Idx='C_SYS', Type='PDC', Region=region, Name='C_SYS', Longitude=lon, Latitude=lat)
+            yield link('L_C_SYS', 'C_SYS', core, access)
+
+        # ring of core switches, closed by the last Region
+        if r > 0:
+            prev = 'S_{}'.format(plan[r - 1][0])
+            yield link('L_{}_{}'.format(prev, core), prev, core, backbone)
+        if r == n_region - 1 and n_region > 2:
+            first = 'S_{}'.format(plan[0][0])
+            yield link('L_{}_{}'.format(core, first), core, first, backbone)
+
+        for switch in switches:
+            for k in range(n_pmu):
+                pmu_idx += 1
+                pmu = 'P{}'.format(pmu_idx)
+                yield row(Idx=pmu, Type='PMU', Region=region, Name=pmu, PMU_IDX=pmu_idx,
+                          Longitude=near(lon, .5), Latitude=near(lat, .5))
+                yield link('L_{}'.format(pmu), pmu, switch, access)
+
+
+def to_str(value):
+    return 'None' if value is None else value
+
+
+def write_csv(rows, f):
+    """Write config rows to an open file in csv format"""
+    writer = csv.writer(f)
+    keys = [key for key, _ in FIELDS]
+    writer.writerow(keys)
+    for item in rows:
+        writer.writerow([to_str(item[key]) for key in keys])
+
+
+def write_json(rows, f):
+    """Write config rows to an open file in json format one row at a time"""
+    keys = [key for key, _ in FIELDS]
+    f.write('[')
+    for i, item in enumerate(rows):
+        f.write(',\n' if i else '\n')
+        f.write(json.dumps({key: to_str(item[key]) for key in keys}))
+    f.write('\n]\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic LTBNet config')
+    parser.add_argument('-o', '--output', help='output csv or json file (default: csv to stdout)')
+    parser.add_argument('--regions', type=int, default=15, help='number of Regions')
+    parser.add_argument('--switches', type=int, default=2, help='number of switches per Region')
+    parser.add_argument('--pmus', type=int, default=10, help='number of PMUs per switch')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--reference', default=DEFAULT_REFERENCE,
+                        help='config file providing the Region coordinates (default: %(default)s)')
+
+    args = parser.parse_args()
+
+    rows = generate(args.regions, args.switches, args.pmus, args.seed, args.reference)
+
+    if not args.output:
+        write_csv(rows, sys.stdout)
+        return
+
+    fmt = os.path.splitext(args.output)[1][1:]
+    if fmt not in ('csv', 'json'):
+        parser.error('File format {} not supported'.format(fmt))
+
+    with open(args.output, 'w', newline='') as f:
+        if fmt == 'json':
+            write_json(rows, f)
+        else:
+            write_csv(rows, f)
+
+
+if __name__ == '__main__':
+    main()
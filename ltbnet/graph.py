@@ -1,56 +1,267 @@
-import networkx as nx
-from matplotlib import pyplot as plt
+"""
+Graph visualization of LTBNet networks
+
+The default `geo` layout places nodes at their Longitude/Latitude with an equirectangular projection and spreads
+PDCs and PMUs sharing a position on a circle around it. The `graphviz` layout is cached on disk, keyed on the
+topology. Graphs are shown interactively or rendered headless to PNG, SVG or PDF files, or to GeoJSON.
+"""
+
+import os
+import json
+import hashlib
 
-import matplotlib.pyplot as plt
+import numpy as np
 import networkx as nx
-try:
-    import pygraphviz
-    from networkx.drawing.nx_agraph import graphviz_layout
-except ImportError:
-    try:
-        import pydot
-        from networkx.drawing.nx_pydot import graphviz_layout
-    except ImportError:
-        raise ImportError("This example needs Graphviz and either "
-                          "PyGraphviz or pydot")
 
+# node type -> (color, size)
+STYLES = {'Switch': ('red', 200),
+          'Router': ('orange', 200),
+          'PDC': ('blue', 160),
+          'PMU': ('green', 80),
+          None: ('gray', 40),
+          }
+
+LAYOUTS = ('geo', 'graphviz')
+
+# radius of the circle of co-located hosts as a fraction of the layout diagonal
+SPREAD = 0.01
+
+
+def pyplot(headless=False):
+    """Import `matplotlib.pyplot`, with the non-interactive Agg backend if `headless`"""
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    return plt
+
+
+def make_graph(network, layout='geo', cache_dir=None):
+    """
+    Build the graph of a Network object and lay it out
+
+    Parameters
+    ----------
+    network : Network
+        set-up network
+    layout : str
+        `geo` for geographic coordinates, or `graphviz`. The `geo` layout falls back to `graphviz` if no node
+        has coordinates.
+    cache_dir : str
+        directory of the cached graphviz layouts. Defaults to the topology cache directory.
 
-def make_graph(network):
-    """Graph visualization of a Network object
+    Returns
+    -------
+    (networkx.Graph, dict)
+        the graph and the node positions
     """
+    if layout not in LAYOUTS:
+        raise ValueError('Unknown layout <{}>'.format(layout))
+
     G = nx.Graph()
 
-    G.add_nodes_from(network.Switch.idx, color='red', size=200)
-    G.add_nodes_from(network.PMU.idx, color='green', size=80)
-    G.add_nodes_from(network.PDC.idx, color='blue', size=160)
+    for record in (network.Switch, network.Router, network.PDC, network.PMU):
+        color, size = STYLES[record._name]
+        G.add_nodes_from(record.idx, type=record._name, color=color, size=size)
+
+    for idx, f, t in zip(network.Link.idx, network.Link.fr, network.Link.to):
+        G.add_edge(f, t, idx=idx)
 
-    for f, t in zip(network.Link.fr, network.Link.to):
-        G.add_edge(f, t)
+    # endpoints of links that are not a switch, router or host
+    color, size = STYLES[None]
+    for node, data in G.nodes(data=True):
+        if 'type' not in data:
+            data.update(type=None, color=color, size=size)
 
     print("graph has %d nodes with %d edges"
           % (nx.number_of_nodes(G), nx.number_of_edges(G)))
     print(nx.number_connected_components(G), "connected components")
 
-    colors = [G.node[i]['color'] for i in G.nodes()]
-    sizes = [G.node[i]['size'] for i in G.nodes()]
+    pos = None
+    if layout == 'geo':
+        pos = geo_layout(network, G)
+    if pos is None:
+        pos = cached_graphviz_layout(G, cache_dir=cache_dir)
+
+    return G, pos
+
+
+def lonlat(network, nodes):
+    """
+    Return the longitude and latitude of `nodes` as an (n, 2) array, NaN where unknown
+
+    The columns are swapped when the Longitude values are in the latitude range and the Latitude values are not,
+    as in the bundled configs.
+    """
+    coords = {}
+    for record in (network.Region, network.Switch, network.Router, network.PDC, network.PMU):
+        for idx, (lat, lon) in zip(record.idx, record.coords):
+            if lat is not None and lon is not None:
+                coords.setdefault(idx, (lon, lat))
+
+    out = np.array([coords.get(n, (np.nan, np.nan)) for n in nodes], dtype=float).reshape(-1, 2)
+
+    known = out[~np.isnan(out).any(axis=1)]
+    if len(known) and np.all(np.abs(known[:, 0]) <= 90) and np.any(np.abs(known[:, 1]) > 90):
+        out = out[:, ::-1].copy()
+    return out
+
+
+def geo_layout(network, G):
+    """
+    Return node positions from the geographic coordinates, or None if no node has coordinates
+
+    Nodes without coordinates take those of a linked switch or router, or of their Region. The remaining ones are
+    placed at the center of the known positions. Hosts sharing a position are spread on a circle around it.
+    """
+    nodes = list(G.nodes())
+    if not nodes:
+        return {}
+
+    xy = lonlat(network, nodes)
+    missing = np.isnan(xy).any(axis=1)
+    if missing.all():
+        return None
+
+    if missing.any():
+        pos = {n: i for i, n in enumerate(nodes)}
+        regions = dict(zip(network.Region.idx, lonlat(network, network.Region.idx)))
+        for i in np.flatnonzero(missing):
+            node = nodes[i]
+            for nb in G.neighbors(node):
+                j = pos[nb]
+                if G.nodes[nb]['type'] in ('Switch', 'Router') and not missing[j]:
+                    xy[i] = xy[j]
+                    break
+            else:
+                region = region_of(network, node)
+                if region in regions:
+                    xy[i] = regions[region]
+        xy[np.isnan(xy).any(axis=1)] = np.nanmean(xy, axis=0)
+
+    # equirectangular projection around the mean latitude
+    lat0 = float(np.mean(xy[:, 1]))
+    xy[:, 0] *= np.cos(np.radians(lat0))
+    G.graph['lat0'] = lat0
+
+    # spread hosts that share a position with other nodes on a circle around it
+    hosts = np.array([G.nodes[n]['type'] in ('PDC', 'PMU', None) for n in nodes])
+    _, group = np.unique(xy, axis=0, return_inverse=True)
+    group = group.ravel()
+    shared_position = np.bincount(group)[group] > 1
+    group[~hosts] = -1
+
+    order = np.argsort(group, kind='stable')
+    order = order[group[order] >= 0]
+    counts = np.bincount(group[order])
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(len(order)) - starts[group[order]]
+    size = counts[group[order]]
+    shared = shared_position[order]
+
+    extent = np.ptp(xy, axis=0)
+    radius = SPREAD * float(np.hypot(*extent)) or 1.
+    angle = 2 * np.pi * rank[shared] / size[shared]
+    moved = order[shared]
+    xy[moved, 0] += radius * np.cos(angle)
+    xy[moved, 1] += radius * np.sin(angle)
+
+    return {n: (float(x), float(y)) for n, (x, y) in zip(nodes, xy)}
+
+
+def region_of(network, node):
+    """Return the Region of a node, or None"""
+    for record in (network.Switch, network.Router, network.PDC, network.PMU):
+        i = record.lookup_index(node)
+        if i >= 0:
+            return record.region[i]
+    return None
+
 
-    plt.figure(figsize=(8, 8))
-    # use graphviz to find radial layout
-    # pos = graphviz_layout(G, prog='sfdp', root='S_CAIS')
-    pos = graphviz_layout(G)
-    # draw nodes, coloring by rtt ping time
+def topology_hash(G, prog='neato'):
+    """Return a hash of the nodes and edges of a graph and the graphviz program"""
+    edges = sorted(tuple(sorted((str(u), str(v)))) for u, v in G.edges())
+    h = hashlib.sha256()
+    h.update(json.dumps([prog, sorted(str(n) for n in G.nodes()), edges]).encode())
+    return h.hexdigest()
+
+
+def graphviz_layout(G, prog='neato'):
+    """Return the graphviz layout of a graph using PyGraphviz or pydot"""
+    try:
+        import pygraphviz  # noqa: F401
+        from networkx.drawing.nx_agraph import graphviz_layout as layout
+    except ImportError:
+        try:
+            import pydot  # noqa: F401
+            from networkx.drawing.nx_pydot import graphviz_layout as layout
+        except ImportError:
+            raise ImportError("The graphviz layout needs Graphviz and either "
+                              "PyGraphviz or pydot")
+    return layout(G, prog=prog)
+
+
+def cached_graphviz_layout(G, prog='neato', cache_dir=None):
+    """Return the graphviz layout of a graph from the on-disk cache, computing and caching it if missing"""
+    from ltbnet.cache import default_cache_dir
+
+    cache_dir = cache_dir or default_cache_dir()
+    fname = os.path.join(cache_dir, 'layout-{p}-{h}.json'.format(p=prog, h=topology_hash(G, prog)[:16]))
+
+    if os.path.isfile(fname):
+        try:
+            with open(fname) as f:
+                pos = {n: tuple(xy) for n, xy in json.load(f).items()}
+            if all(str(n) in pos for n in G.nodes()):
+                return {n: pos[str(n)] for n in G.nodes()}
+        except (OSError, ValueError):
+            pass
+
+    pos = graphviz_layout(G, prog=prog)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = fname + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump({str(n): list(xy) for n, xy in pos.items()}, f)
+        os.replace(tmp, fname)
+    except OSError:
+        pass
+
+    return pos
+
+
+def draw_graph(G, pos, ax=None):
+    """Draw a graph with the node colors and sizes of their types and the switch labels"""
+    plt = pyplot()
+    if ax is None:
+        ax = plt.figure(figsize=(8, 8)).gca()
+
+    nodes = list(G.nodes())
     nx.draw(G, pos,
-            node_color=colors,
+            ax=ax,
+            nodelist=nodes,
+            node_color=[G.nodes[i]['color'] for i in nodes],
             with_labels=False,
             alpha=0.6,
-            node_size=sizes
+            node_size=[G.nodes[i]['size'] for i in nodes],
             )
 
-    labels = {i: i for i in network.Switch.idx}
+    labels = {i: i for i in nodes if G.nodes[i]['type'] == 'Switch'}
+    nx.draw_networkx_labels(G, pos, labels, ax=ax, font_size=16, font_color='black')
 
-    nx.draw_networkx_labels(G, pos, labels, font_size=16, font_color='black')
+    if 'lat0' in G.graph:
+        ax.set_aspect('equal')
 
-    return G, pos
+    return ax
+
+
+def shortest_path(G, source, target):
+    """Return the shortest path between `source` and `target` and store it in the graph attribute `path`"""
+    path = nx.shortest_path(G, source=source, target=target)
+    G.graph['path'] = path
+    print(path)
+    return path
 
 
 def draw_shortest_path(G, pos, source, target, labels=False):
@@ -62,7 +273,7 @@ def draw_shortest_path(G, pos, source, target, labels=False):
     G
         graph on which the source and target exist
     pos
-        position of nodes generated by `graphviz_layout`
+        position of nodes generated by `make_graph`
     source
         name of the source node
     target
@@ -73,13 +284,76 @@ def draw_shortest_path(G, pos, source, target, labels=False):
     graph
 
     """
-    path = nx.shortest_path(G, source=source, target=target)
-
-    print(path)
+    path = shortest_path(G, source, target)
 
     path_edges = zip(path, path[1:])
     path_edges = list(path_edges)
     nx.draw_networkx_nodes(G, pos, nodelist=path, node_color='r', node_size=240, alpha=0.5)
     nx.draw_networkx_edges(G, pos, edgelist=path_edges, edge_color='r', width=10, alpha=0.4)
 
-    return G
\ No newline at end of file
+    return G
+
+
+def to_geojson(G, pos):
+    """
+    Return a GeoJSON FeatureCollection of the nodes and edges of a graph laid out with the `geo` layout
+
+    Nodes on the path found by `shortest_path` have the property `on_path` set.
+    """
+    if 'lat0' not in G.graph:
+        raise ValueError('GeoJSON output needs the geo layout')
+
+    nodes = list(G.nodes())
+    xy = np.array([pos[n] for n in nodes], dtype=float).reshape(-1, 2)
+    xy[:, 0] /= np.cos(np.radians(G.graph['lat0']))
+    lonlat = {n: [round(float(x), 6), round(float(y), 6)] for n, (x, y) in zip(nodes, xy)}
+
+    path = G.graph.get('path', [])
+    on_path = set(path)
+    path_edges = {frozenset(e) for e in zip(path, path[1:])}
+
+    features = []
+    for n in nodes:
+        features.append({'type': 'Feature',
+                         'geometry': {'type': 'Point', 'coordinates': lonlat[n]},
+                         'properties': {'idx': n, 'type': G.nodes[n]['type'], 'on_path': n in on_path}})
+    for u, v, data in G.edges(data=True):
+        features.append({'type': 'Feature',
+                         'geometry': {'type': 'LineString', 'coordinates': [lonlat[u], lonlat[v]]},
+                         'properties': {'idx': data.get('idx'), 'from': u, 'to': v,
+                                        'on_path': frozenset((u, v)) in path_edges}})
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def render(G, pos, path=None, source=None, target=None):
+    """
+    Show a graph interactively, or render it headless to `path`
+
+    Parameters
+    ----------
+    path : str
+        output file. The format is given by the extension: `geojson` or `json` for GeoJSON, or any image format
+        supported by matplotlib such as `png`, `svg` and `pdf`.
+    source, target : str
+        highlight the shortest path between two nodes if both are given
+    """
+    fmt = os.path.splitext(path)[1][1:].lower() if path else None
+
+    if fmt in ('geojson', 'json'):
+        if source and target:
+            shortest_path(G, source, target)
+        with open(path, 'w') as f:
+            json.dump(to_geojson(G, pos), f)
+        return
+
+    plt = pyplot(headless=path is not None)
+    ax = draw_graph(G, pos)
+    if source and target:
+        draw_shortest_path(G, pos, source, target)
+
+    if path is None:
+        plt.show()
+    else:
+        ax.figure.savefig(path, bbox_inches='tight')
+        plt.close(ax.figure)
@@ -0,0 +1,268 @@
+"""
+End-to-end latency budget analysis of PMU-to-PDC paths
+
+The links of a Network form a weighted graph. One shortest-delay tree is grown from every PDC, and the cumulative
+delay and jitter, the bottleneck bandwidth and the compounded loss are accumulated over each tree level by level
+with NumPy. The metrics of all PMU-PDC pairs are then gathered at once from the per-PDC arrays.
+"""
+
+import json
+import math
+import heapq
+
+import numpy as np
+
+from ltbnet.parser import to_ms
+
+# two reporting periods at 30 frames per second, the C37.118.1 reporting latency limit of P class PMUs
+DEFAULT_BUDGET_MS = 2000. / 30
+
+# added to the delay of each hop so that paths of equal delay are decided by the hop count
+HOP_EPS = 1e-9
+
+
+class LinkGraph(object):
+    """
+    Undirected graph of the links of a Network with per-link delay (ms), jitter (ms), bandwidth (Mbps) and loss
+    (fraction)
+
+    Links without a bandwidth have an infinite bandwidth. Missing delay, jitter and loss are zero. Of parallel
+    links, the one with the smallest delay is kept.
+    """
+    def __init__(self, network):
+        self.network = network
+
+        self.nodes = []  # node idx in order
+        self.index = {}  # node idx -> position in `self.nodes`
+        for record in (network.Switch, network.Router, network.PDC, network.PMU):
+            for idx in record.idx:
+                self.node(idx)
+
+        link = network.Link
+        pairs = {}
+        for i, fr, to, delay in zip(range(link.n), link.fr, link.to, link.delay):
+            key = tuple(sorted((self.node(fr), self.node(to))))
+            d = to_ms(delay) or 0.
+            if key not in pairs or d < pairs[key][1]:
+                pairs[key] = (i, d)
+
+        rows = [i for i, _ in pairs.values()]
+        self.link = [link.idx[i] for i in rows]  # link idx of each edge
+        self.u = np.array([self.index[link.fr[i]] for i in rows], dtype=int)
+        self.v = np.array([self.index[link.to[i]] for i in rows], dtype=int)
+        self.delay = np.array([to_ms(link.delay[i]) or 0. for i in rows], dtype=float)
+        self.jitter = np.array([to_ms(link.jitter[i]) or 0. for i in rows], dtype=float)
+        self.bw = np.array([np.inf if link.bw[i] is None else link.bw[i] for i in rows], dtype=float)
+        self.loss = np.array([(link.loss[i] or 0.) / 100. for i in rows], dtype=float)
+
+        self.adjacency = [[] for _ in self.nodes]  # node -> list of (neighbor, edge)
+        for e, (u, v) in enumerate(zip(self.u.tolist(), self.v.tolist())):
+            self.adjacency[u].append((v, e))
+            self.adjacency[v].append((u, e))
+
+    def node(self, idx):
+        """Return the position of node `idx`, adding it if new"""
+        pos = self.index.get(idx)
+        if pos is None:
+            pos = self.index[idx] = len(self.nodes)
+            self.nodes.append(idx)
+        return pos
+
+    @property
+    def n(self):
+        return len(self.nodes)
+
+    def tree(self, source, removed=()):
+        """
+        Return the shortest-delay tree from node position `source` as (parent, edge, levels)
+
+        `parent` and `edge` hold the parent node and the edge to it for each node, -1 for the source and for
+        unreachable nodes. `levels` lists the node arrays at depth 1, 2, ... Edges in `removed` are skipped.
+        """
+        n = self.n
+        parent = np.full(n, -1, dtype=int)
+        edge = np.full(n, -1, dtype=int)
+        depth = np.full(n, -1, dtype=int)
+        dist = [np.inf] * n
+        delay = self.delay.tolist()
+
+        dist[source] = 0.
+        depth[source] = 0
+        heap = [(0., source)]
+        done = set()
+        order = []  # settled nodes. Parents are settled before their children.
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            order.append(u)
+            for v, e in self.adjacency[u]:
+                if e in removed:
+                    continue
+                nd = d + delay[e] + HOP_EPS
+                if nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    edge[v] = e
+                    heapq.heappush(heap, (nd, v))
+
+        for u in order[1:]:
+            depth[u] = depth[parent[u]] + 1
+
+        levels = [np.flatnonzero(depth == d) for d in range(1, depth.max() + 1)]
+        return parent, edge, levels
+
+    def accumulate(self, source, removed=()):
+        """
+        Return the path metrics from node position `source` to every node as a dict of arrays
+
+        Keys are `parent`, `edge`, `hops`, `delay` and `jitter` (ms, summed), `bw` (Mbps, bottleneck) and `loss`
+        (fraction, compounded). Unreachable nodes have hops -1 and NaN metrics.
+        """
+        parent, edge, levels = self.tree(source, removed)
+        n = self.n
+
+        hops = np.full(n, -1, dtype=int)
+        delay = np.full(n, np.nan)
+        jitter = np.full(n, np.nan)
+        bw = np.full(n, np.nan)
+        keep = np.full(n, np.nan)  # probability that a packet is not lost
+
+        hops[source], delay[source], jitter[source], bw[source], keep[source] = 0, 0., 0., np.inf, 1.
+        for level in levels:
+            p, e = parent[level], edge[level]
+            hops[level] = hops[p] + 1
+            delay[level] = delay[p] + self.delay[e]
+            jitter[level] = jitter[p] + self.jitter[e]
+            bw[level] = np.minimum(bw[p], self.bw[e])
+            keep[level] = keep[p] * (1. - self.loss[e])
+
+        return {'parent': parent, 'edge': edge, 'hops': hops, 'delay': delay, 'jitter': jitter, 'bw': bw,
+                'loss': 1. - keep}
+
+    def path(self, parent, target):
+        """Return the node idx on the path to node position `target` in a tree given by `parent`"""
+        path = [target]
+        while parent[path[-1]] >= 0:
+            path.append(parent[path[-1]])
+        return [self.nodes[i] for i in reversed(path)]
+
+
+def analyze(network, budget_ms=DEFAULT_BUDGET_MS, graph=None):
+    """
+    Compute the path, delay, jitter, bottleneck bandwidth and loss from every PMU to every PDC
+
+    Parameters
+    ----------
+    network : Network
+        set-up network
+    budget_ms : float
+        one-way delay budget in milliseconds
+    graph : LinkGraph
+        link graph of `network`, built if None
+
+    Returns
+    -------
+    dict
+        report with the budget, a `results` list with one entry per PMU-PDC pair and a `summary` of the paths to
+        the Region PDCs
+    """
+    graph = graph or LinkGraph(network)
+    pmu, pdc = network.PMU, network.PDC
+
+    sources = [graph.index[idx] for idx in pdc.idx]
+    targets = np.array([graph.index[idx] for idx in pmu.idx], dtype=int)
+
+    trees = [graph.accumulate(s) for s in sources]
+
+    # (PDC, PMU) matrices of all metrics
+    metrics = {key: np.array([t[key][targets] for t in trees]).reshape(len(sources), len(targets))
+               for key in ('hops', 'delay', 'jitter', 'bw', 'loss')}
+    home = np.array([[p_region == c_region for p_region in pmu.region] for c_region in pdc.region],
+                    dtype=bool).reshape(len(sources), len(targets))
+    reachable = metrics['hops'] >= 0
+    within = reachable & (metrics['delay'] <= budget_ms)
+
+    def column(values, digits=3):
+        return [v if math.isfinite(v) else None for v in np.round(values, digits).ravel().tolist()]
+
+    n_pdc = len(sources)
+    hops = metrics['hops'].T.ravel().tolist()
+    delay = column(metrics['delay'].T)
+    jitter = column(metrics['jitter'].T)
+    bw = column(metrics['bw'].T)
+    loss = column(metrics['loss'].T * 100, 4)
+    is_home = home.T.ravel().tolist()
+    is_within = within.T.ravel().tolist()
+    parents = [t['parent'].tolist() for t in trees]
+    names = graph.nodes
+
+    results = []
+    for j, (name, region, target) in enumerate(zip(pmu.idx, pmu.region, targets.tolist())):
+        for i, pdc_idx in enumerate(pdc.idx):
+            k = j * n_pdc + i
+            path = []
+            if hops[k] >= 0:
+                parent, node = parents[i], target
+                path.append(names[node])
+                while parent[node] >= 0:
+                    node = parent[node]
+                    path.append(names[node])
+
+            results.append({'pmu': name,
+                            'region': region,
+                            'pdc': pdc_idx,
+                            'home': is_home[k],
+                            'hops': hops[k],
+                            'path': path,
+                            'delay_ms': delay[k],
+                            'jitter_ms': jitter[k],
+                            'bw_mbps': bw[k],
+                            'loss_pct': loss[k],
+                            'within_budget': is_within[k],
+                            })
+
+    home_delay = metrics['delay'][home & reachable]
+    summary = {'pmus': len(targets),
+               'pdcs': len(sources),
+               'without_home_pdc': int(np.sum(~home.any(axis=0))),
+               'home_unreachable': int(np.sum(home & ~reachable)),
+               'home_over_budget': int(np.sum(home & reachable & ~within)),
+               'home_delay_ms_max': round(float(home_delay.max()), 3) if home_delay.size else None,
+               'home_delay_ms_median': round(float(np.median(home_delay)), 3) if home_delay.size else None,
+               }
+
+    return {'budget_ms': budget_ms, 'summary': summary, 'results': results}
+
+
+def format_table(report, home_only=True):
+    """Return the results of a latency report as a text table"""
+    header = '{:<16} {:<8} {:<16} {:>4} {:>10} {:>10} {:>10} {:>8}  {}'.format(
+        'PMU', 'Region', 'PDC', 'Hops', 'Delay(ms)', 'Jitter(ms)', 'BW(Mbps)', 'Loss(%)', 'Budget')
+    lines = [header, '-' * len(header)]
+
+    def fmt(value, spec):
+        return '-' if value is None else format(value, spec)
+
+    for r in report['results']:
+        if home_only and not r['home']:
+            continue
+        lines.append('{:<16} {:<8} {:<16} {:>4} {:>10} {:>10} {:>10} {:>8}  {}'.format(
+            r['pmu'], str(r['region']), r['pdc'], r['hops'] if r['hops'] >= 0 else '-',
+            fmt(r['delay_ms'], '.3f'), fmt(r['jitter_ms'], '.3f'), fmt(r['bw_mbps'], '.1f'),
+            fmt(r['loss_pct'], '.3f'), 'ok' if r['within_budget'] else 'OVER'))
+
+    s = report['summary']
+    lines.append('')
+    lines.append('{p} PMUs, {c} PDCs, budget {b:.1f} ms: {o} over budget and {u} unreachable on the paths to '
+                 'the Region PDCs, {n} PMUs without a Region PDC'.format(
+                     p=s['pmus'], c=s['pdcs'], b=report['budget_ms'], o=s['home_over_budget'],
+                     u=s['home_unreachable'], n=s['without_home_pdc']))
+    return '\n'.join(lines)
+
+
+def dump_json(report, path):
+    """Write a latency report to a JSON file"""
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
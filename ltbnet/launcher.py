@@ -0,0 +1,236 @@
+"""Concurrent MiniPMU launcher with readiness notification and send jitter reports"""
+
+import os
+import json
+import time
+import signal
+import threading
+import subprocess
+import selectors
+import collections
+
+from ltbnet.utils import log
+
+# line written to stdout by `minipmu --notify` once the C37.118 port is listening
+READY = 'MINIPMU READY'
+
+# number of output lines kept of each process after readiness
+TAIL_LINES = 20
+
+
+class PMUProcess(object):
+    """Handle of a MiniPMU process started on a Mininet host"""
+    def __init__(self, name, idx, node, cmd, stats=None):
+        self.name = name
+        self.idx = idx
+        self.node = node
+        self.cmd = cmd
+        self.stats = stats  # path of the send statistics written by the process on exit
+
+        self.proc = None
+        self.t_start = None
+        self.latency = None  # seconds from start to readiness
+        self.error = None
+        self.tail = collections.deque(maxlen=TAIL_LINES)  # last output lines after readiness
+
+        self._buf = b''
+
+    @property
+    def ready(self):
+        return self.latency is not None
+
+    @property
+    def running(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        """Start the process on its Mininet host"""
+        self.t_start = time.perf_counter()
+        try:
+            self.proc = self.node.popen(self.cmd)
+        except OSError as e:
+            self.error = 'failed to start: {}'.format(e)
+
+    def feed(self, data):
+        """Process output from the stdout pipe. Return True when the process is done starting."""
+        if not data:
+            try:
+                ret = self.proc.wait(0.1)
+            except subprocess.TimeoutExpired:
+                ret = None
+            self.error = 'exited with code {} before listening'.format(ret) if ret is not None \
+                else 'closed stdout before listening'
+            return True
+
+        self._buf += data
+        if READY.encode() in self._buf:
+            self.latency = time.perf_counter() - self.t_start
+            self._buf = b''
+            return True
+
+        # keep only the tail that may hold a partial notification
+        self._buf = self._buf[-len(READY):]
+        return False
+
+    def stop(self, timeout=2.0):
+        """Stop the process with SIGTERM, and SIGKILL after `timeout` seconds"""
+        if not self.running:
+            return self.proc.returncode if self.proc is not None else None
+
+        try:
+            self.proc.send_signal(signal.SIGTERM)
+            return self.proc.wait(timeout)
+        except Exception:
+            self.proc.kill()
+            return self.proc.wait()
+
+
+def wait_ready(handles, timeout=10.0):
+    """Wait until all started `handles` notify readiness, exit, or `timeout` seconds pass"""
+    sel = selectors.DefaultSelector()
+    for h in handles:
+        if h.proc is not None and h.proc.stdout is not None:
+            sel.register(h.proc.stdout, selectors.EVENT_READ, h)
+
+    deadline = time.perf_counter() + timeout
+    while sel.get_map():
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+
+        for key, _ in sel.select(remaining):
+            h = key.data
+            if h.feed(os.read(key.fd, 4096)):
+                sel.unregister(key.fileobj)
+
+    for key in list(sel.get_map().values()):
+        key.data.error = 'not listening after {:g} s'.format(timeout)
+    sel.close()
+
+
+def drain_output(handles):
+    """
+    Read the stdout pipes of the ready `handles` in a background thread until the processes close them, so that
+    their output, such as logging to stdout and stderr, does not fill the pipes and block them. The last lines of each
+    process are kept in its `tail`.
+
+    Returns
+    -------
+    threading.Thread
+        the daemon thread reading the pipes
+    """
+    sel = selectors.DefaultSelector()
+    for h in handles:
+        if h.ready and h.proc.stdout is not None:
+            sel.register(h.proc.stdout, selectors.EVENT_READ, [h, b''])
+
+    def run():
+        while sel.get_map():
+            for key, _ in sel.select():
+                h, partial = key.data
+                data = os.read(key.fd, 65536)
+                if not data:
+                    sel.unregister(key.fileobj)
+                    data = b'\n'
+                lines = (partial + data).split(b'\n')
+                key.data[1] = lines.pop()[-4096:]
+                h.tail.extend(line.decode(errors='replace') for line in lines[-TAIL_LINES:] if line)
+        sel.close()
+
+    thread = threading.Thread(target=run, name='minipmu-output', daemon=True)
+    thread.start()
+    return thread
+
+
+def launch(handles, batch_size=32, timeout=10.0):
+    """
+    Start MiniPMU processes in batches of `batch_size` and wait for each batch to listen
+
+    Parameters
+    ----------
+    handles : list of PMUProcess
+        processes to start
+    batch_size : int
+        number of processes started at the same time
+    timeout : float
+        seconds to wait for each batch
+
+    Returns
+    -------
+    dict
+        PMUProcess handles keyed on the Mininet host name
+    """
+    for i in range(0, len(handles), batch_size):
+        batch = handles[i:i + batch_size]
+        for h in batch:
+            h.start()
+        wait_ready([h for h in batch if h.error is None], timeout)
+
+    failed = 0
+    for h in handles:
+        if h.error is None:
+            log.info('{name} idx={idx} listening after {t:.1f} ms\n'.format(name=h.name, idx=h.idx,
+                                                                             t=h.latency * 1000))
+        else:
+            failed += 1
+            log.error('{name} idx={idx} {err}\n'.format(name=h.name, idx=h.idx, err=h.error))
+
+    latency = sorted(h.latency for h in handles if h.ready)
+    if latency:
+        log.info('*** {n} MiniPMUs listening, {f} failed. Startup latency median {m:.1f} ms, max {x:.1f} ms\n'
+                 .format(n=len(latency), f=failed, m=latency[len(latency) // 2] * 1000, x=latency[-1] * 1000))
+    else:
+        log.info('*** No MiniPMU listening, {f} failed\n'.format(f=failed))
+
+    drain_output(handles)
+    return {h.node.name: h for h in handles}
+
+
+def stop_all(handles, timeout=2.0):
+    """Stop the processes in a dict of PMUProcess handles"""
+    for h in handles.values():
+        if h.running:
+            h.proc.send_signal(signal.SIGTERM)
+
+    for h in handles.values():
+        ret = h.stop(timeout)
+        if ret and ret != -signal.SIGTERM:
+            log.error('{name} idx={idx} exited with code {ret}. Last output:\n{tail}\n'.format(
+                name=h.name, idx=h.idx, ret=ret, tail='\n'.join(h.tail)))
+
+
+def collect_stats(handles):
+    """
+    Read the send statistics of stopped MiniPMU processes and log their send jitter
+
+    Returns
+    -------
+    list of dict
+        statistics of each PMU as written by `minipmu --stats`
+    """
+    items = []
+    for h in handles.values():
+        if not h.stats:
+            continue
+        try:
+            with open(h.stats) as f:
+                items.extend(json.load(f))
+        except (OSError, ValueError) as e:
+            log.debug('{name} has no send statistics: {e}\n'.format(name=h.name, e=e))
+
+    def fmt(value):
+        return '-' if value is None else '{:.3f}'.format(value)
+
+    for item in items:
+        log.info('{name} sent {n} frames, interval {i} ms, send jitter median {m} ms, p99 {p} ms, max {x} ms, '
+                 'lag p99 {l} ms, dropped {d} pmudata\n'.format(name=item['name'], n=item['frames'],
+                                            i=fmt(item.get('interval_ms_median')),
+                                            m=fmt(item.get('jitter_ms_median')), p=fmt(item.get('jitter_ms_p99')),
+                                            x=fmt(item.get('jitter_ms_max')), l=fmt(item.get('lag_ms_p99')),
+                                            d=item.get('pmudata_dropped', 0)))
+
+    p99 = sorted(item['jitter_ms_p99'] for item in items if 'jitter_ms_p99' in item)
+    if p99:
+        log.info('*** Send jitter p99 of {n} MiniPMUs: median {m:.3f} ms, max {x:.3f} ms\n'.format(
+            n=len(p99), m=p99[len(p99) // 2], x=p99[-1]))
+    return items
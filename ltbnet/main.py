@@ -1,42 +1,90 @@
 """Main function of the LTBNet executable"""
 
 import os
+import json
+import shutil
 import argparse
+import tempfile
 
-from ltbnet.network import Network
-from ltbnet.parser import parse_config
-from ltbnet.graph import make_graph, draw_shortest_path, plt
+from ltbnet.utils import log
+from ltbnet.cache import setup_network
+from ltbnet.profiler import StartupProfiler
+from ltbnet.addressing import DEFAULT_SUPERNET
 
-from mininet import log
-
-from mininet.node import ( Node, Host, OVSKernelSwitch, DefaultController, RemoteController,
-                           Controller )
-
-from mininet.link import TCLink
-from mininet.net import Mininet
-from mininet.cli import CLI
+# Mininet, MiniPMU and the graph modules are imported by the commands that use them so that parsing, validating
+# and exporting configs start quickly on hosts without Mininet or Graphviz.
 
 
 def main(*args, **kwargs):
     """LTBNet Main function"""
     parser = argparse.ArgumentParser(description="CURENT LTB network emulator")
-    parser.add_argument('config', help='PMU network configuration file in csv format')
+    parser.add_argument('config', nargs='?', help='PMU network configuration file in csv or json format')
     parser.add_argument('-c', dest='clean', action='store_true',
                         help='clean MiniPMU and Mininet processes')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='enable INFO level verbose logging')
     parser.add_argument('--runpmu', help='run LTBPMU processes on the specified PMU hosts',
                         action='store_true')
+    parser.add_argument('--pmu_cpus', metavar='LIST',
+                        help='CPU list such as 2-7 to pin the MiniPMU processes to, one CPU each in turn')
+    parser.add_argument('--pmu_rt_priority', type=int, metavar='PRIO',
+                        help='SCHED_FIFO real-time priority (1-99) of the MiniPMU processes')
+    parser.add_argument('--pmu_nice', type=int, help='nice value of the MiniPMU processes without --pmu_rt_priority')
+    parser.add_argument('--pmu_stats', metavar='PATH',
+                        help='write the send jitter statistics of the MiniPMUs to a JSON file when they stop')
+    parser.add_argument('--pmu_record_dir', metavar='DIR',
+                        help='directory of the MiniPMU recording files, kept and replayed across runs')
     parser.add_argument('--graph', help='show graph visualization', action='store_true')
+    parser.add_argument('--graph_output', metavar='PATH',
+                        help='render the graph to a png, svg, pdf or geojson file without a display and exit')
+    parser.add_argument('--layout', choices=('geo', 'graphviz'), default='geo',
+                        help='graph layout from the node coordinates or from graphviz (default: %(default)s)')
     parser.add_argument('--source_node', help='name of the source node')
     parser.add_argument('--target_node', help='name of the destination node')
 
     parser.add_argument('--parse_only', help='parse the input file only without '
                                              'creating topology', action='store_true')
+    parser.add_argument('--export', metavar='PATH',
+                        help='export the parsed configuration to a csv or json file and exit')
+    parser.add_argument('--latency', action='store_true',
+                        help='print the delay, jitter, bandwidth and loss of the PMU-to-PDC paths and exit')
+    parser.add_argument('--latency_json', metavar='PATH',
+                        help='write the paths from every PMU to every PDC to a JSON file and exit')
+    parser.add_argument('--budget', type=float, metavar='MS',
+                        help='one-way delay budget of the latency analysis in ms (default: 66.7, two reporting '
+                             'periods at 30 fps)')
+    parser.add_argument('--plan', action='store_true',
+                        help='print the PMU stream load and utilization of the links and exit')
+    parser.add_argument('--plan_json', metavar='PATH', help='write the link capacity plan to a JSON file and exit')
+    parser.add_argument('--subscribe', action='append', metavar='PDC=SOURCE[,SOURCE...]',
+                        help='extra PDC subscribing to PMU idx, Region names or * in the capacity plan, the '
+                             'outage analysis and the static ARP entries of --proactive')
+    parser.add_argument('--max_utilization', type=float, default=0.8,
+                        help='link utilization flagged by the capacity plan (default: %(default)s)')
+    parser.add_argument('--whatif', action='store_true',
+                        help='print the single link and switch outages that strand or delay PMU streams and exit')
+    parser.add_argument('--whatif_json', metavar='PATH',
+                        help='write the single link and switch outage analysis to a JSON file and exit')
+    parser.add_argument('--supernet', default=DEFAULT_SUPERNET,
+                        help='supernet from which each Region gets a subnet (default: %(default)s)')
+    parser.add_argument('--prefixlen', type=int,
+                        help='prefix length of the Region subnets (default: sized by the host count, at most /24)')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='do not load or save the compiled topology cache')
 
     parser.add_argument('--remote', '-r', action='store_true',
                         help='use remote controller (Ryu tested)')
+    parser.add_argument('--proactive', action='store_true',
+                        help='run without a controller and install static flows and ARP entries computed from the '
+                             'topology before the PMUs start')
+    parser.add_argument('--batch_tc', action='store_true',
+                        help='shape links with one tc -batch per namespace instead of tc commands per interface')
+    parser.add_argument('--schedule', metavar='PATH',
+                        help='csv or json schedule of link impairments to apply while the network runs')
     parser.add_argument('--dump_sw', action='store_true', help="dump switch-port-node mapping to a csv file")
+    parser.add_argument('--profile_startup', '--profile-startup', nargs='?', const='ltbnet_startup.json',
+                        metavar='PATH', help='record wall and CPU time of the startup phases to a JSON file '
+                                             '(default: ltbnet_startup.json)')
 
     cli_args = parser.parse_args()
 
@@ -48,46 +96,192 @@ def main(*args, **kwargs):
         clean()
         return
 
-    config = parse_config(cli_args.config)
-    network = Network().setup(config)
+    if not cli_args.config:
+        parser.error('the config file is required')
+
+    profiler = StartupProfiler(enabled=cli_args.profile_startup is not None)
+
+    network = setup_network(cli_args.config, use_cache=not cli_args.no_cache, profiler=profiler,
+                            supernet=cli_args.supernet, prefixlen=cli_args.prefixlen)
+
+    if cli_args.export:
+        export(network, cli_args.export)
+
+    if cli_args.graph or cli_args.graph_output:
+        with profiler.phase('import_graph'):
+            from ltbnet.graph import make_graph, render
+
+        with profiler.phase('graph'):
+            network_graph, node_pos = make_graph(network, layout=cli_args.layout)
+            render(network_graph, node_pos, cli_args.graph_output,
+                   source=cli_args.source_node, target=cli_args.target_node)
+        if cli_args.graph_output:
+            log.info('*** Graph written to {}\n'.format(cli_args.graph_output))
+
+    if cli_args.latency or cli_args.latency_json:
+        with profiler.phase('latency'):
+            latency(network, cli_args)
+
+    if cli_args.plan or cli_args.plan_json:
+        with profiler.phase('plan'):
+            capacity_plan(network, cli_args)
 
-    if cli_args.graph:
-        network_graph, node_pos = make_graph(network)
-        if cli_args.source_node and cli_args.target_node:
-            network_graph = draw_shortest_path(network_graph, node_pos,
-                                               cli_args.source_node, cli_args.target_node)
-        plt.show()
+    if cli_args.whatif or cli_args.whatif_json:
+        with profiler.phase('whatif'):
+            whatif(network, cli_args)
 
-    if cli_args.parse_only:
-        log.debug('Parse input file only. Exiting.')
+    if cli_args.parse_only or cli_args.export or cli_args.graph_output or cli_args.latency or \
+            cli_args.latency_json or cli_args.plan or cli_args.plan_json or cli_args.whatif or cli_args.whatif_json:
+        log.debug('Parse input file only. Topology cache is up to date. Exiting.')
+        save_profile(profiler, cli_args)
         return
 
-    if cli_args.remote:
+    steps = None
+    if cli_args.schedule:
+        from ltbnet.schedule import load_schedule, ImpairmentScheduler
+        steps = load_schedule(cli_args.schedule)
+
+    with profiler.phase('import_mininet'):
+        from mininet.node import DefaultController, RemoteController
+        from mininet.link import Link, TCLink
+        from mininet.net import Mininet
+        from mininet.cli import CLI
+
+    if cli_args.proactive:
+        from ltbnet.flows import assign_macs, FlowPlan
+        from ltbnet.capacity import parse_subscriptions
+        if cli_args.remote:
+            log.warn('*** Proactive forwarding does not use the remote controller\n')
+        controller = None
+        assign_macs(network)
+    elif cli_args.remote:
         controller = RemoteController
     else:
         controller = DefaultController
 
-    net = Mininet(topo=network, link=TCLink, controller=controller)
+    # with batched shaping, links are created unshaped and shaped with `tc -batch` afterwards
+    batch = None
+    if cli_args.batch_tc:
+        from ltbnet.shaping import TCBatch
+        batch = TCBatch()
+
+    with profiler.phase('mininet'):
+        net = Mininet(topo=network, link=TCLink if batch is None else Link, controller=controller)
 
     if network.HwIntf.n:
-        network.add_hw_intf(net)
+        with profiler.phase('add_hw_intf', component='HwIntf'):
+            network.add_hw_intf(net)
     if network.TCHwIntf.n:
-        network.add_tc_hw_intf(net)
+        with profiler.phase('add_tc_hw_intf', component='TCHwIntf'):
+            network.add_tc_hw_intf(net, batch)
+    if batch is not None:
+        with profiler.phase('shape_links', component='Link'):
+            network.shape_links(net, batch)
+            batch.apply()
 
     if cli_args.dump_sw:
         network.dump_sw_port_node(net)
 
-    net.start()
+    with profiler.phase('net_start'):
+        net.start()
+    if cli_args.proactive:
+        with profiler.phase('install_flows', component='Switch'):
+            FlowPlan(network, net, subscriptions=parse_subscriptions(cli_args.subscribe)).install(concurrent=True)
+    with profiler.phase('add_routes'):
+        network.add_routes(net)
     print('LTBNet Ready')
+    stats_dir = None
     if cli_args.runpmu:
-        network.PMU.run_pmu(net)
+        stats_dir = tempfile.mkdtemp(prefix='ltbnet-pmu-')
+        with profiler.phase('run_pmu', component='PMU'):
+            network.PMU.run_pmu(net, cpus=cli_args.pmu_cpus, rt_priority=cli_args.pmu_rt_priority,
+                                nice=cli_args.pmu_nice, stats_dir=stats_dir, record_dir=cli_args.pmu_record_dir)
+
+    scheduler = None
+    if steps:
+        scheduler = ImpairmentScheduler(network, net, steps)
+        scheduler.start()
+        log.info('*** Impairment schedule of {n} steps started\n'.format(n=len(steps)))
+
+    save_profile(profiler, cli_args)
     CLI(net)
 
-    print('Stopping MiniPMUs - enter your root password if prompted')
-    os.system("sudo pkill minipmu")
+    if scheduler is not None:
+        scheduler.stop()
+    if network.PMU.processes:
+        print('Stopping MiniPMUs')
+        stats = network.PMU.stop_pmu()
+        if cli_args.pmu_stats:
+            with open(cli_args.pmu_stats, 'w') as f:
+                json.dump(stats, f, indent=2)
+            log.info('*** MiniPMU send statistics written to {}\n'.format(cli_args.pmu_stats))
+    if stats_dir is not None:
+        shutil.rmtree(stats_dir, ignore_errors=True)
     net.stop()
 
 
+def export(network, path):
+    """Export the configuration of a Network to a csv or json file based on the extension of `path`"""
+    fmt = os.path.splitext(path)[1][1:]
+    if fmt == 'json':
+        network.dump_json(path)
+    elif fmt == 'csv':
+        network.dump_csv(path)
+    else:
+        raise NotImplementedError('File format {} not supported'.format(fmt))
+    log.info('*** Configuration exported to {}\n'.format(path))
+
+
+def latency(network, cli_args):
+    """Print and export the latency budget analysis of the PMU-to-PDC paths"""
+    from ltbnet import latency as analysis
+
+    budget = cli_args.budget if cli_args.budget is not None else analysis.DEFAULT_BUDGET_MS
+    report = analysis.analyze(network, budget_ms=budget)
+
+    if cli_args.latency:
+        print(analysis.format_table(report))
+    if cli_args.latency_json:
+        analysis.dump_json(report, cli_args.latency_json)
+        log.info('*** Latency report written to {}\n'.format(cli_args.latency_json))
+
+
+def capacity_plan(network, cli_args):
+    """Print and export the link capacity plan of the PMU streams"""
+    from ltbnet import capacity
+
+    report = capacity.plan(network, subscriptions=capacity.parse_subscriptions(cli_args.subscribe),
+                           max_utilization=cli_args.max_utilization)
+
+    if cli_args.plan:
+        print(capacity.format_table(report, limit=25))
+    if cli_args.plan_json:
+        capacity.dump_json(report, cli_args.plan_json)
+        log.info('*** Capacity plan written to {}\n'.format(cli_args.plan_json))
+
+
+def whatif(network, cli_args):
+    """Print and export the single link and switch outage analysis"""
+    from ltbnet import capacity, contingency
+
+    report = contingency.analyze(network, subscriptions=capacity.parse_subscriptions(cli_args.subscribe))
+
+    if cli_args.whatif:
+        print(contingency.format_table(report, limit=25))
+    if cli_args.whatif_json:
+        contingency.dump_json(report, cli_args.whatif_json)
+        log.info('*** Outage analysis written to {}\n'.format(cli_args.whatif_json))
+
+
+def save_profile(profiler, cli_args):
+    """Write the startup profile if requested from the command line"""
+    if not profiler.enabled:
+        return
+
+    profiler.dump_json(cli_args.profile_startup, config=os.path.abspath(cli_args.config))
+    log.info('*** Startup profile written to {}\n'.format(cli_args.profile_startup))
+
+
 def clean(*args, **kwargs):
     """Clean up MiniPmu processes and Mininet sessions"""
     os.system("sudo mn -c")
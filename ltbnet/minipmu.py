@@ -1,11 +1,19 @@
 """Python module to request PMU data from a running ANDES
 """
 
+import os
+import sys
+import json
+import queue
+import signal
 import logging
+import threading
 import time
 import argparse
 import numpy as np
 
+from collections import deque
+
 from math import pi
 from enum import Enum
 
@@ -16,6 +24,9 @@ from numpy import array, ndarray, zeros
 from synchrophasor.pmu import Pmu
 from synchrophasor.frame import ConfigFrame2, HeaderFrame
 
+from ltbnet.utils import parse_cpus
+from ltbnet.storage import RingBuffer, Recording
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.WARNING)
 
@@ -32,6 +43,20 @@ logger.setLevel(logging.WARNING)
 # -----------------------------
 
 
+# channel names of a PMU block after its phasor
+CHANNEL_NAMES = ["ANALOG1", "BREAKER 1 STATUS",
+                 "BREAKER 2 STATUS", "BREAKER 3 STATUS", "BREAKER 4 STATUS", "BREAKER 5 STATUS",
+                 "BREAKER 6 STATUS", "BREAKER 7 STATUS", "BREAKER 8 STATUS", "BREAKER 9 STATUS",
+                 "BREAKER A STATUS", "BREAKER B STATUS", "BREAKER C STATUS", "BREAKER D STATUS",
+                 "BREAKER E STATUS", "BREAKER F STATUS", "BREAKER G STATUS"]
+
+# STAT word of the PMU blocks, the default of `Pmu.send_data`
+STAT_OK = ("ok", True, "timestamp", False, False, False, 0, "<10", 0)
+
+# seconds the process loops block for DiME variables before waking up
+DRAIN_TIMEOUT = 1.0
+
+
 class RecordState(Enum):
     """PMU record-replay state"""
     IDLE = 0
@@ -40,11 +65,140 @@ class RecordState(Enum):
     REPLAYING = 3
 
 
+class SendStats(object):
+    """
+    Timing of the data frames sent by a MiniPMU
+
+    The intervals between consecutive sends and the lags from the arrival of `pmudata` to the end of each send are
+    kept for the last `size` frames. The deviations of the intervals from their median are the send jitter caused by
+    the emulation host, apart from the jitter of the emulated links.
+    """
+    def __init__(self, size=4096):
+        self.intervals = deque(maxlen=size)
+        self.lags = deque(maxlen=size)
+        self.frames = 0
+        self.last = None
+
+    def add(self, t_recv, t_sent):
+        """Add a frame that arrived at `t_recv` and was sent at `t_sent`, both from `time.perf_counter`"""
+        if self.last is not None:
+            self.intervals.append(t_sent - self.last)
+        if t_recv is not None:
+            self.lags.append(t_sent - t_recv)
+        self.last = t_sent
+        self.frames += 1
+
+    def summary(self):
+        """Return the send statistics in milliseconds as a dict"""
+        out = {'frames': self.frames}
+
+        if self.intervals:
+            intervals = np.array(self.intervals) * 1000
+            median = np.median(intervals)
+            jitter = np.abs(intervals - median)
+            out.update(interval_ms_median=round(float(median), 3),
+                       jitter_ms_median=round(float(np.median(jitter)), 3),
+                       jitter_ms_p99=round(float(np.percentile(jitter, 99)), 3),
+                       jitter_ms_max=round(float(jitter.max()), 3))
+
+        if self.lags:
+            lags = np.array(self.lags) * 1000
+            out.update(lag_ms_median=round(float(np.median(lags)), 3),
+                       lag_ms_p99=round(float(np.percentile(lags, 99)), 3),
+                       lag_ms_max=round(float(lags.max()), 3))
+
+        return out
+
+
+class DimeReceiver(object):
+    """
+    Receive DiME variables in a background thread
+
+    The thread blocks in `dimec.wait` until variables are pending, syncs
+    them one by one and queues each pending batch of names and values. The
+    variables are synced one at a time because the DiME workspace keeps only
+    the latest value of each name. DiME clients without `wait` cannot block,
+    so they are polled with a backoff: the interval starts at `poll` seconds
+    after variables arrive and doubles up to `max_poll` while idle. The
+    thread is the only user of the DiME connection once started.
+
+    `drain` blocks up to a timeout and returns every queued variable in
+    order. All `pmudata` but the newest are marked stale: they are still
+    stored and recorded, but a MiniPMU falling behind does not send them.
+    """
+    def __init__(self, dimec, poll=0.001, max_poll=0.05):
+        self.dimec = dimec
+        self.poll = poll
+        self.max_poll = max_poll
+        self.queue = queue.Queue()
+        self.received = 0  # variables received
+        self.error = None
+
+        self._thread = threading.Thread(target=self.run, name='dime-receiver', daemon=True)
+
+    def start(self):
+        """Start the receiving thread"""
+        self._thread.start()
+
+    def run(self):
+        """Queue the batches of variables synced from DiME until an error"""
+        wait = getattr(self.dimec, 'wait', None)
+        interval = self.poll
+        try:
+            while True:
+                if wait is not None:
+                    wait()
+                batch = []
+                while True:
+                    names = list(self.dimec.sync(1))
+                    if not names:
+                        break
+                    batch.append((names[0], self.dimec.workspace[names[0]]))
+
+                if batch:
+                    self.queue.put(batch)
+                    interval = self.poll
+                elif wait is None:
+                    time.sleep(interval)
+                    interval = min(2 * interval, self.max_poll)
+        except Exception as e:
+            logger.exception(e)
+            self.error = e
+            self.queue.put(None)
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """
+        Return all queued variables in order as a list of (name, value,
+        stale), where `stale` is True for every `pmudata` but the newest.
+        Wait up to `timeout` seconds if none are queued.
+
+        :return: list of (name, value, stale), empty after the timeout
+        """
+        try:
+            batches = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                batches.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if None in batches:
+            raise RuntimeError('DiME receiver stopped: {}'.format(self.error))
+
+        items = [item for batch in batches for item in batch]
+        self.received += len(items)
+
+        newest = max((i for i, (name, _) in enumerate(items) if name == 'pmudata'), default=-1)
+        return [(name, value, name == 'pmudata' and i != newest) for i, (name, value) in enumerate(items)]
+
+
 class MiniPMU(object):
 
     def __init__(self, name: str='', dime_address: str='ipc:///tmp/dime',
                  pmu_idx: list=list(), max_store: int=1000, pmu_ip: str='0.0.0.0', pmu_port: int=1410,
-                 **kwargs):
+                 notify: bool=False, dimec=None, record_path: str=None, **kwargs):
         """
         Create a MiniPMU instance for PMU data streaming over Mininet.
 
@@ -58,6 +212,16 @@ class MiniPMU(object):
         max_store
         pmu_ip
         pmu_port
+        notify
+            write a readiness line to stdout once the PMU port is listening
+        dimec
+            connected DiME client shared with other MiniPMUs. A new client is created and joined if not given
+        record_path
+            file of the memory-mapped recording, which is replayed after a
+            restart. It must have been recorded for the same `pmu_idx`.
+            Starting to record appends to the rows of an existing file;
+            flush the storage first to start a new recording. Recordings
+            are kept in memory if not given
         kwargs
         """
         assert name, 'PMU Receiver name is empty'
@@ -66,22 +230,35 @@ class MiniPMU(object):
         self.dime_address = dime_address
         self.pmu_idx = pmu_idx
         self.max_store = max_store
-
-        # for recording
-        self.max_store_record = 30 * 600  # 600 seconds
+        self.notify = notify
+
+        # recorded measurements, appended to the file `record_path` if given
+        self.recording = Recording(record_path, 3 * len(pmu_idx), rate=30,
+                                   meta={'name': name, 'pmu_idx': list(pmu_idx),
+                                         'columns': ['vm', 'am', 'w']})
+        recorded = list(self.recording.meta.get('pmu_idx', pmu_idx))
+        if recorded != list(pmu_idx):
+            self.recording.close()
+            raise ValueError('Recording {p} was made for PMU idx {r}, not {i}'
+                             .format(p=record_path, r=recorded, i=list(pmu_idx)))
 
         self.reset = True
         self.pmu_configured = False
         self.pmu_streaming = False
 
+        self.send_stats = SendStats()
+        self.dropped = 0  # stale pmudata stored but not sent
+        self.t_recv = None  # arrival time of the latest pmudata
+
+        # latest `max_store` measurements, allocated once
+        self.t = RingBuffer(max_store, 1)
+        self.data = RingBuffer(max_store, 3 * len(pmu_idx))
+
         self.reset_var()
 
-        spl = dime_address.split(":")
-        spl[1] = spl[1][2:]
-        if len(spl) == 3:
-            spl[2] = int(spl[2])
-        self.dimec = DimeClient(*spl)
-        self.dimec.join(self.name)
+        if dimec is None:
+            dimec = connect_dime(dime_address, self.name)
+        self.dimec = dimec
 
         self.pmu = Pmu(ip=pmu_ip, port=pmu_port)
 
@@ -101,6 +278,12 @@ class MiniPMU(object):
 
         self.fn = 60
         self.Vn = []
+        self.vgsvaridx = array([], dtype=int)
+        self.scale = None
+        self.frame = None
+        self.rocof = None
+        self.freq_prev = None
+        self.t_frame = None
 
         self.Varheader = list()
         self.Idxvgs = dict()
@@ -108,17 +291,13 @@ class MiniPMU(object):
         self.SysName = dict()
         self.Varvgs = ndarray([])
 
-        self.t = ndarray([])
-        self.data = ndarray([])
-        self.count = 0
+        self.t.clear()
+        self.data.clear()
 
-        # recording storage
+        # recording state. A recording file kept from an earlier run is ready for replay
         if not retain_data:
-            self.t_record = ndarray([])
-            self.data_record = ndarray([])
-            self.count_record = 0
-            self.counter_replay = 0  # replay index into `data_record` and `t_record`
-            self.record_state = RecordState.IDLE
+            self.counter_replay = 0  # replay index into `recording`
+            self.record_state = RecordState.RECORDED if len(self.recording) else RecordState.IDLE
 
         self.last_data = None
         self.last_t = None
@@ -164,7 +343,8 @@ class MiniPMU(object):
 
     def get_bus_Vn(self):
         """
-        Retrieve Bus.Vn
+        Retrieve Bus.Vn of each bus in ``self.pmu_idx``, which uses
+        1-indexing like ``get_bus_name`` and ``find_var_idx``
 
         Returns
         -------
@@ -173,36 +353,37 @@ class MiniPMU(object):
         self.Vn = [1] * len(self.pmu_idx)
 
         for i, idx in enumerate(self.pmu_idx):
-            self.Vn[i] = self.SysParam['Bus']['Vn'][idx] * 1000  # get Vn
+            self.Vn[i] = self.SysParam['Bus']['Vn'][idx - 1] * 1000  # get Vn
 
-        logger.info('Retrieved bus Vn %g', self.Vn)
+        logger.info('Retrieved bus Vn %s', self.Vn)
 
     def config_pmu(self):
         """
-        Sets the ConfigFrame2 of the PMU
+        Sets the ConfigFrame2 of the PMU. Each bus in `self.pmu_idx` is one
+        PMU block of the data frame, named after the bus, with its own
+        phasor, frequency and ROCOF, so that all buses share one stream.
 
         :return: None
         """
+        npmu = len(self.pmu_idx)
+        station = self.per_station
+        names = [str(name)[:16] for name in self.bus_name]
 
         self.cfg = ConfigFrame2(pmu_id_code=self.pmu_idx[0],  # PMU_ID
                            time_base=1000000,  # TIME_BASE
-                           num_pmu=1,  # Number of PMUs included in data frame
-                           station_name=self.bus_name[0],  # Station name
-                           id_code=self.pmu_idx[0],  # Data-stream ID(s)
-                           data_format=(True, True, True, True),  # Data format - POLAR; PH - REAL; AN - REAL; FREQ - REAL;
-                           phasor_num=1,  # Number of phasors
-                           analog_num=1,  # Number of analog values
-                           digital_num=1,  # Number of digital status words
-                            channel_names=["V_PHASOR", "ANALOG1", "BREAKER 1 STATUS",
-                            "BREAKER 2 STATUS", "BREAKER 3 STATUS", "BREAKER 4 STATUS", "BREAKER 5 STATUS",
-                            "BREAKER 6 STATUS", "BREAKER 7 STATUS", "BREAKER 8 STATUS", "BREAKER 9 STATUS",
-                            "BREAKER A STATUS", "BREAKER B STATUS", "BREAKER C STATUS", "BREAKER D STATUS",
-                            "BREAKER E STATUS", "BREAKER F STATUS", "BREAKER G STATUS"],  # Channel Names
-                           ph_units=[(0, 'v')],  # Conversion factor for phasor channels - (float representation, not important)
-                           an_units=[(1, 'pow')],  # Conversion factor for analog channels
-                           dig_units=[(0x0000, 0xffff)],  # Mask words for digital status words
-                           f_nom=60.0,  # Nominal frequency
-                           cfg_count=1,  # Configuration change count
+                           num_pmu=npmu,  # Number of PMUs included in data frame
+                           station_name=station(names),  # Station name
+                           id_code=station(list(self.pmu_idx)),  # Data-stream ID(s)
+                           data_format=station([(True, True, True, True)] * npmu),  # Data format - POLAR; PH - REAL; AN - REAL; FREQ - REAL;
+                           phasor_num=station([1] * npmu),  # Number of phasors
+                           analog_num=station([1] * npmu),  # Number of analog values
+                           digital_num=station([1] * npmu),  # Number of digital status words
+                           channel_names=station([[('V_' + name)[:16]] + CHANNEL_NAMES for name in names]),  # Channel Names
+                           ph_units=station([[(0, 'v')]] * npmu),  # Conversion factor for phasor channels - (float representation, not important)
+                           an_units=station([[(1, 'pow')]] * npmu),  # Conversion factor for analog channels
+                           dig_units=station([[(0x0000, 0xffff)]] * npmu),  # Mask words for digital status words
+                           f_nom=station([float(self.fn)] * npmu),  # Nominal frequency
+                           cfg_count=station([1] * npmu),  # Configuration change count
                            data_rate=30)  # Rate of phasor data transmission)
 
         self.hf = HeaderFrame(self.pmu_idx[0],  # PMU_ID
@@ -212,6 +393,16 @@ class MiniPMU(object):
         self.pmu.set_header(self.hf)
         # self.pmu.run()
 
+    def per_station(self, values):
+        """
+        Return the list `values` with one item per bus as expected by
+        `synchrophasor` for the PMU blocks: the list itself for several
+        buses and its only item for one bus
+
+        :return: list or item
+        """
+        return values if len(self.pmu_idx) > 1 else values[0]
+
     def find_var_idx(self):
         """
         Returns a dictionary of the indices into Varheader based on
@@ -232,66 +423,68 @@ class MiniPMU(object):
         self.var_idx['am'] = [npmu + int(i) - 1 for i in self.pmu_idx]
         self.var_idx['w'] = [2 * npmu + int(i) - 1 for i in self.pmu_idx]
 
-    # TODO: make it static
-    @property
-    def vgsvaridx(self):
-        return array(self.var_idx['vm'] +
-                     self.var_idx['am'] +
-                     self.var_idx['w'], dtype=int)
+        # gather index of vm, am and w in `pmudata`, built once per reset cycle
+        self.vgsvaridx = array(self.var_idx['vm'] +
+                               self.var_idx['am'] +
+                               self.var_idx['w'], dtype=int)
 
-    def init_storage(self, flush=False):
+    def init_frame(self):
         """
-        Initialize data storage `self.t` and `self.data`
+        Precompute the scale vector of the measurements and allocate the
+        buffer of the frame values, once per reset cycle after
+        `find_var_idx` and `get_bus_Vn`
 
-        :return: if the storage has been reset
+        :return None
         """
-        # TODO: make it more efficient??
-        ret = False
-
-        if self.count % self.max_store == 0:
-            self.t = zeros(shape=(self.max_store, 1), dtype=float)
-            self.data = zeros(shape=(self.max_store, len(self.pmu_idx * 3)),
-                              dtype=float)
-            self.count = 0
-            ret = True
-        else:
-            ret = False
-
-        if (self.count_record % self.max_store_record == 0) or (flush is True):
-            self.t_record = zeros(shape=(self.max_store_record, 1),
-                                  dtype=float)
-            self.data_record = zeros(shape=(self.max_store_record,
-                                     len(self.pmu_idx * 3)), dtype=float)
-            self.count_record = 0
-            self.counter_replay = 0
+        npmu = len(self.pmu_idx)
+        self.scale = np.concatenate((np.array(self.Vn, dtype=float),
+                                     np.ones(npmu),
+                                     np.full(npmu, float(self.fn))))
+        self.frame = zeros(3 * npmu)
+        self.rocof = zeros(npmu)
+        self.freq_prev = zeros(npmu)
+        self.t_frame = None
+
+        # constant values of the PMU blocks
+        self.analog = self.per_station([[9.99]] * npmu)
+        self.digital = self.per_station([[0x0001]] * npmu)
+        self.stat = self.per_station([STAT_OK] * npmu)
+
+    def scale_frame(self, t, values):
+        """
+        Scale gathered measurements `values` of vm, am and w at time `t` into
+        the frame buffer with one multiplication, wrap the angles in place
+        and compute the ROCOF of each bus from the previous frame
 
-            ret = ret and True
+        :return: (v_mag, v_ang, v_freq, rocof) as views into the buffers
+        """
+        npmu = len(self.pmu_idx)
+        frame = np.multiply(values, self.scale, out=self.frame)
+        wrap_angle(frame[npmu:2*npmu], out=frame[npmu:2*npmu])
+        v_freq = frame[2*npmu:]
+
+        # no ROCOF across gaps, restarts of a replay or switches to it
+        dt = t - self.t_frame if self.t_frame is not None else 0.
+        if 0. < dt <= 1.:
+            np.subtract(v_freq, self.freq_prev, out=self.rocof)
+            self.rocof /= dt
         else:
-            ret = False
+            self.rocof.fill(0.)
+        self.freq_prev[:] = v_freq
+        self.t_frame = t
 
-        return ret
+        return frame[:npmu], frame[npmu:2*npmu], v_freq, self.rocof
 
-    def sync_and_handle(self):
+    def handle_var(self, var, data):
         """
-        Sync and call data processing functins
+        Handle the synced variable `var` with value `data`
 
-        :return:
+        :return: var
         """
-        ret = False
-
-        var = list(self.dimec.sync(1))
-
-        if len(var) == 0:
-            return ret
-        
-        var = var[0]
-
         if self.reset is True:
             logger.info('[%s] variable <%s> synced.',
                         self.name, var)
 
-        data = self.dimec.workspace[var]
-
         if var in ('SysParam', 'Idxvgs', 'Varheader'):
             # only handle these three variables during reset cycle
 
@@ -304,6 +497,7 @@ class MiniPMU(object):
             # only handle pmudata during normal cycle
             if self.reset is False:
                 logger.info('In, t=%.4f', data['t'])
+                self.t_recv = time.perf_counter()
                 self.handle_measurement_data(data)
             # else:
             #     logger.info('{} not handled during reset cycle'.format(var))
@@ -320,7 +514,8 @@ class MiniPMU(object):
         elif var == 'pmucmd' and isinstance(data, dict):
             cmd = ''
             if data.get('record', 0) == 1:
-                # start recording
+                # start recording, appending to the rows of the recording,
+                # including those of a recording file of an earlier run
                 if self.record_state == RecordState.IDLE \
                         or self.record_state == RecordState.RECORDED:
 
@@ -334,7 +529,8 @@ class MiniPMU(object):
                 # stop recording if started
                 if self.record_state == RecordState.RECORDING:
                     cmd = 'stop recording'
-                    self.record_state = RecordState.RECORDED
+                    self.recording.flush()
+                    self.record_state = RecordState.RECORDED if len(self.recording) else RecordState.IDLE
                 # else:
                 #     logger.warning('cannot stop recording in state {}'
                 #                    .format(self.record_state))
@@ -358,7 +554,8 @@ class MiniPMU(object):
             if data.get('flush', 0) == 1:
                 # flush storage
                 cmd = 'flush storage'
-                self.init_storage(flush=True)
+                self.recording.clear()
+                self.counter_replay = 0
                 self.record_state = RecordState.IDLE
 
             # if cmd:
@@ -376,55 +573,79 @@ class MiniPMU(object):
 
         :return: (t, vars)
         """
-        self.init_storage()
-
-        self.data[self.count, :] = data['vars'][self.vgsvaridx]
-        self.t[self.count, :] = data['t']
-        self.count += 1
+        values = data['vars'][self.vgsvaridx]
+        self.data.append(values)
+        self.t.append(data['t'])
 
         # record
         if self.record_state == RecordState.RECORDING:
-            self.data_record[self.count_record, :] = \
-                    data['vars'][self.vgsvaridx]
-
-            self.t_record[self.count_record, :] = data['t']
-            self.count_record += 1
+            self.recording.append(data['t'], values)
 
         self.last_data = data['vars']
         self.last_t = data['t']
 
         return data['t'], data['vars']
 
-    def run(self):
+    def last_window(self, n=None):
+        """
+        Return the latest `n` measurements as read-only views without
+        copying, oldest first. All stored measurements if `n` is None.
+
+        :return: (t, data) with `n` rows each
+        """
+        return self.t.last(n), self.data.last(n)
+
+    def stats(self):
+        """
+        Return the send statistics of the PMU with its name and indices
+
+        :return: dict
+        """
+        out = {'name': self.name, 'pmu_idx': list(self.pmu_idx)}
+        out.update(self.send_stats.summary())
+        out['pmudata_dropped'] = self.dropped
+        return out
+
+    def close(self):
         """
-        Process control function
+        Write the recording to disk and close its file
 
         :return None
         """
-        self.start_dime()
-        self.pmu.run()
+        self.recording.close()
 
-        while True:
-            if self.reset is True:
-                # receive init and respond
-                # logger.info('[{name}] Entering reset mode..'
-                #             .format(name=self.name))
+    def start(self):
+        """
+        Start the C37.118 server and notify readiness if requested
 
-                while True:
-                    var = self.sync_and_handle()
+        :return None
+        """
+        self.start_dime()
+        self.pmu.run()
 
-                    if var is False:
-                        time.sleep(0.01)
+        if self.notify:
+            # the launcher in `ltbnet.launcher` waits for this line
+            print('MINIPMU READY {}'.format(self.pmu.port), flush=True)
 
-                    if len(self.Varheader) > 0\
-                            and len(self.Idxvgs) > 0\
-                            and len(self.SysParam) > 0 \
-                            and len(self.SysName) > 0:
+    def process(self, var, stale=False):
+        """
+        Advance the PMU after handling the synced variable `var`. In the
+        reset cycle, configure the PMU once the system information is
+        complete; otherwise, send out fresh or replayed measurements.
+        A `stale` pmudata, followed by a newer one, is counted as dropped
+        instead of being sent.
 
-                        self.find_var_idx()
-                        self.get_bus_Vn()
+        :return None
+        """
+        if self.reset is True:
+            if len(self.Varheader) > 0\
+                    and len(self.Idxvgs) > 0\
+                    and len(self.SysParam) > 0 \
+                    and len(self.SysName) > 0:
 
-                        break
+                self.find_var_idx()
+                self.get_bus_Vn()
+                self.init_frame()
 
                 self.respond_to_sim()
 
@@ -433,74 +654,268 @@ class MiniPMU(object):
                     self.pmu_configured = True
 
                 self.reset = False
+            return
+
+        if var == 'pmudata' and stale:
+            self.dropped += 1
+        elif var == 'pmudata' and self.pmu.clients:
+            self.send_measurement()
 
-            # logger.debug('Entering sync and short sleep...')
+    def send_measurement(self):
+        """
+        Send the latest or the replayed measurement to the PMU clients
+
+        :return None
+        """
+        if self.record_state == RecordState.REPLAYING:
+            # prepare recorded data, read from the recording file row by row
+            t, row = self.recording.row(self.counter_replay)
+            v_mag, v_ang, v_freq, rocof = self.scale_frame(t, row)
+            self.counter_replay += 1
+
+            # at the end of replay, reset
+            if self.counter_replay == len(self.recording):
+                self.counter_replay = 0
+                self.record_state = RecordState.RECORDED
+
+        else:
+            # use fresh data
+            v_mag, v_ang, v_freq, rocof = self.scale_frame(self.t.latest()[0], self.data.latest())
+
+        # TODO: add noise to data
+
+        # one phasor, frequency and ROCOF per bus
+        phasors = [[phasor] for phasor in zip(v_mag.tolist(), v_ang.tolist())]
+
+        try:
+            self.pmu.send_data(phasors=self.per_station(phasors),
+                               analog=self.analog,
+                               digital=self.digital,
+                               #freq=(v_freq-60)*1000
+                               freq=self.per_station(v_freq.tolist()),
+                               dfreq=self.per_station(rocof.tolist()),
+                               stat=self.stat,
+                               )
+            self.send_stats.add(self.t_recv, time.perf_counter())
+
+            # logger.info('Out, f={f:.5f}, vm={vm:.1f}, am={am:.2f}'.format(f=v_freq[0], vm=v_mag[0], am=v_ang[0]))
+
+        except Exception as e:
+            logger.exception(e)
+
+    def run(self):
+        """
+        Process control function. Block until DiME variables arrive and
+        handle each batch of them.
+
+        :return None
+        """
+        self.start()
+
+        receiver = DimeReceiver(self.dimec)
+        receiver.start()
+
+        while True:
+            for var, data, stale in receiver.drain():
+                self.handle_var(var, data)
+                self.process(var, stale)
+
+
+class MiniPMUHost(object):
+
+    def __init__(self, name: str='', dime_address: str='ipc:///tmp/dime',
+                 pmus: list=list(), record_dir: str=None, **kwargs):
+        """
+        Host multiple MiniPMU instances in one process. The instances share
+        one DiME client and one receiving thread, and each serves its own
+        C37.118 TCP endpoint.
+
+        Parameters
+        ----------
+        name
+            DiME client name of the host
+        dime_address
+        pmus
+            list of dicts of MiniPMU keyword arguments, such as `name`,
+            `pmu_idx`, `pmu_ip` and `pmu_port`
+        record_dir
+            directory of the recording files of the MiniPMUs, named after
+            the MiniPMUs
+        kwargs
+            keyword arguments shared by all MiniPMU instances
+        """
+        assert name, 'MiniPMU host name is empty'
+        assert pmus, 'MiniPMU list is empty'
+        self.name = name
+        self.dime_address = dime_address
+
+        self.dimec = connect_dime(dime_address, self.name)
+        self.receiver = None  # DimeReceiver shared by the MiniPMUs
 
-            var = self.sync_and_handle()
-            time.sleep(0.001)
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
 
-            if var is False:
-                continue
+        self.pmus = []
+        for item in pmus:
+            config = dict(kwargs)
+            config.update(item)
+            if record_dir:
+                config.setdefault('record_path', os.path.join(
+                    record_dir, '{}.rec'.format(config['name'])))
+            self.pmus.append(MiniPMU(dime_address=dime_address,
+                                     dimec=self.dimec, **config))
 
-            elif var == 'pmudata':
-                if self.pmu.clients and not self.reset:
+    def dispatch(self, var, data, stale=False):
+        """
+        Dispatch the synced variable `var` with value `data` to all MiniPMUs.
+        See `MiniPMU.process` for `stale`.
 
-                    if self.record_state == RecordState.REPLAYING:
-                        # prepare recorded data
-                        npmu = len(self.pmu_idx)
-                        v_mag = self.data_record[self.counter_replay, :npmu] * self.Vn[0]
-                        v_ang = wrap_angle(self.data_record[self.counter_replay, npmu:2*npmu])
-                        v_freq = self.data_record[self.counter_replay, 2*npmu:3*npmu] * self.fn
-                        self.counter_replay += 1
+        :return None
+        """
+        for mini in self.pmus:
+            # keep serving the other PMUs if one fails
+            try:
+                mini.handle_var(var, data)
+                mini.process(var, stale)
+            except Exception as e:
+                logger.exception(e)
 
-                        # at the end of replay, reset
-                        if self.counter_replay == self.count_record:
-                            self.counter_replay = 0
-                            self.record_state = RecordState.RECORDED
+    def run(self):
+        """
+        Process control function. Start all MiniPMUs, block until DiME
+        variables arrive and dispatch each batch of them to the MiniPMUs in
+        this thread. Each MiniPMU sends its frames from this thread, and
+        serves its clients from the threads of its `Pmu`.
 
-                    else:
-                        # use fresh data
-                        v_mag = self.last_data[self.var_idx['vm']] * self.Vn[0]
-                        v_ang = wrap_angle(self.last_data[self.var_idx['am']])
-                        v_freq = self.last_data[self.var_idx['w']] * self.fn
+        :return None
+        """
+        for mini in self.pmus:
+            mini.start()
 
-                    # TODO: add noise to data
+        self.receiver = DimeReceiver(self.dimec)
+        self.receiver.start()
 
-                    try:
-                        # TODO: fix multiple measurement (multi-bus -> one PMU case)
-                        self.pmu.send_data(phasors=[(v_mag, v_ang)],
-                                           analog=[9.99],
-                                           digital=[0x0001],
-                                           #freq=(v_freq-60)*1000
-                                           freq = v_freq
-                                           )
+        while True:
+            for var, data, stale in self.receiver.drain():
+                self.dispatch(var, data, stale)
 
-                        # logger.info('Out, f={f:.5f}, vm={vm:.1f}, am={am:.2f}'.format(f=v_freq[0], vm=v_mag[0], am=v_ang[0]))
 
-                    except Exception as e:
-                        logger.exception(e)
+def connect_dime(dime_address, name):
+    """
+    Create a DiME client for `dime_address` such as `tcp://127.0.0.1:5000`
+    and join it as `name`
+    """
+    spl = dime_address.split(":")
+    spl[1] = spl[1][2:]
+    if len(spl) == 3:
+        spl[2] = int(spl[2])
+    dimec = DimeClient(*spl)
+    dimec.join(name)
+    return dimec
 
 
-def wrap_angle(a):
+def set_scheduling(cpus=None, rt_priority=None, nice=None):
     """
-    Wrap angle to within [-pi, pi]
+    Pin this process to `cpus` and raise its scheduling priority
 
     Parameters
     ----------
-    a : float
-        angle value in radian
+    cpus : str
+        CPU list such as `2-5,8`
+    rt_priority : int
+        SCHED_FIFO priority from 1 to 99
+    nice : int
+        nice value, used if `rt_priority` is not given
 
     Returns
     -------
-
+    dict
+        the settings that were applied. Settings that fail, for example without
+        root privileges, are logged and left out.
+    """
+    applied = {}
+
+    if cpus:
+        try:
+            os.sched_setaffinity(0, parse_cpus(cpus))
+            applied['cpus'] = sorted(os.sched_getaffinity(0))
+        except (OSError, ValueError) as e:
+            logger.warning('Cannot pin to CPUs <%s>: %s', cpus, e)
+
+    if rt_priority:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(rt_priority))
+            applied['rt_priority'] = rt_priority
+        except (OSError, ValueError) as e:
+            logger.warning('Cannot set SCHED_FIFO priority %s: %s', rt_priority, e)
+    elif nice:
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, nice)
+            applied['nice'] = nice
+        except OSError as e:
+            logger.warning('Cannot set nice value %s: %s', nice, e)
+
+    return applied
+
+
+def serve_until_terminated(target, pmus, stats=None, scheduling=None):
+    """
+    Call `target` until it returns or the process gets SIGTERM, and then
+    write the send statistics of the MiniPMUs `pmus` to the JSON file `stats`
+    and close their recordings
+    """
+    def terminate(signum, frame):
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        target()
+    finally:
+        for mini in pmus:
+            mini.close()
+        if stats:
+            items = []
+            for mini in pmus:
+                item = mini.stats()
+                item.update(scheduling or {})
+                items.append(item)
+            with open(stats, 'w') as f:
+                json.dump(items, f)
+
+
+def add_scheduling_arguments(parser):
+    """Add the CPU pinning, priority and statistics options of MiniPMU processes to `parser`"""
+    parser.add_argument('--cpus', help='CPU list to pin the process to, such as 2-5,8')
+    parser.add_argument('--rt_priority', type=int,
+                        help='SCHED_FIFO real-time priority from 1 to 99')
+    parser.add_argument('--nice', type=int,
+                        help='nice value, used without --rt_priority')
+    parser.add_argument('--stats', metavar='PATH',
+                        help='write the send timing statistics to a JSON file on exit')
+
+
+def wrap_angle(a, out=None):
     """
-    while a > pi:
-        a -= pi
+    Wrap angle to within [-pi, pi)
 
-    while a < -pi:
-        a += pi
+    Parameters
+    ----------
+    a : float or numpy.ndarray
+        angle values in radian
+    out : numpy.ndarray
+        array for the wrapped angles, which can be `a` itself
+
+    Returns
+    -------
+    float or numpy.ndarray
+        wrapped angles
+    """
+    if out is None:
+        return np.remainder(np.add(a, pi), 2 * pi) - pi
 
-    return a
+    np.add(a, pi, out=out)
+    np.remainder(out, 2 * pi, out=out)
+    return np.subtract(out, pi, out=out)
 
 
 def main():
@@ -514,12 +929,20 @@ def main():
                         help='nominal frequency (Hz)', type=int)
     parser.add_argument('--vn', default=1, help='voltage base (kV)')
     parser.add_argument('--noise', default=0, help='noise level', type=int)
+    parser.add_argument('--notify', action='store_true',
+                        help='print a readiness line to stdout once the PMU port is listening')
+    parser.add_argument('--record', dest='record_path', metavar='PATH',
+                        help='memory-mapped recording file, replayable after restarts')
+    add_scheduling_arguments(parser)
     parser.add_argument('pmu_port', help='PMU TCP/IP port', type=int)
     parser.add_argument('pmu_idx',
                         help='PMU indices from ANDES in list', type=str)
 
     args = parser.parse_args()
     args = vars(args)
+    stats = args.pop('stats')
+    scheduling = set_scheduling(args.pop('cpus'), args.pop('rt_priority'),
+                                args.pop('nice'))
 
     if ',' in args['pmu_idx']:
         args['pmu_idx'] = args['pmu_idx'].split(',')
@@ -529,7 +952,60 @@ def main():
         args['pmu_idx'][i] = int(args['pmu_idx'][i])
 
     mini = MiniPMU(**args)
-    mini.run()
+    serve_until_terminated(mini.run, [mini], stats, scheduling)
+
+
+def parse_pmu_spec(spec):
+    """
+    Parse a `minipmu-host` PMU specification `PORT:IDX[,IDX...][:NAME]`
+    into MiniPMU keyword arguments
+    """
+    fields = spec.split(':')
+    if len(fields) not in (2, 3):
+        raise argparse.ArgumentTypeError(
+            'PMU <{}> is not in the format PORT:IDX[,IDX...][:NAME]'.format(spec))
+
+    try:
+        port = int(fields[0])
+        pmu_idx = [int(i) for i in fields[1].split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'PMU <{}> has an invalid port or index'.format(spec))
+
+    name = fields[2] if len(fields) == 3 else 'PMU_{}'.format(port)
+
+    return {'name': name, 'pmu_port': port, 'pmu_idx': pmu_idx}
+
+
+def host_main():
+    parser = argparse.ArgumentParser(
+        description='Serve multiple MiniPMUs from one process')
+    parser.add_argument('-n', '--name', default='MiniPMUHost',
+                        help='DiME client name of the host', type=str)
+    parser.add_argument('-a', '--dime_address',
+                        default='tcp://192.168.1.20:5000',
+                        help='DiME server address')
+    parser.add_argument('--ip', dest='pmu_ip', default='0.0.0.0',
+                        help='IP address the PMU ports listen on')
+    parser.add_argument('--fn', default=60,
+                        help='nominal frequency (Hz)', type=int)
+    parser.add_argument('--vn', default=1, help='voltage base (kV)')
+    parser.add_argument('--noise', default=0, help='noise level', type=int)
+    parser.add_argument('--notify', action='store_true',
+                        help='print a readiness line to stdout for each listening PMU port')
+    parser.add_argument('--record_dir', metavar='DIR',
+                        help='directory of the recording files, one per PMU')
+    add_scheduling_arguments(parser)
+    parser.add_argument('pmus', nargs='+', type=parse_pmu_spec,
+                        help='PMUs in the format PORT:IDX[,IDX...][:NAME]')
+
+    args = vars(parser.parse_args())
+    stats = args.pop('stats')
+    scheduling = set_scheduling(args.pop('cpus'), args.pop('rt_priority'),
+                                args.pop('nice'))
+
+    host = MiniPMUHost(**args)
+    serve_until_terminated(host.run, host.pmus, stats, scheduling)
 
 
 if __name__ == "__main__":
@@ -1,23 +1,33 @@
+import os
 import sys
 import re
 import json
 import time
 import csv
 
-from mininet.topo import Topo
-from mininet.link import Intf, TCIntf
+from ltbnet.utils import log, parse_cpus
+from ltbnet.profiler import NULL_PROFILER
+from ltbnet.addressing import AddressPlan, DEFAULT_SUPERNET
 
-from mininet import log
-from mininet.node import Node
-
-from ltbnet.utils import check_intf
-from ltbnet.minipmu import MiniPMU
+try:
+    from mininet.topo import Topo
+    HAVE_MININET = True
+except ImportError:
+    # parse, validate, export and benchmark configs on hosts without Mininet
+    from ltbnet.standin import Topo
+    HAVE_MININET = False
 
 
 class Network(Topo):
     """Network configuration class"""
-    def __init__(self):
+    def __init__(self, supernet=DEFAULT_SUPERNET, prefixlen=None):
         super(Network, self).__init__()
+        self.supernet = supernet  # supernet of the Region subnets
+        self.prefixlen = prefixlen  # prefix length of the Region subnets. Sized by host count if None
+        self.subnets = {}
+        self.routes = {}
+        self.interfaces = {}  # Router name -> linked node name -> interface address. See `assign_ip`.
+
         self.Region = Region()
         self.Switch = Switch()
         self.PDC = PDC()
@@ -30,6 +40,7 @@ class Network(Topo):
         self.components = []
 
     def add(self, config, **kwargs):
+        """Add typed rows from an iterable such as `ltbnet.parser.iter_config`"""
         for item in config:
             ty = item['Type']
 
@@ -38,14 +49,23 @@ class Network(Topo):
                 if ty not in self.components:
                     self.components.append(ty)
 
-    def setup(self, config):
-        """Convenient function wrapper to setup a network from config"""
-        self.add(config)
-        self.setup_by_region()
-        self.build_mn_name()
-        self.assign_ip()
-        self.add_node_to_mn()
-        self.add_link_to_mn()
+    def setup(self, config, profiler=NULL_PROFILER, topology=True):
+        """Convenient function wrapper to setup a network from an iterable of typed config rows. Mininet nodes and
+        links are added if `topology` is True."""
+        with profiler.phase('parse'):
+            self.add(config)
+        with profiler.phase('setup_by_region'):
+            self.setup_by_region()
+        with profiler.phase('build_mn_name'):
+            self.build_mn_name()
+        with profiler.phase('assign_ip'):
+            self.assign_ip()
+        if not topology:
+            return self
+        with profiler.phase('add_node_to_mn'):
+            self.add_node_to_mn(profiler)
+        with profiler.phase('add_link_to_mn'):
+            self.add_link_to_mn(profiler)
         return self
 
     def make_dump(self):
@@ -66,13 +86,14 @@ class Network(Topo):
         """Dump the configuration to a csv file"""
         lines = self.make_dump()
 
-        f = open(path, 'w') if path else sys.stdout
+        f = open(path, 'w', newline='') if path else sys.stdout
 
+        writer = csv.writer(f)
         for line in lines:
-            f.write(','.join(str(x) for x in line))
-            f.write('\n')
+            writer.writerow(line)
 
-        f.close()
+        if path:
+            f.close()
 
     def dump_json(self, path=None):
         """Dump the configuration to a json file"""
@@ -92,6 +113,9 @@ class Network(Topo):
 
         out = json.dump(data, fp, indent=4)
 
+        if path:
+            fp.close()
+
     def setup_by_region(self):
         """Set up component information in Regions. Store PMU.idx in Region.pmu for each region"""
 
@@ -106,9 +130,8 @@ class Network(Topo):
                 idx= self.__dict__[item].idx[i]
                 region = self.__dict__[item].region[i]
 
-                if region in self.Region.idx:
-                    loc = self.Region.name.index(region)
-                else:
+                loc = self.Region.lookup_index(region)
+                if loc == -1:
                     log.error('Region <{r}> of {comp} <{name}> is undefined.'.format(r=region, comp=item, name=name))
                     continue
 
@@ -119,57 +142,157 @@ class Network(Topo):
         for item in self.components:
             self.__dict__[item].build_mn_name()
 
-    def assign_ip(self, base='192.168.1.'):
-        """Assign IP address in a LAN"""
-
-        # for item in self.components:
-        #     self.__dict__[item].ip = [''] * self.__dict__[item].n
-
-        count = 1
-
-        # for PDCs
-        # self.PDC.ip = [''] * self.PDC.n
-        for i in range(self.PDC.n):
-            count += 1
-            if self.PDC.ip[i]:
-                continue
-            self.PDC.ip[i] = base + str(count)
-
-        # for PMUs
-        # self.PMU.ip = [''] * self.PMU.n
-        for i in range(self.PMU.n):
-            count += 1
-            if self.PMU.ip[i]:
-                continue
-
-            self.PMU.ip[i] = base + str(count)
-
-    def add_node_to_mn(self):
+    def assign_ip(self):
+        """Assign IP addresses to PDCs, PMUs and Routers from one subnet of `self.supernet` per Region. Explicit IPs
+        from the config are kept. Hosts of undefined Regions share one more subnet. Routers linked to Switches or
+        Routers get one address per link instead, as described in `ltbnet.routing`."""
+        plan = AddressPlan(self.supernet, self.prefixlen)
+        access, transit = [], []
+        if self.Router.n:
+            # routing imports numpy, which configs without Routers do not need
+            from ltbnet.routing import router_links
+            access, transit = router_links(self)
+        linked = {r for r, _ in access} | {r for r, _, _ in transit} | {r for _, r, _ in transit}
+
+        def location(region):
+            # undefined Regions, for which `lookup_index` is -1, share the last location
+            return self.Region.lookup_index(region) % (self.Region.n + 1)
+
+        def group_of(loc):
+            return self.Region.idx[loc] if loc < self.Region.n else None
+
+        # hosts by Region location
+        groups = [[] for _ in range(self.Region.n + 1)]
+        for item in ('PDC', 'PMU', 'Router'):
+            record = self.__dict__[item]
+            for i in range(record.n):
+                if item == 'Router' and i in linked:
+                    continue
+                groups[location(record.region[i])].append(((item, i), record.ip[i]))
+
+        # the first Router interface of a Region holds the gateway, the others get host addresses
+        gateways = {}  # Region location -> (router row, switch idx)
+        switch_loc = [location(region) for region in self.Switch.region]
+        for r, switch in access:
+            loc = switch_loc[self.Switch.lookup_index(switch)]
+            if loc in gateways:
+                groups[loc].append((('Router', r, switch), None))
+            else:
+                gateways[loc] = (r, switch)
+
+        for loc, hosts in enumerate(groups):
+            if hosts or loc in gateways:
+                plan.add_group(group_of(loc), hosts)
+        plan.solve()
+
+        for group, keys in plan.outside.items():
+            ip, prefixlen = plan.addresses[keys[0]]
+            log.warn('Region <{g}> has {n} explicit IPs outside its subnet {s}, such as {ip}. They get the Region '
+                     'prefix /{p}.\n'.format(g=group, n=len(keys), s=plan.subnets[group], ip=ip, p=prefixlen))
+
+        for key, (ip, prefixlen) in plan.addresses.items():
+            if len(key) == 2:  # the keys of Router interfaces have three items
+                record = self.__dict__[key[0]]
+                record.ip[key[1]] = ip
+                record.prefixlen[key[1]] = prefixlen
+
+        # Router interfaces by Mininet name of the Router and of the linked node
+        self.interfaces = {}
+        attached = {str(plan.subnets[group_of(loc)]): (group_of(loc), {}) for loc in gateways}
+
+        for r, switch in access:
+            loc = switch_loc[self.Switch.lookup_index(switch)]
+            group = group_of(loc)
+            if gateways[loc] == (r, switch):
+                ip, prefixlen = str(plan.gateway(group)), plan.subnets[group].prefixlen
+            else:
+                ip, prefixlen = plan.addresses[('Router', r, switch)]
+            self.add_interface(r, self.to_canonical(switch), ip, prefixlen)
+            attached[str(plan.subnets[group])][1].setdefault(r, ip)
+
+        transit_addresses = []
+        for a, b, e in transit:
+            (ip_a, prefixlen), (ip_b, _) = plan.transit(self.Link.idx[e])
+            self.add_interface(a, self.Router.mn_name[b], ip_a, prefixlen)
+            self.add_interface(b, self.Router.mn_name[a], ip_b, prefixlen)
+            transit_addresses.append((a, ip_a, b, ip_b, e))
+
+        self.subnets = {group: str(subnet) for group, subnet in plan.subnets.items()}
+        self.routes = {}
+        for loc, hosts in enumerate(groups):
+            for key, _ in hosts:
+                if len(key) == 2:
+                    record = self.__dict__[key[0]]
+                    self.routes[record.mn_name[key[1]]] = plan.routes(group_of(loc), routed=loc in gateways)
+
+        if linked:
+            from ltbnet.routing import router_routes
+            for r, routes in router_routes(self, attached, transit_addresses).items():
+                if r in linked:
+                    self.routes[self.Router.mn_name[r]] = routes
+
+        return plan
+
+    def add_interface(self, r, neighbor, ip, prefixlen):
+        """Add the address of the interface of Router row `r` towards Mininet node `neighbor`. The first interface
+        of a Router gives the address of its record."""
+        name = self.Router.mn_name[r]
+        if name not in self.interfaces:
+            self.Router.ip[r] = ip
+            self.Router.prefixlen[r] = prefixlen
+        self.interfaces.setdefault(name, {})[neighbor] = '{}/{}'.format(ip, prefixlen)
+
+    def add_routes(self, net):
+        """Install the routes from `assign_ip` on the started Mininet hosts and enable forwarding on the Routers"""
+        for name, routes in self.routes.items():
+            host = net.get(name)
+            cmds = []
+            if name in self.interfaces:
+                # Routers pick the interface from the gateway
+                dev = ''
+                cmds.append('sysctl -q -w net.ipv4.ip_forward=1')
+            else:
+                dev = 'dev {}'.format(host.defaultIntf())
+            for dst, gateway in routes:
+                via = 'via {} '.format(gateway) if gateway else ''
+                cmds.append('ip route replace {dst} {via}{dev}'.format(dst=dst, via=via, dev=dev).strip())
+            if cmds:
+                host.cmd('; '.join(cmds))
+
+    def add_node_to_mn(self, profiler=NULL_PROFILER):
         for item in self.components:
             # log.info('Adding {n} <{ty}> to the network...'.format(n=self.__dict__[item].n, ty=item))
-            self.__dict__[item].add_node_to_mn(self)
+            with profiler.phase(item, component=item):
+                self.__dict__[item].add_node_to_mn(self)
 
-    def add_link_to_mn(self):
+    def add_link_to_mn(self, profiler=NULL_PROFILER):
         for item in self.components:
             # log.info('Adding links to {ty}...'.format(ty=item))
-            self.__dict__[item].add_link_to_mn(self)
+            with profiler.phase(item, component=item):
+                self.__dict__[item].add_link_to_mn(self)
 
     def to_canonical(self, idx):
-        if idx in self.Switch.idx:
-            return self.Switch.mn_name[self.Switch.idx.index(idx)]
+        loc = self.Switch.lookup_index(idx)
+        if loc != -1:
+            return self.Switch.mn_name[loc]
         else:
             return idx
 
     def add_hw_intf(self, net):
         """Add hardware interfaces from Network.HwIntf records"""
+        from mininet.link import Intf
+
         for i, name, to in zip(range(self.HwIntf.n), self.HwIntf.name, self.HwIntf.to):
             switch_index = self.Switch.lookup_index(to)
             log.info('*** Adding hardware interface', name, 'to switch', to, '\n')
 
             r = Intf(name, node=net.switches[switch_index])
 
-    def add_tc_hw_intf(self, net):
-        """Add traffic controlled hardware interfaces from Network.TCHwIntf records"""
+    def add_tc_hw_intf(self, net, batch=None):
+        """Add traffic controlled hardware interfaces from Network.TCHwIntf records. With a `ltbnet.shaping.TCBatch`
+        `batch`, add plain interfaces and collect their shaping in the batch."""
+        from mininet.link import Intf, TCIntf
+
         for i, name, to, delay, bw, loss, jitter in zip(
                 range(self.TCHwIntf.n), self.TCHwIntf.name, self.TCHwIntf.to, self.TCHwIntf.delay, self.TCHwIntf.bw,
                       self.TCHwIntf.loss, self.TCHwIntf.jitter):
@@ -178,15 +301,32 @@ class Network(Topo):
             d = delay
             b = float(bw) if bw is not None else None
             l = float(loss) if loss is not None else None
-            j = float(jitter) if jitter is not None else None
+            j = jitter
 
             log.info('*** Adding traffic controlled hardware interface', name, 'to switch', to, '\n')
             log.info('')
-            r = TCIntf(name, node=net.switches[switch_index], delay=d, loss=l, bw=b, jitter=j)
+            if batch is None:
+                r = TCIntf(name, node=net.switches[switch_index], delay=d, loss=l, bw=b, jitter=j)
+            else:
+                r = Intf(name, node=net.switches[switch_index])
+                batch.add(r, bw=b, delay=d, jitter=j, loss=l)
+
+    def shape_links(self, net, batch):
+        """Collect the shaping of both interfaces of every link in a `ltbnet.shaping.TCBatch`. Use with Mininet
+        networks of plain, unshaped links."""
+        params = {frozenset((fr, to)): info for fr, to, info in self.links(withInfo=True)}
+
+        for link in net.links:
+            info = params.get(frozenset((link.intf1.node.name, link.intf2.node.name)))
+            if not info:
+                continue
+            for intf in (link.intf1, link.intf2):
+                batch.add(intf, bw=info.get('bw'), delay=info.get('delay'), jitter=info.get('jitter'),
+                          loss=info.get('loss'))
 
-    def dump_sw_port_node(self, net):
+    def dump_sw_port_node(self, net, path='sw_port_node.csv'):
         """
-        Dump the switch-port-host mapping
+        Dump the switch-port-host mapping to the csv file `path`
 
         Returns
         -------
@@ -217,15 +357,15 @@ class Network(Topo):
                 link1 = intf_instance.link.intf1
                 link2 = intf_instance.link.intf2
 
-                if any([link1, link2]) is None:
+                if link1 is None or link2 is None:
                     continue
 
                 source_intf_name = None
                 target_intf = None
-                if sw_id in link1.name:
+                if link1.node is sw_instance:
                     source_intf_name = link1.name
                     target_intf = link2
-                elif sw_id in link2.name:
+                elif link2.node is sw_instance:
                     source_intf_name = link2.name
                     target_intf = link1
 
@@ -243,7 +383,7 @@ class Network(Topo):
                 target_intf_name_list.append(target_intf_name)
                 target_node_name_list.append(target_name)
 
-        with open("sw_port_node.csv", 'w') as f:
+        with open(path, 'w') as f:
             writer = csv.writer(f, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
 
             writer.writerow(header)
@@ -257,39 +397,73 @@ class Network(Topo):
 
 
 
+class EmptyColumn(object):
+    """Read-only column of `None` values for fields a record type does not use"""
+    def __init__(self, n):
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [None] * len(range(*i.indices(self.n)))
+        if not -self.n <= i < self.n:
+            raise IndexError('column index out of range')
+        return None
+
+    def __iter__(self):
+        for _ in range(self.n):
+            yield None
+
+    def __contains__(self, item):
+        return item is None and self.n > 0
+
+
 class Record(object):
-    """Base class for config.csv records"""
+    """Base class for config.csv records
+
+    Records are stored column-wise. Each record type only allocates the columns listed in `fields`; the columns
+    of the other fields read as `None`. Rows are looked up by `Idx` and by Mininet name through hash indices.
+
+    Columns are lists, also the numeric ones. Their values are optional and read as `None` when missing, which
+    typed arrays cannot hold, and consumers that need vectors, such as `ltbnet.latency`, build them once.
+    """
+    all_fields = ('idx', 'name', 'region', 'coords', 'mac', 'ip', 'prefixlen', 'pmu_idx',
+                  'fr', 'to', 'delay', 'bw', 'loss', 'jitter')
+    fields = ('idx', 'name', 'region', 'coords')
+
     def __init__(self):
         self._name = type(self).__name__
 
         self.n = 0
-        self.idx = []
-        self.name = []
-        self.coords = []
-        self.mac = []
-        self.pmu_idx = []
-        self.delay = []
-        self.bw = []
-        self.jitter = []
-        self.loss = []
-        self.ip = []
-        self.fr = []
-        self.to = []
-        self.region = []
+        for field in self.fields:
+            self.__dict__[field] = []
+
         self.prefix = ''
         self.connections = []
         self.mn_name = []
         self.mn_object = []
 
+        self._idx_index = {}
+        self._mn_index = {}
+
         self.build()
 
+    def __getattr__(self, item):
+        # only reached for attributes not set on the instance
+        if item in Record.all_fields and 'n' in self.__dict__:
+            return EmptyColumn(self.n)
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, item))
+
     def build(self):
         """Custom build function"""
         pass
 
     def add(self, Type=None, Longitude=None, Latitude=None, MAC=None,
-            Idx=None, Name='', Region='', IP='',
-            PMU_IDX='', Delay='', BW='', Loss='', Jitter='', From='', To='', **kwargs):
+            Idx=None, Name='', Region='', IP=None,
+            PMU_IDX=None, Delay=None, BW=None, Loss=None, Jitter=None, From=None, To=None, **kwargs):
+        """Add a row typed by `ltbnet.parser.make_row`. Fields not applicable to the record are None."""
 
         if not self._name:
             log.error('Device name not initialized')
@@ -298,81 +472,66 @@ class Record(object):
         if Type != self._name:
             return
 
-        mac = None if MAC == 'None' else MAC
         idx = self._name + '_' + str(self.n) if not Idx else Idx
-        pmu_idx = None if PMU_IDX == 'None' else int(PMU_IDX)
-
-        if idx in self.idx:
-            log.error('PMU Idx <{i}> conflict.'.format(i=idx))
-
-        def to_type(var):
-            """Helper function to convert field to a list or a None object """
-            if var == 'None':
-                out = None
-            else:
-                out = var
-            return out
-
-        delay = to_type(Delay)
-        bw = to_type(BW)
-        loss = to_type(Loss)
-        jitter = to_type(Jitter)
-        fr = to_type(From)
-        to = to_type(To)
-
-        lat = None if Latitude == 'None' else float(Latitude)
-        lon = None if Longitude == 'None' else float(Longitude)
-
-        self.name.append(Name)
-        self.region.append(Region)
-        self.coords.append((lat, lon))
-        self.ip.append(IP)
-
-        self.mac.append(mac)
-        self.idx.append(idx)
-        # self.connections.append(conn)
-
-        self.pmu_idx.append(pmu_idx)
-        self.delay.append(delay)
-        self.bw.append(bw)
-        self.loss.append(loss)
-        self.jitter.append(jitter)
-        self.fr.append(fr)
-        self.to.append(to)
 
+        if idx in self._idx_index:
+            log.error('{ty} Idx <{i}> conflict.'.format(ty=self._name, i=idx))
+
+        row = {'idx': idx,
+               'name': Name,
+               'region': Region,
+               'coords': (Latitude, Longitude),
+               'mac': MAC,
+               'ip': IP,
+               'prefixlen': None,
+               'pmu_idx': PMU_IDX,
+               'fr': From,
+               'to': To,
+               'delay': Delay,
+               'bw': BW,
+               'loss': Loss,
+               'jitter': Jitter,
+               }
+
+        for field in self.fields:
+            self.__dict__[field].append(row[field])
+
+        # keep the first row on Idx conflicts, as `list.index` did
+        self._idx_index.setdefault(idx, self.n)
         self.n += 1
 
     def lookup_index(self, idx, canonical=False):
         """Return the numerical index of the the element `idx`"""
-        records = self.idx
+        records = self._idx_index
         if canonical:
-            records = self.mn_name
+            records = self._mn_index
 
-        if idx not in records:
-            return -1
-        return records.index(idx)
+        return records.get(idx, -1)
 
     def dump(self):
         """Return a string of the dumped records in csv format"""
         ret = []
 
-        # TODO: fix deprecated function
+        def to_str(value):
+            return 'None' if value is None else value
 
         for i in range(self.n):
 
             line = [self.idx[i],
                     self._name,
-                    self.region[i],
-                    self.name[i],
-                    str(self.coords[i][1]),
-                    str(self.coords[i][0]),
-                    self.mac[i] if self.mac[i] else 'None',
-                    self.ip[i] if self.ip[i] else 'None',
-                    self.pmu_idx[i] if self.pmu_idx[i] else 'None',
-                    self.delay[i] if self.pmu_idx[i] else 'None',
-                    self.bw[i] if self.bw[i] else 'None',
-                    self.loss[i] if self.loss[i] else 'None',
-                    self.jitter[i] if self.jitter[i] else 'None'
+                    to_str(self.region[i]),
+                    to_str(self.name[i]),
+                    to_str(self.coords[i][1]),
+                    to_str(self.coords[i][0]),
+                    to_str(self.mac[i]),
+                    to_str(self.ip[i]),
+                    to_str(self.pmu_idx[i]),
+                    to_str(self.fr[i]),
+                    to_str(self.to[i]),
+                    to_str(self.delay[i]),
+                    to_str(self.bw[i]),
+                    to_str(self.loss[i]),
+                    to_str(self.jitter[i]),
                     ]
 
             ret.append(line)
@@ -384,6 +543,13 @@ class Record(object):
         self.mn_name = [''] * self.n
         for i in range(self.n):
             self.mn_name[i] = self.prefix + self.idx[i]
+        self.build_mn_index()
+
+    def build_mn_index(self):
+        """Rebuild the hash index from Mininet names to rows"""
+        self._mn_index = {}
+        for i, name in enumerate(self.mn_name):
+            self._mn_index.setdefault(name, i)
 
     def check_consistency(self):
         """Check consistency of Region definitions"""
@@ -394,12 +560,16 @@ class Record(object):
         if self._name not in ('Switch', 'Router', 'PDC', 'PMU'):
             return
 
-        for i, name, ip in zip(range(self.n), self.mn_name, self.ip):
+        for i, name, ip, prefixlen in zip(range(self.n), self.mn_name, self.ip, self.prefixlen):
             mac = self.mac[i]
             if self._name == 'Switch':
                 n = network.addSwitch(name, dpid=mac)
                 self.mn_object.append(n)
             else:
+                if name in network.interfaces:
+                    ip = None  # Routers get their addresses on the links
+                elif ip and prefixlen:
+                    ip = '{}/{}'.format(ip, prefixlen)
                 n = network.addHost(name, ip=ip, mac=mac)
                 self.mn_object.append(n)
                 # log.debug('Adding {ty} <{n}, {ip}> to network.'.format(ty=self._name, n=name, ip=ip))
@@ -410,6 +580,7 @@ class Record(object):
 
 class Region(Record):
     """Data streaming Region class"""
+    fields = Record.fields
     def build(self):
         self.Switch = []  # list of network switches
         self.Router = []  # list of network routers
@@ -419,13 +590,32 @@ class Region(Record):
 
 class PMU(Record):
     """Data streaming PMU node class"""
-    def run_pmu(self, network):
-        """Run MiniPMU on the defined PMU nodes"""
-        run_minipmu = 'minipmu {port} {pmu_idx} -n={name}'
+    fields = Record.fields + ('mac', 'ip', 'prefixlen', 'pmu_idx')
+
+    def build(self):
+        self.processes = {}  # MiniPMU process handles keyed on the Mininet host name
+
+    def run_pmu(self, network, batch_size=32, timeout=10.0, cpus=None, rt_priority=None, nice=None,
+                stats_dir=None, record_dir=None):
+        """Run MiniPMU on the defined PMU nodes in batches of `batch_size`, and wait up to `timeout` seconds for
+        each batch to listen. Return the process handles keyed on the Mininet host name.
+
+        The processes are pinned round-robin to the CPUs of the list `cpus`, such as `2-7`, and get the SCHED_FIFO
+        priority `rt_priority` or the nice value `nice`. With `stats_dir`, each process writes its send statistics
+        to the directory on exit. With `record_dir`, each process records to a memory-mapped file in the directory,
+        named after its host, which is replayed by later runs."""
+        from ltbnet.launcher import PMUProcess, launch
+
+        cpu_list = parse_cpus(cpus) if cpus else []
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+
+        run_minipmu = 'minipmu {port} {pmu_idx} -n={name} --notify'
+        handles = []
         for i in range(self.n):
             name = self.mn_name[i]
             node = network.get(name)
-            pmu_name = self.name[i]
+            pmu_name = self.name[i] or ''  # empty Names are None
             pmu_idx = self.pmu_idx[i]
 
             if pmu_name[:4] != 'PMU_':
@@ -434,58 +624,90 @@ class PMU(Record):
                                           pmu_idx=pmu_idx,
                                           name=pmu_name,
                                           )
+            if cpu_list:
+                call_str += ' --cpus={}'.format(cpu_list[i % len(cpu_list)])
+            if rt_priority:
+                call_str += ' --rt_priority={}'.format(rt_priority)
+            elif nice:
+                call_str += ' --nice={}'.format(nice)
 
-            node.popen(call_str)
-            log.info('{name} idx={idx} started\n'.format(name=pmu_name, idx=pmu_idx))
-            time.sleep(0.02)
+            stats = None
+            if stats_dir:
+                stats = os.path.join(stats_dir, '{}.json'.format(name))
+                call_str += ' --stats={}'.format(stats)
+            if record_dir:
+                call_str += ' --record={}'.format(os.path.join(os.path.abspath(record_dir), '{}.rec'.format(name)))
+
+            handles.append(PMUProcess(pmu_name, pmu_idx, node, call_str, stats))
+
+        self.processes = launch(handles, batch_size=batch_size, timeout=timeout)
+        return self.processes
+
+    def stop_pmu(self, timeout=2.0):
+        """Stop the MiniPMU processes started by `run_pmu`. Return their send statistics."""
+        from ltbnet.launcher import stop_all, collect_stats
+
+        stop_all(self.processes, timeout)
+        stats = collect_stats(self.processes)
+        self.processes = {}
+        return stats
 
 
 class PDC(Record):
     """Data streaming PDC class"""
-    pass
+    fields = Record.fields + ('mac', 'ip', 'prefixlen')
 
 
 class Switch(Record):
     """Data streaming network switch class"""
+    fields = Record.fields + ('mac', )
 
     def build_mn_name(self):
         """Build canonical switch name such as `s23`"""
         self.mn_name = [''] * self.n
         for i in range(self.n):
             self.mn_name[i] = 's' + str(i)
+        self.build_mn_index()
 
 
 class Router(Record):
     """Data streaming network router class"""
-    pass
+    fields = Record.fields + ('mac', 'ip', 'prefixlen')
 
 
 class Link(Record):
     """Link storage"""
+    fields = Record.fields + ('fr', 'to', 'delay', 'bw', 'loss', 'jitter')
+
     def __init__(self):
         super(Link, self).__init__()
         self.links = []
         self.obj = []
 
+        self._directed = set()  # registered (fr, to) pairs
+        self._undirected = set()  # normalized endpoint pairs
+
+    @staticmethod
+    def normalize(fr, to):
+        """Return the endpoint pair of a link in a direction-independent order. Endpoints are ordered by their
+        strings and type names, which also orders `None` and mixed types."""
+        key = lambda node: (str(node), type(node).__name__)
+        return (fr, to) if key(fr) <= key(to) else (to, fr)
+
     def register(self, fr, to, idx):
         self.links.append((fr, to))
         self.obj.append(idx)
 
+        self._directed.add((fr, to))
+        self._undirected.add(self.normalize(fr, to))
+
     def exist_undirectioned(self, fr, to):
         """Check if the undirectional path from `fr` to `to` exists"""
-
-        if self.exist_directioned(fr, to) or self.exist_directioned(to, fr):
-            return True
-        else:
-            return False
+        return self.normalize(fr, to) in self._undirected
 
     def exist_directioned(self, fr, to):
         """Check if the directional path from `fr` to `to` exists"""
-        ret = False
-        if (fr, to) in self.links:
-            ret = True
-
-        return ret
+        return (fr, to) in self._directed
 
     def add_link_to_mn(self, network):
         """Method to add links from each element to the connections"""
@@ -503,10 +725,17 @@ class Link(Record):
             l = None
             if loss:
                 l = float(loss)
-            j = float(jitter) if jitter is not None else None
+            j = jitter
 
             if not network.Link.exist_undirectioned(fr, to):
-                r = network.addLink(fr, to, delay=d, bw=b, loss=l, jitter=j)
+                # addresses of Router interfaces
+                params = {}
+                for key, node, other in (('params1', fr, to), ('params2', to, fr)):
+                    ip = network.interfaces.get(node, {}).get(other)
+                    if ip:
+                        params[key] = {'ip': ip}
+
+                r = network.addLink(fr, to, delay=d, bw=b, loss=l, jitter=j, **params)
                 # register the link element to the LTBNet object
                 network.Link.register(fr, to, r)
                 # log.debug('Adding link <{fr}> to <{to}>.'.format(fr=name, to=c))
@@ -514,11 +743,15 @@ class Link(Record):
 
 class HwIntf(Record):
     """Hardware Interface class"""
+    fields = Record.fields + ('to', 'delay', 'bw', 'loss', 'jitter')
+
     def add_link_to_mn(self, network):
         pass
 
 
 class TCHwIntf(Record):
     """Hardware Traffic controlled Interface class"""
+    fields = Record.fields + ('to', 'delay', 'bw', 'loss', 'jitter')
+
     def add_link_to_mn(self, network):
         pass
@@ -1,51 +1,289 @@
 import os
+import re
+import csv
 import json
 
+from ltbnet.utils import log
+
+
+class ConfigError(ValueError):
+    """Invalid entry in an LTBNet config file"""
+    def __init__(self, file, line, msg):
+        self.file = file
+        self.line = line
+        super(ConfigError, self).__init__('{f}:{l}: {m}'.format(f=file, l=line, m=msg))
+
+
+def to_str(value):
+    """Convert a config field to a string or None"""
+    if value is None or value == 'None' or value == '':
+        return None
+    return str(value).strip()
+
+
+def to_float(value):
+    """Convert a config field to a float or None"""
+    if value is None or value == 'None' or value == '':
+        return None
+    return float(value)
+
+
+def to_int(value):
+    """Convert a config field to an int or None"""
+    if value is None or value == 'None' or value == '':
+        return None
+    return int(value)
+
+
+# units of tc time values in milliseconds
+TIME_UNITS = {'s': 1e3, 'sec': 1e3, 'secs': 1e3,
+              'ms': 1., 'msec': 1., 'msecs': 1.,
+              'us': 1e-3, 'usec': 1e-3, 'usecs': 1e-3,
+              }
+
+
+def to_ms(value):
+    """Convert a tc time value such as `5ms` to milliseconds or None. Numbers without a unit are microseconds as
+    in tc."""
+    if value is None or value == 'None' or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return value * TIME_UNITS['us']
+
+    match = re.match(r'^\s*([0-9.eE+-]+)\s*([a-zA-Z]*)\s*$', str(value))
+    if not match or match.group(2).lower() not in TIME_UNITS and match.group(2):
+        raise ValueError('Invalid time value <{}>'.format(value))
+    return float(match.group(1)) * TIME_UNITS[match.group(2).lower() or 'us']
+
+
+def to_time(value):
+    """Convert a tc time value such as `5ms` to a string or None, checking its unit with `to_ms`"""
+    value = to_str(value)
+    if value is not None:
+        to_ms(value)
+    return value
 
-def parse_config_csv(file, path=''):
-    """Parses an LTBNet config.csv file and return the contents in a list of dictionaries"""
-    keys = list()
-    out = list()
-    flag = False
-    with open(os.path.join(path, file)) as f:
-        for num, line in enumerate(f):
-            if not line.strip():
-                continue
 
-            if line.startswith('#'):
+# config fields in file order and their converters
+FIELDS = (('Idx', to_str),
+          ('Type', to_str),
+          ('Region', to_str),
+          ('Name', to_str),
+          ('Longitude', to_float),
+          ('Latitude', to_float),
+          ('MAC', to_str),
+          ('IP', to_str),
+          ('PMU_IDX', to_int),
+          ('From', to_str),
+          ('To', to_str),
+          ('Delay', to_time),
+          ('BW', to_float),
+          ('Loss', to_float),
+          ('Jitter', to_time),
+          ('Status', to_int),
+          )
+
+_COMMON = ('Idx', 'Type', 'Region', 'Name', 'Longitude', 'Latitude', 'Status')
+_SHAPING = ('Delay', 'BW', 'Loss', 'Jitter')
+
+# fields applicable to each Type (see the field table in README.md). Other fields are read as None.
+SCHEMA = {'Region': _COMMON,
+          'Switch': _COMMON + ('MAC', ),
+          'Router': _COMMON + ('MAC', 'IP'),
+          'PDC': _COMMON + ('MAC', 'IP'),
+          'PMU': _COMMON + ('MAC', 'IP', 'PMU_IDX'),
+          'Link': ('Idx', 'Type', 'Region', 'Name', 'Status', 'From', 'To') + _SHAPING,
+          'HwIntf': _COMMON + ('To', ) + _SHAPING,
+          'TCHwIntf': _COMMON + ('To', ) + _SHAPING,
+          }
+
+# fields that must not be None for each Type
+REQUIRED = {'PMU': ('PMU_IDX', ),
+            'Link': ('From', 'To'),
+            'HwIntf': ('Name', 'To'),
+            'TCHwIntf': ('Name', 'To'),
+            }
+
+
+def make_row(raw, file='', line=0):
+    """
+    Convert a row of raw config values into a typed row following `SCHEMA`
+
+    Parameters
+    ----------
+    raw : dict
+        field names and values as read from the file
+    file : str
+        file name for error messages
+    line : int
+        line number of the row for error messages
+
+    Returns
+    -------
+    dict or None
+        typed row with all `FIELDS` as keys. Fields not applicable to the Type are None. Rows of unknown Types
+        are skipped with a warning and return None.
+    """
+    ty = to_str(raw.get('Type'))
+    if ty not in SCHEMA:
+        log.warn('{f}:{l}: skipping unknown Type <{t}>\n'.format(f=file, l=line, t=ty))
+        return None
+
+    applicable = SCHEMA[ty]
+    row = {}
+    for key, convert in FIELDS:
+        if key not in applicable:
+            row[key] = None
+            continue
+        try:
+            row[key] = convert(raw.get(key))
+        except (TypeError, ValueError):
+            raise ConfigError(file, line, 'invalid {k} <{v}> for {t}'.format(k=key, v=raw.get(key), t=ty))
+
+    for key in REQUIRED.get(ty, ()):
+        if row[key] is None:
+            raise ConfigError(file, line, '{k} is required for {t}'.format(k=key, t=ty))
+
+    return row
+
+
+def iter_config_csv(file, path=''):
+    """Parse an LTBNet config.csv file and yield typed rows one at a time"""
+    fname = os.path.join(path, file)
+
+    with open(fname, newline='') as f:
+        # blank out comment lines so that `reader.line_num` follows the file
+        lines = ('\n' if line.startswith('#') else line for line in f)
+        reader = csv.reader(lines, skipinitialspace=True)
+
+        keys = None
+        for data in reader:
+            if not data or not any(x.strip() for x in data):
                 continue
-            data = line.strip().split(',')
 
             # Use the first valid line as the keys
-            if not flag:
-                keys = data
-                flag = True
+            if keys is None:
+                keys = [x.strip() for x in data]
+                if 'Type' not in keys:
+                    raise ConfigError(fname, reader.line_num, 'header has no Type field')
                 continue
 
-            out.append({k: v for k, v in zip(keys, data)})
+            if len(data) != len(keys):
+                raise ConfigError(fname, reader.line_num, 'expected {n} fields, got {m}'
+                                  .format(n=len(keys), m=len(data)))
 
-    return out
+            row = make_row(dict(zip(keys, data)), fname, reader.line_num)
+            if row is not None:
+                yield row
 
 
-def parse_config_json(file, path=''):
+_WHITESPACE = re.compile(r'\s*')
+
+
+def iter_config_json(file, path='', chunk_size=65536):
     """
-    Parse an LTBNet config.json file and return the data in a list of dictionaries
+    Parse an LTBNet config.json file and yield typed rows one at a time
+
+    The file is an array of records. Records are decoded incrementally from chunks of the file so that memory use
+    does not depend on the file size.
     """
-    with open(os.path.join(path, file)) as f:
-        out = json.load(f)
+    fname = os.path.join(path, file)
+    decoder = json.JSONDecoder()
 
-    return out
+    with open(fname) as f:
+        buf = ''
+        pos = 0
+        line = 1  # line number at `pos`
+        eof = False
+        state = 'start'  # one of `start`, `first`, `item`, `sep` and `end`
 
+        while True:
+            m = _WHITESPACE.match(buf, pos)
+            line += buf.count('\n', pos, m.end())
+            pos = m.end()
 
-def parse_config(file, path='', fmt=None):
+            if pos == len(buf):
+                if eof:
+                    break
+                buf = f.read(chunk_size)
+                pos = 0
+                eof = not buf
+                continue
+
+            char = buf[pos]
+
+            if state == 'start':
+                if char != '[':
+                    raise ConfigError(fname, line, 'expected a JSON array of records')
+                pos += 1
+                state = 'first'
+                continue
+
+            if state == 'end':
+                raise ConfigError(fname, line, 'unexpected data after the array of records')
+
+            if char == ']' and state in ('first', 'sep'):
+                pos += 1
+                state = 'end'
+                continue
+
+            if state == 'sep':
+                if char != ',':
+                    raise ConfigError(fname, line, "expected ',' or ']' after a record")
+                pos += 1
+                state = 'item'
+                continue
+
+            try:
+                raw, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise ConfigError(fname, line, 'malformed JSON record')
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+
+            if not isinstance(raw, dict):
+                raise ConfigError(fname, line, 'expected a JSON object')
+
+            row = make_row(raw, fname, line)
+            if row is not None:
+                yield row
+
+            line += buf.count('\n', pos, end)
+            pos = end
+            state = 'sep'
+
+        if state != 'end':
+            raise ConfigError(fname, line, 'unterminated array of records')
+
+
+def iter_config(file, path='', fmt=None):
+    """Yield typed rows from an LTBNet config file in CSV or JSON format"""
     if fmt is None:
         name, fmt = os.path.splitext(file)
 
     if fmt[1:] == 'json':
-        out = parse_config_json(file, path)
+        return iter_config_json(file, path)
     elif fmt[1:] == 'csv':
-        out = parse_config_csv(file, path)
+        return iter_config_csv(file, path)
     else:
         raise NotImplementedError('File format {} not supported'.format(fmt))
 
-    return out
\ No newline at end of file
+
+def parse_config_csv(file, path=''):
+    """Parses an LTBNet config.csv file and return the contents in a list of dictionaries"""
+    return list(iter_config_csv(file, path))
+
+
+def parse_config_json(file, path=''):
+    """
+    Parse an LTBNet config.json file and return the data in a list of dictionaries
+    """
+    return list(iter_config_json(file, path))
+
+
+def parse_config(file, path='', fmt=None):
+    return list(iter_config(file, path, fmt))
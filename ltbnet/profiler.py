@@ -0,0 +1,89 @@
+"""Wall and CPU time profiler for LTBNet startup phases"""
+
+import os
+import sys
+import json
+import time
+
+from contextlib import contextmanager
+
+
+def _cpu_times():
+    """Return CPU time of this process and of its waited-for child processes"""
+    t = os.times()
+    return t.user + t.system, t.children_user + t.children_system
+
+
+class StartupProfiler(object):
+    """
+    Record wall and CPU time of named startup phases
+
+    Phases can be nested. Each record stores the phase name with its parents, and the component type if the phase
+    is timed for one type of Record. A disabled profiler records nothing.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = []
+        self._stack = []
+        self._start = time.time()
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name, component=None):
+        """Context manager timing the enclosed block as phase `name`"""
+        if not self.enabled:
+            yield
+            return
+
+        self._stack.append(name)
+        path = '.'.join(self._stack)
+        wall0 = time.perf_counter()
+        cpu0, child0 = _cpu_times()
+        try:
+            yield
+        finally:
+            wall1 = time.perf_counter()
+            cpu1, child1 = _cpu_times()
+            self._stack.pop()
+            self.records.append({'phase': path,
+                                 'component': component,
+                                 'start': wall0 - self._t0,
+                                 'wall': wall1 - wall0,
+                                 'cpu': cpu1 - cpu0,
+                                 'cpu_children': child1 - child0,
+                                 })
+
+    def to_dict(self, **info):
+        """Return the phase records ordered by start time, the totals of top-level phases and the totals of each
+        component type in a dictionary, with `info` added"""
+        keys = ('wall', 'cpu', 'cpu_children')
+        records = sorted(self.records, key=lambda r: r['start'])
+
+        total = dict.fromkeys(keys, 0.)
+        components = {}
+        for r in records:
+            if '.' not in r['phase']:
+                for key in keys:
+                    total[key] += r[key]
+            if r['component'] is not None:
+                comp = components.setdefault(r['component'], dict.fromkeys(keys, 0.))
+                for key in keys:
+                    comp[key] += r[key]
+
+        out = {'started': self._start,
+               'python': sys.version.split()[0],
+               'total': total,
+               'phases': records,
+               'components': components,
+               }
+        out.update(info)
+        return out
+
+    def dump_json(self, path, **info):
+        """Write the profiling results to a JSON file"""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(**info), f, indent=4)
+
+
+# shared profiler for callers that do not profile
+NULL_PROFILER = StartupProfiler(enabled=False)
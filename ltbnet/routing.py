@@ -0,0 +1,147 @@
+"""
+Routed Regions
+
+A Router gets one interface on the subnet of the Region of each Switch it is linked to and a point-to-point transit
+subnet on each link to another Router. The first Router interface on a Region subnet holds the gateway address of the
+subnet, and the hosts of the Region reach the rest of the supernet through it. Regions without a Router stay on-link
+in the flat supernet.
+
+Each Router routes the subnets of the routed Regions it is not attached to over the shortest-delay path of Routers.
+Routers are neighbors over their transit links and over the switches of the Regions they share.
+"""
+
+import heapq
+
+import numpy as np
+
+from ltbnet.latency import LinkGraph, HOP_EPS
+
+
+def router_links(network):
+    """
+    Return the links of the Routers that are added to Mininet
+
+    Returns
+    -------
+    (list, list)
+        access links as (router row, switch idx) and transit links as (router row, router row, link row), in the
+        order of the Link records
+    """
+    router, switch, link = network.Router, network.Switch, network.Link
+    access, transit = [], []
+    seen = set()
+
+    for i, fr, to in zip(range(link.n), link.fr, link.to):
+        key = link.normalize(fr, to)
+        if key in seen:
+            continue  # duplicate links are not added
+        seen.add(key)
+
+        r_fr, r_to = router.lookup_index(fr), router.lookup_index(to)
+        if r_fr >= 0 and r_to >= 0:
+            transit.append((r_fr, r_to, i))
+        elif r_fr >= 0 and switch.lookup_index(to) >= 0:
+            access.append((r_fr, to))
+        elif r_to >= 0 and switch.lookup_index(fr) >= 0:
+            access.append((r_to, fr))
+
+    return access, transit
+
+
+def segment_delays(graph, switches, routers):
+    """
+    Return the delays between the Routers attached to one Region over its switches
+
+    Parameters
+    ----------
+    graph : LinkGraph
+        link graph of the network
+    switches : list
+        Switch idx of the Region
+    routers : list
+        idx of the Routers attached to the Region
+
+    Returns
+    -------
+    dict
+        (router idx, router idx) -> delay in ms, for the pairs connected over the switches
+    """
+    allowed = np.zeros(graph.n, dtype=bool)
+    allowed[[graph.index[idx] for idx in list(switches) + list(routers)]] = True
+    removed = set(np.flatnonzero(~(allowed[graph.u] & allowed[graph.v])).tolist())
+
+    out = {}
+    for r in routers:
+        delay = graph.accumulate(graph.index[r], removed)['delay']
+        for x in routers:
+            d = delay[graph.index[x]]
+            if x != r and d == d:
+                out[(r, x)] = float(d)
+    return out
+
+
+def router_routes(network, attached, transit, graph=None):
+    """
+    Compute the routes of the Routers to the routed Region subnets
+
+    Parameters
+    ----------
+    network : Network
+        network with its Routers and Links
+    attached : dict
+        Region subnet -> (Region idx or None, dict of router row -> interface address)
+    transit : list
+        transit links as (router row, address, router row, address, link row)
+    graph : LinkGraph
+        link graph of `network`, built if None
+
+    Returns
+    -------
+    dict
+        router row -> list of (destination subnet, gateway address)
+    """
+    router = network.Router
+    graph = graph or LinkGraph(network)
+
+    # router row -> list of (neighbor row, neighbor address, own address, delay)
+    adjacency = {i: [] for i in range(router.n)}
+    for a, ip_a, b, ip_b, e in transit:
+        d = graph.delay[graph.link.index(network.Link.idx[e])] if network.Link.idx[e] in graph.link else 0.
+        adjacency[a].append((b, ip_b, ip_a, d))
+        adjacency[b].append((a, ip_a, ip_b, d))
+
+    for subnet, (region, addresses) in attached.items():
+        if len(addresses) < 2:
+            continue
+        switches = [idx for idx, r in zip(network.Switch.idx, network.Switch.region)
+                    if r == region or region is None and network.Region.lookup_index(r) < 0]
+        delays = segment_delays(graph, switches, [router.idx[i] for i in addresses])
+        for a in addresses:
+            for b in addresses:
+                d = delays.get((router.idx[a], router.idx[b]))
+                if d is not None:
+                    adjacency[a].append((b, addresses[b], addresses[a], d))
+
+    routes = {i: [] for i in range(router.n)}
+    for subnet, (_, addresses) in attached.items():
+        # Dijkstra from the attached routers. `gateway` holds the address of the next router towards the subnet.
+        dist = {i: 0. for i in addresses}
+        gateway = {}
+        heap = [(0., i) for i in addresses]
+        done = set()
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            for x, _, ip_u, delay in adjacency[u]:
+                nd = d + delay + HOP_EPS
+                if nd < dist.get(x, np.inf):
+                    dist[x] = nd
+                    gateway[x] = ip_u
+                    heapq.heappush(heap, (nd, x))
+
+        for i, ip in gateway.items():
+            routes[i].append((subnet, ip))
+
+    return routes
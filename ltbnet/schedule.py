@@ -0,0 +1,166 @@
+"""
+Time-varying link impairment schedules
+
+A schedule lists link impairments over time, one row per link and time with the fields `Time` (seconds from the
+start of the schedule), `Link` (Idx of a Link record) and any of `Delay`, `BW`, `Loss` and `Jitter`. Fields left
+empty keep their current value, and `None` clears a value. A `Loss` of 100 emulates an outage. Schedules are CSV
+files or JSON arrays of records.
+
+`ImpairmentScheduler` applies the changes to the running network in a background thread. All changes due at the
+same time are applied together with one `tc -batch` process per network namespace, run concurrently.
+"""
+
+import os
+import csv
+import json
+import time
+import threading
+
+from ltbnet.utils import log
+from ltbnet.parser import ConfigError, to_str, to_float, to_time
+from ltbnet.shaping import TCBatch
+
+# schedule fields and their converters
+FIELDS = (('Delay', to_time),
+          ('BW', to_float),
+          ('Loss', to_float),
+          ('Jitter', to_time),
+          )
+
+# link parameter of each field
+PARAMS = {'Delay': 'delay', 'BW': 'bw', 'Loss': 'loss', 'Jitter': 'jitter'}
+
+
+def make_step(raw, file='', line=0):
+    """Convert a raw schedule row into (time, link idx, dict of changed parameters)"""
+    try:
+        t = float(raw.get('Time'))
+    except (TypeError, ValueError):
+        raise ConfigError(file, line, 'invalid Time <{}>'.format(raw.get('Time')))
+
+    link = to_str(raw.get('Link'))
+    if link is None:
+        raise ConfigError(file, line, 'Link is required')
+
+    changes = {}
+    for key, convert in FIELDS:
+        value = raw.get(key)
+        if value is None and key not in raw or value == '':
+            continue
+        try:
+            changes[PARAMS[key]] = convert(value)
+        except (TypeError, ValueError):
+            raise ConfigError(file, line, 'invalid {k} <{v}>'.format(k=key, v=value))
+
+    return t, link, changes
+
+
+def load_schedule(file, path=''):
+    """
+    Read a schedule file in csv or json format
+
+    Returns
+    -------
+    list of (float, list)
+        times in increasing order, each with the list of (link idx, changed parameters) due at that time
+    """
+    fname = os.path.join(path, file)
+    fmt = os.path.splitext(fname)[1][1:]
+
+    rows = []
+    if fmt == 'csv':
+        with open(fname, newline='') as f:
+            lines = ('\n' if line.startswith('#') else line for line in f)
+            reader = csv.DictReader(lines, skipinitialspace=True)
+            for raw in reader:
+                rows.append(make_step(raw, fname, reader.line_num))
+    elif fmt == 'json':
+        with open(fname) as f:
+            for i, raw in enumerate(json.load(f)):
+                rows.append(make_step(raw, fname, i + 1))
+    else:
+        raise NotImplementedError('File format {} not supported'.format(fmt))
+
+    steps = {}
+    for t, link, changes in rows:
+        steps.setdefault(t, []).append((link, changes))
+    return sorted(steps.items())
+
+
+class ImpairmentScheduler(object):
+    """
+    Apply a link impairment schedule to a running Mininet network
+
+    Parameters
+    ----------
+    network : Network
+        set-up network
+    net : mininet.net.Mininet
+        running network built from `network`
+    steps : list
+        schedule as returned by `load_schedule`
+    """
+    def __init__(self, network, net, steps):
+        self.steps = steps
+        self.applied = []  # dict of each applied step
+
+        info = {frozenset((fr, to)): params for fr, to, params in network.links(withInfo=True)}
+        by_nodes = {frozenset((link.intf1.node.name, link.intf2.node.name)): link for link in net.links}
+
+        # Link idx -> (Mininet link, current parameters)
+        self.links = {}
+        for idx, fr, to in zip(network.Link.idx, network.Link.fr, network.Link.to):
+            key = frozenset((network.to_canonical(fr), network.to_canonical(to)))
+            if key in by_nodes:
+                params = info.get(key, {})
+                self.links[idx] = (by_nodes[key], {p: params.get(p) for p in PARAMS.values()})
+
+        for t, changes in steps:
+            for idx, _ in changes:
+                if idx not in self.links:
+                    raise ValueError('Scheduled link <{l}> at {t:g} s is not in the network'.format(l=idx, t=t))
+
+        self._stop = threading.Event()
+        self._thread = None
+        self.t_start = None
+
+    def apply(self, changes):
+        """Apply a list of (link idx, changed parameters) with one batch. Return the elapsed seconds."""
+        batch = TCBatch()
+        for idx, change in changes:
+            link, params = self.links[idx]
+            # the netem qdisc moves from below htb to the root
+            reset = params['bw'] is not None and change.get('bw', params['bw']) is None
+            params.update(change)
+            for intf in (link.intf1, link.intf2):
+                batch.add(intf, startup=False, reset=reset, **params)
+        return batch.apply(concurrent=True, quiet=True)
+
+    def run(self):
+        """Apply the steps at their times until the schedule ends or `stop` is called"""
+        self.t_start = time.monotonic()
+
+        for t, changes in self.steps:
+            if self._stop.wait(max(0., self.t_start + t - time.monotonic())):
+                break
+
+            elapsed = self.apply(changes)
+            done = time.monotonic() - self.t_start
+            self.applied.append({'time': t, 'applied': done, 'late': done - t, 'elapsed': elapsed,
+                                 'links': len(changes)})
+            log.info('*** Impairments at {t:.3f} s on {n} links in effect at {d:.3f} s ({e:.1f} ms to apply)\n'
+                     .format(t=t, n=len(changes), d=done, e=elapsed * 1000))
+
+        if not self._stop.is_set():
+            log.info('*** Impairment schedule finished\n')
+
+    def start(self):
+        """Run the schedule in a background thread"""
+        self._thread = threading.Thread(target=self.run, name='ltbnet-schedule', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the schedule and wait for the thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,133 @@
+"""
+Batched tc shaping of link interfaces
+
+Mininet's `TCLink` runs several `tc` processes per interface. `TCBatch` instead collects the commands of all shaped
+interfaces, groups them by network namespace and applies each group with one `tc -batch` process. The qdiscs are
+those of `TCIntf` with its defaults: an htb root qdisc 5: with class 5:1 for the bandwidth and a netem qdisc 10:
+below it, or at the root without a bandwidth limit, for delay, jitter and loss.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+
+from ltbnet.utils import log
+
+
+def is_shaped(bw=None, delay=None, jitter=None, loss=None):
+    """Check if link parameters need tc, following `TCIntf.config`"""
+    return bw is not None or bool(delay) or bool(loss)
+
+
+def tc_commands(dev, bw=None, delay=None, jitter=None, loss=None, update=False, reset=False):
+    """
+    Return the tc batch lines shaping interface `dev`
+
+    The lines replace existing qdiscs. With `update`, they also remove the qdiscs of shaping that no longer
+    applies, so that they change the shaping of configured interfaces. With `reset`, they delete the existing
+    root qdisc first, which is needed when a bandwidth limit is removed.
+    """
+    if not is_shaped(bw, delay, jitter, loss):
+        return ['qdisc del dev {} root'.format(dev)] if update else []
+
+    cmds = ['qdisc del dev {} root'.format(dev)] if reset else []
+    parent = 'root'
+    if bw is not None:
+        cmds.append('qdisc replace dev {} root handle 5:0 htb default 1'.format(dev))
+        cmds.append('class replace dev {} parent 5:0 classid 5:1 htb rate {:f}Mbit burst 15k'.format(dev, bw))
+        parent = 'parent 5:1'
+
+    netem = ''
+    if delay:
+        netem += 'delay {} '.format(delay)
+        if jitter:
+            netem += '{} '.format(jitter)
+    if loss:
+        netem += 'loss {:.5f} '.format(loss)
+    if netem:
+        cmds.append('qdisc replace dev {} {} handle 10: netem {}'.format(dev, parent, netem.strip()))
+    elif bw is not None and update:
+        # neutralize the netem qdisc of earlier shaping, if any
+        cmds.append('qdisc replace dev {} parent 5:1 handle 10: netem delay 0ms'.format(dev))
+
+    return cmds
+
+
+class TCBatch(object):
+    """Collect tc commands of interfaces by network namespace and apply them with `tc -batch`"""
+    def __init__(self):
+        self.lines = {}  # node running the batch -> list of tc batch lines
+        self.root = None  # node in the root namespace
+        self.n_intf = 0
+        self.elapsed = 0.
+
+    def add(self, intf, bw=None, delay=None, jitter=None, loss=None, startup=True, reset=False):
+        """
+        Add the shaping of a Mininet interface. Return True if it needs tc.
+
+        At startup, interfaces without shaping are skipped instead of having their root qdisc deleted. See
+        `tc_commands` for `reset`.
+        """
+        if startup and not is_shaped(bw, delay, jitter, loss):
+            return False
+
+        node = intf.node
+        if getattr(node, 'inNamespace', True):
+            key = node
+        else:
+            key = None
+            self.root = self.root or node
+
+        self.lines.setdefault(key, []).extend(tc_commands(intf.name, bw, delay, jitter, loss, update=not startup,
+                                                            reset=reset))
+        self.n_intf += 1
+        return True
+
+    def apply(self, concurrent=False, quiet=False):
+        """
+        Run one `tc -batch` per namespace and clear the batch. Return the elapsed seconds.
+
+        With `concurrent`, the batches run as concurrent processes started with `node.popen` instead of one after
+        another in the node shells, which also leaves the shells free for other users such as the Mininet CLI.
+        With `quiet`, the summary is logged at the debug level.
+        """
+        t_start = time.perf_counter()
+        n_batch = len(self.lines)
+
+        tmp = tempfile.mkdtemp(prefix='ltbnet-tc-')
+        try:
+            procs = []
+            for i, (node, lines) in enumerate(self.lines.items()):
+                node = node or self.root
+                path = os.path.join(tmp, '{}.tc'.format(i))
+                with open(path, 'w') as f:
+                    f.write('\n'.join(lines) + '\n')
+
+                # -force continues after errors, which are reported in the output
+                if concurrent:
+                    procs.append((node, node.popen(['tc', '-force', '-batch', path])))
+                else:
+                    self.check(node, node.cmd('tc -force -batch {}'.format(path)))
+
+            for node, proc in procs:
+                out, err = proc.communicate()
+                self.check(node, (out or b'') + (err or b''))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.elapsed = time.perf_counter() - t_start
+        (log.debug if quiet else log.info)('*** Shaped {i} interfaces with {b} tc batches in {t:.1f} ms\n'.format(
+            i=self.n_intf, b=n_batch, t=self.elapsed * 1000))
+
+        self.lines = {}
+        self.n_intf = 0
+        return self.elapsed
+
+    @staticmethod
+    def check(node, out):
+        """Log the output of a tc batch as an error"""
+        if isinstance(out, bytes):
+            out = out.decode(errors='replace')
+        if out and out.strip():
+            log.error('*** tc batch on {n}: {o}\n'.format(n=node.name, o=out.strip()))
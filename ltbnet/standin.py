@@ -0,0 +1,287 @@
+"""
+In-process stand-ins for `mininet.topo.Topo` and `mininet.net.Mininet`
+
+The stand-ins record the nodes and links added to a topology and create fake nodes, interfaces and links without
+root privileges, network namespaces or Open vSwitch. They support building and benchmarking LTBNet topologies on
+hosts without Mininet. Processes started with `Node.popen` are recorded. MiniPMUs started with `--notify` write the
+readiness line of `ltbnet.launcher` and run until they are signalled; other processes exit at once without output.
+"""
+
+import os
+import signal
+import subprocess
+
+from ltbnet.launcher import READY
+
+
+class Topo(object):
+    """Stand-in for `mininet.topo.Topo` recording `addHost`, `addSwitch` and `addLink` calls"""
+    def __init__(self, *args, **params):
+        self.node_info = {}  # node name -> params, in insertion order
+        self.switch_names = set()
+        self.link_info = []  # list of (node1, node2, params)
+        self.calls = []  # list of (method, args)
+        self.build(*args, **params)
+
+    def build(self, *args, **params):
+        pass
+
+    def addNode(self, name, **opts):
+        self.node_info[name] = opts
+        return name
+
+    def addHost(self, name, **opts):
+        self.calls.append(('addHost', name))
+        return self.addNode(name, **opts)
+
+    def addSwitch(self, name, **opts):
+        self.calls.append(('addSwitch', name))
+        self.switch_names.add(name)
+        return self.addNode(name, isSwitch=True, **opts)
+
+    def addLink(self, node1, node2, port1=None, port2=None, key=None, **opts):
+        self.calls.append(('addLink', (node1, node2)))
+        opts = dict(opts, node1=node1, node2=node2)
+        if port1 is not None:
+            opts['port1'] = port1
+        if port2 is not None:
+            opts['port2'] = port2
+        self.link_info.append((node1, node2, opts))
+        return key if key is not None else len(self.link_info) - 1
+
+    def nodes(self, sort=True):
+        names = list(self.node_info)
+        return sorted(names) if sort else names
+
+    def isSwitch(self, name):
+        return name in self.switch_names
+
+    def hosts(self, sort=True):
+        return [n for n in self.nodes(sort) if not self.isSwitch(n)]
+
+    def switches(self, sort=True):
+        return [n for n in self.nodes(sort) if self.isSwitch(n)]
+
+    def links(self, sort=False, withKeys=False, withInfo=False):
+        out = []
+        for key, (node1, node2, info) in enumerate(self.link_info):
+            if sort and node1 > node2:
+                node1, node2 = node2, node1
+            item = (node1, node2)
+            if withKeys:
+                item += (key, )
+            if withInfo:
+                item += (info, )
+            out.append(item)
+        return out
+
+    def nodeInfo(self, name):
+        return self.node_info[name]
+
+    def linkInfo(self, src, dst, key=None):
+        for node1, node2, info in self.link_info:
+            if (node1, node2) in ((src, dst), (dst, src)):
+                return info
+
+
+class Intf(object):
+    """Fake network interface"""
+    def __init__(self, name, node=None, port=None, link=None, **params):
+        self.name = name
+        self.node = node
+        self.link = link
+        self.params = params
+        if node is not None:
+            node.addIntf(self, port)
+
+    def __repr__(self):
+        return '<{c} {n}>'.format(c=type(self).__name__, n=self.name)
+
+    def __str__(self):
+        return self.name
+
+
+class Link(object):
+    """Fake link connecting two fake interfaces"""
+    def __init__(self, node1, node2, port1=None, port2=None, **params):
+        if port1 is None:
+            port1 = node1.newPort()
+        if port2 is None:
+            port2 = node2.newPort()
+
+        self.intf1 = Intf('{n}-eth{p}'.format(n=node1.name, p=port1), node=node1, port=port1, link=self)
+        self.intf2 = Intf('{n}-eth{p}'.format(n=node2.name, p=port2), node=node2, port=port2, link=self)
+        self.params = params
+
+
+class Node(object):
+    """Fake Mininet node recording the commands it is given"""
+    portBase = 0
+    inNamespace = True
+
+    def __init__(self, name, **params):
+        self.name = name
+        self.params = params
+        self.intfs = {}
+        self.ports = {}
+        self.cmds = []
+
+    def newPort(self):
+        return max(self.intfs) + 1 if self.intfs else self.portBase
+
+    def addIntf(self, intf, port=None):
+        if port is None:
+            port = self.newPort()
+        self.intfs[port] = intf
+        self.ports[intf] = port
+
+    def defaultIntf(self):
+        return self.intfs[min(self.intfs)] if self.intfs else None
+
+    def cmd(self, *args, **kwargs):
+        self.cmds.append(' '.join(str(x) for x in args))
+        return ''
+
+    def popen(self, *args, **kwargs):
+        cmd = ' '.join(str(x) for x in (args[0] if len(args) == 1 and isinstance(args[0], (list, tuple)) else args))
+        self.cmds.append(cmd)
+        return Popen(cmd)
+
+    def __repr__(self):
+        return '<{c} {n}>'.format(c=type(self).__name__, n=self.name)
+
+
+class Popen(object):
+    """Stand-in for the `subprocess.Popen` of `Node.popen` with the command string `cmd`. A `minipmu --notify`
+    writes the readiness line with its port and runs until it is signalled. Other commands have exited with code 0
+    without output."""
+    def __init__(self, cmd):
+        self.args = cmd
+        self.pid = None
+        self.returncode = 0
+        self.stderr = None
+
+        output = b''
+        words = cmd.split()
+        if len(words) > 1 and os.path.basename(words[0]) == 'minipmu' and '--notify' in words:
+            output = '{r} {p}\n'.format(r=READY, p=words[1]).encode()
+            self.returncode = None
+
+        read, write = os.pipe()
+        os.write(write, output)
+        os.close(write)
+        self.stdout = os.fdopen(read, 'rb', 0)
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.returncode is None:
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def communicate(self, input=None, timeout=None):
+        out = self.stdout.read()
+        self.stdout.close()
+        return out, b''
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            self.returncode = -sig
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class Host(Node):
+    """Fake Mininet host"""
+    pass
+
+
+class Switch(Node):
+    """Fake Mininet switch in the root namespace. Port 0 is the loop-back interface as in Mininet."""
+    portBase = 1
+    inNamespace = False
+
+    def __init__(self, name, dpid=None, **params):
+        super(Switch, self).__init__(name, **params)
+        self.dpid = self.defaultDpid(dpid)
+
+    def defaultDpid(self, dpid=None):
+        if dpid:
+            dpid = dpid.replace(':', '')
+        else:
+            digits = ''.join(c for c in self.name if c.isdigit())
+            dpid = hex(int(digits))[2:] if digits else '1'
+        return dpid.zfill(16)
+
+    def addIntf(self, intf, port=None):
+        if not self.intfs:
+            lo = Intf.__new__(Intf)
+            lo.name, lo.node, lo.link, lo.params = 'lo', self, None, {}
+            self.intfs[0] = lo
+            self.ports[lo] = 0
+        super(Switch, self).addIntf(intf, port)
+
+
+class Mininet(object):
+    """Stand-in for `mininet.net.Mininet` building fake nodes and links from a topology"""
+    def __init__(self, topo=None, **params):
+        self.topo = topo
+        self.params = params
+        self.hosts = []
+        self.switches = []
+        self.links = []
+        self.nameToNode = {}
+        self.started = False
+
+        if topo is not None:
+            self.buildFromTopo(topo)
+
+    def addHost(self, name, **params):
+        node = Host(name, **params)
+        self.hosts.append(node)
+        self.nameToNode[name] = node
+        return node
+
+    def addSwitch(self, name, **params):
+        node = Switch(name, **params)
+        self.switches.append(node)
+        self.nameToNode[name] = node
+        return node
+
+    def addLink(self, node1, node2, port1=None, port2=None, **params):
+        node1 = node1 if isinstance(node1, Node) else self.nameToNode[node1]
+        node2 = node2 if isinstance(node2, Node) else self.nameToNode[node2]
+        link = Link(node1, node2, port1, port2, **params)
+        self.links.append(link)
+        return link
+
+    def buildFromTopo(self, topo):
+        for name in topo.hosts():
+            self.addHost(name, **topo.nodeInfo(name))
+
+        for name in topo.switches():
+            params = dict(topo.nodeInfo(name))
+            params.pop('isSwitch', None)
+            self.addSwitch(name, **params)
+
+        # the link params hold the nodes in the order they were linked, as in Mininet
+        for _, _, params in topo.links(sort=True, withInfo=True):
+            self.addLink(**params)
+
+    def get(self, *args):
+        nodes = [self.nameToNode[n] for n in args]
+        return nodes[0] if len(nodes) == 1 else nodes
+
+    def __getitem__(self, name):
+        return self.nameToNode[name]
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
@@ -0,0 +1,216 @@
+"""Measurement storage and recordings of MiniPMU"""
+
+import os
+import json
+import struct
+
+import numpy as np
+
+
+class RingBuffer(object):
+    """
+    Fixed-size circular buffer of rows allocated once
+
+    Every row is written twice, at its slot and at the slot `capacity` rows further, so that the latest rows are
+    always contiguous in memory. `last` thus returns a view of them without copying, at the cost of twice the memory
+    and two row writes per append.
+
+    Parameters
+    ----------
+    capacity : int
+        number of rows kept
+    width : int
+        number of columns of each row
+    dtype : numpy.dtype
+        data type of the values
+    """
+    def __init__(self, capacity, width, dtype=float):
+        if capacity < 1:
+            raise ValueError('RingBuffer capacity must be positive, got {}'.format(capacity))
+        self.capacity = capacity
+        self.width = width
+        self._buf = np.zeros((2 * capacity, width), dtype=dtype)
+        self._pos = 0  # slot of the next row
+        self.n = 0  # number of rows held
+        self.total = 0  # number of rows appended since the last clear
+
+    def __len__(self):
+        return self.n
+
+    def append(self, row):
+        """Append one row of `width` values, or a scalar for every column, overwriting the oldest row when full"""
+        pos = self._pos
+        self._buf[pos] = row
+        self._buf[pos + self.capacity] = self._buf[pos]
+
+        self._pos = pos + 1 if pos + 1 < self.capacity else 0
+        if self.n < self.capacity:
+            self.n += 1
+        self.total += 1
+
+    def last(self, n=None):
+        """
+        Return a read-only view of the latest `n` rows, oldest first, without copying. All rows if `n` is None.
+
+        The view shows the buffer itself, so rows appended later overwrite its content once the buffer wraps
+        around. Copy it to keep the values.
+        """
+        n = self.n if n is None else min(n, self.n)
+        end = self._pos + self.capacity
+        view = self._buf[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def latest(self):
+        """Return a read-only view of the latest row, or None if empty"""
+        if not self.n:
+            return None
+        return self.last(1)[0]
+
+    def clear(self):
+        """Drop all rows without releasing the memory"""
+        self._pos = 0
+        self.n = 0
+        self.total = 0
+
+
+class Recording(object):
+    """
+    Growable recording of measurements, memory-mapped from a file or held in memory
+
+    Each row holds the time followed by the `columns` values. A recording file starts with a header of
+    `HEADER_SIZE` bytes: the magic `MAGIC`, the format version, the number of columns, the number of rows and the
+    reporting rate packed as `HEADER_FORMAT`, followed by JSON metadata such as the PMU indices. The rows follow as
+    little-endian float64. The file grows by `chunk` rows or by half of its size, whichever is larger, and the row
+    count in the header is updated after each row, so that a recording survives the end of the process. Rows are
+    read through the memory map, so that replaying does not load the file.
+
+    Parameters
+    ----------
+    path : str
+        recording file, opened if it exists and created otherwise. The recording is held in memory if None.
+    columns : int
+        number of values in each row
+    rate : float
+        reporting rate in frames per second
+    meta : dict
+        JSON metadata stored in the header of new files
+    chunk : int
+        minimum number of rows added when the recording grows
+    """
+    MAGIC = b'LTBNREC\x00'
+    VERSION = 1
+    HEADER_FORMAT = '<8sIIQd'
+    HEADER_SIZE = 4096
+    COUNT_OFFSET = 16  # offset of the row count in the header
+
+    def __init__(self, path, columns, rate=30., meta=None, chunk=30 * 600):
+        self.path = path
+        self.columns = columns
+        self.width = columns + 1
+        self.rate = rate
+        self.meta = dict(meta or {})
+        self.chunk = chunk
+
+        self.n = 0
+        self._rows = None
+        self._count = None  # memory-mapped row count of the file
+
+        if path is None:
+            self._rows = np.zeros((chunk, self.width))
+        elif os.path.isfile(path) and os.path.getsize(path) >= self.HEADER_SIZE:
+            self._open()
+        else:
+            self._create()
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def capacity(self):
+        return self._rows.shape[0]
+
+    def _create(self):
+        meta = json.dumps(self.meta).encode()
+        header = struct.pack(self.HEADER_FORMAT, self.MAGIC, self.VERSION, self.columns, 0, self.rate) + meta
+        if len(header) > self.HEADER_SIZE:
+            raise ValueError('Recording metadata of {} bytes does not fit in the header'.format(len(meta)))
+
+        with open(self.path, 'wb') as f:
+            f.write(header.ljust(self.HEADER_SIZE, b'\x00'))
+            f.truncate(self.HEADER_SIZE + self.chunk * self.width * 8)
+        self._map()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            header = f.read(self.HEADER_SIZE)
+
+        size = struct.calcsize(self.HEADER_FORMAT)
+        magic, version, columns, count, rate = struct.unpack(self.HEADER_FORMAT, header[:size])
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError('{} is not an LTBNet recording of version {}'.format(self.path, self.VERSION))
+        if columns != self.columns:
+            raise ValueError('Recording {p} has {c} columns, expected {e}'.format(p=self.path, c=columns,
+                                                                                e=self.columns))
+        self.rate = rate
+        self.meta = json.loads(header[size:].rstrip(b'\x00').decode() or '{}')
+
+        # leave room for new rows
+        rows = (os.path.getsize(self.path) - self.HEADER_SIZE) // (self.width * 8)
+        if rows <= count:
+            with open(self.path, 'r+b') as f:
+                f.truncate(self.HEADER_SIZE + (count + self.chunk) * self.width * 8)
+        self._map()
+        self.n = int(count)
+
+    def _map(self):
+        rows = (os.path.getsize(self.path) - self.HEADER_SIZE) // (self.width * 8)
+        self._rows = np.memmap(self.path, dtype='<f8', mode='r+', offset=self.HEADER_SIZE, shape=(rows, self.width))
+        self._count = np.memmap(self.path, dtype='<u8', mode='r+', offset=self.COUNT_OFFSET, shape=(1, ))
+
+    def _grow(self):
+        rows = self.capacity + max(self.chunk, self.capacity // 2)
+        if self.path is None:
+            grown = np.zeros((rows, self.width))
+            grown[:self.n] = self._rows[:self.n]
+            self._rows = grown
+            return
+
+        self._rows.flush()
+        self._rows = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(self.HEADER_SIZE + rows * self.width * 8)
+        self._map()
+
+    def append(self, t, values):
+        """Append the values `values` measured at time `t`"""
+        if self.n == self.capacity:
+            self._grow()
+        row = self._rows[self.n]
+        row[0] = t
+        row[1:] = values
+        self.n += 1
+        if self._count is not None:
+            self._count[0] = self.n
+
+    def row(self, i):
+        """Return the time and a view of the values of row `i`"""
+        row = self._rows[i]
+        return row[0], row[1:]
+
+    def clear(self):
+        """Drop all rows. The file keeps its size."""
+        self.n = 0
+        if self._count is not None:
+            self._count[0] = 0
+
+    def flush(self):
+        """Write the rows and the row count of a recording file to disk"""
+        if self._count is not None:
+            self._rows.flush()
+            self._count.flush()
+
+    def close(self):
+        """Flush and unmap a recording file"""
+        self.flush()
+        self._rows = self._count = None
@@ -1,11 +1,63 @@
 import re
-from mininet import log
+import sys
+import logging
 
-from mininet.util import quietRun
+try:
+    from mininet import log
+except ImportError:
+    log = None
+
+
+class StdLog(object):
+    """Stand-in for `mininet.log` on hosts without Mininet. Arguments are joined with spaces as in Mininet."""
+    levels = {'debug': logging.DEBUG,
+              'info': logging.INFO,
+              'output': logging.INFO,
+              'warning': logging.WARNING,
+              'warn': logging.WARNING,
+              'error': logging.ERROR,
+              'critical': logging.CRITICAL,
+              }
+
+    def __init__(self, name='ltbnet'):
+        self.logger = logging.getLogger(name)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.terminator = ''
+            self.logger.addHandler(handler)
+            self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+    def setLogLevel(self, level='info'):
+        self.logger.setLevel(self.levels.get(level, logging.INFO))
+
+    def _log(self, level, *args):
+        self.logger.log(level, ' '.join(str(x) for x in args))
+
+    def debug(self, *args):
+        self._log(logging.DEBUG, *args)
+
+    def info(self, *args):
+        self._log(logging.INFO, *args)
+
+    def output(self, *args):
+        self._log(logging.INFO, *args)
+
+    def warn(self, *args):
+        self._log(logging.WARNING, *args)
+
+    def error(self, *args):
+        self._log(logging.ERROR, *args)
+
+
+if log is None:
+    log = StdLog()
 
 
 def check_intf(intf):
     "Make sure intf exists and is not configured."
+    from mininet.util import quietRun
+
     config = quietRun( 'ifconfig %s 2>/dev/null' % intf, shell=True )
     if not config:
         log.error( 'Error:', intf, 'does not exist!\n' )
@@ -15,3 +67,24 @@ def check_intf(intf):
         log.error( 'Error:', intf, 'has an IP address,'
                'and is probably in use!\n' )
         exit( 1 )
+
+
+def parse_cpus(spec):
+    """Parse a CPU list such as `2-5,8` into a sorted list of CPU numbers"""
+    cpus = set()
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise ValueError('Invalid CPU list <{}>'.format(spec))
+        if first < 0 or last < first:
+            raise ValueError('Invalid CPU range <{}> in <{}>'.format(part, spec))
+        cpus.update(range(first, last + 1))
+    if not cpus:
+        raise ValueError('Empty CPU list <{}>'.format(spec))
+    return sorted(cpus)
@@ -13,6 +13,9 @@ setup(name='ltbnet',
           'console_scripts': [
               'ltbnet = ltbnet.main:main',
               'minipmu = ltbnet.minipmu:main',
+              'minipmu-host = ltbnet.minipmu:host_main',
+              'ltbnet-bench = ltbnet.benchmark:main',
+              'ltbnet-gen = ltbnet.generator:main',
           ]
       },
       install_requires=['numpy', 'networkx', 'pydot'],
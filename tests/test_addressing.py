@@ -0,0 +1,103 @@
+import os
+import ipaddress
+
+import pytest
+
+from ltbnet.addressing import AddressPlan
+from ltbnet.network import Network
+from ltbnet.parser import iter_config
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def hosts(group, n):
+    return [((group, i), None) for i in range(n)]
+
+
+def test_one_subnet_per_group_with_reserved_gateway():
+    plan = AddressPlan('10.0.0.0/16')
+    plan.add_group('A', hosts('A', 3))
+    plan.add_group('B', hosts('B', 300))
+    plan.solve()
+
+    a, b = plan.subnets['A'], plan.subnets['B']
+    assert not a.overlaps(b)
+    # groups get a /24, or a larger subnet for more hosts
+    assert a.prefixlen == 24
+    assert b.prefixlen == 23
+
+    assert plan.gateway('A') == ipaddress.ip_address('10.0.0.1')
+    assert [plan.addresses[('A', i)] for i in range(3)] == [('10.0.0.2', 24), ('10.0.0.3', 24), ('10.0.0.4', 24)]
+    assert len({ip for ip, _ in plan.addresses.values()}) == 303
+
+
+def test_fixed_prefixlen():
+    plan = AddressPlan('10.0.0.0/16', prefixlen=26)
+    plan.add_group('A', hosts('A', 2))
+    plan.solve()
+    assert plan.subnets['A'].prefixlen == 26
+
+    with pytest.raises(ValueError):
+        AddressPlan('10.0.0.0/16', prefixlen=28).group_prefixlen(20)
+    with pytest.raises(ValueError):
+        AddressPlan('10.0.0.0/16', prefixlen=8)
+
+
+def test_explicit_ips_pick_their_subnet():
+    plan = AddressPlan('10.0.0.0/16')
+    plan.add_group('A', [('a0', None), ('a1', '10.0.5.7')])
+    plan.add_group('B', [('b0', None), ('b1', '10.0.9.3/16')])
+    plan.solve()
+
+    assert plan.subnets['A'] == ipaddress.ip_network('10.0.5.0/24')
+    assert plan.addresses['a1'] == ('10.0.5.7', 24)
+    # an explicit prefix length is kept
+    assert plan.addresses['b1'] == ('10.0.9.3', 16)
+    assert plan.outside == {}
+
+
+def test_explicit_ips_outside_their_subnet_get_the_group_prefix():
+    plan = AddressPlan('10.0.0.0/16')
+    # both groups claim 10.0.1.0/24, so neither gets it
+    plan.add_group('A', [('a0', '10.0.1.10'), ('a1', None)])
+    plan.add_group('B', [('b0', '10.0.1.20'), ('b1', '172.16.0.5')])
+    plan.solve()
+
+    for group in ('A', 'B'):
+        assert not plan.subnets[group].overlaps(ipaddress.ip_network('10.0.1.0/24'))
+    assert plan.addresses['a0'] == ('10.0.1.10', plan.subnets['A'].prefixlen)
+    assert plan.addresses['b1'] == ('172.16.0.5', plan.subnets['B'].prefixlen)
+    assert plan.outside == {'A': ['a0'], 'B': ['b0', 'b1']}
+    # generated addresses avoid the explicit ones
+    assert plan.addresses['a1'][0] not in ('10.0.1.10', '10.0.1.20')
+
+
+def test_full_supernet():
+    plan = AddressPlan('10.0.0.0/30')
+    plan.add_group('A', hosts('A', 1))
+    plan.add_group('B', hosts('B', 1))
+    with pytest.raises(ValueError):
+        plan.solve()
+
+
+def test_transit_subnets_and_routes():
+    plan = AddressPlan('10.0.0.0/16')
+    plan.add_group('A', hosts('A', 2))
+    plan.solve()
+
+    (ip_a, p_a), (ip_b, p_b) = plan.transit('L1')
+    transit = plan.transits['L1']
+    assert transit.prefixlen == p_a == p_b == 30
+    assert not transit.overlaps(plan.subnets['A'])
+    assert [ip_a, ip_b] == [str(ip) for ip in transit.hosts()]
+
+    assert plan.routes('A') == []
+    assert plan.routes('A', routed=True) == [(str(plan.subnets['A']), None), ('10.0.0.0/16', '10.0.0.1')]
+
+
+def test_network_hosts_without_routers_get_the_region_prefix():
+    network = Network().setup(iter_config('config_5pmu.csv', DATA), topology=False)
+
+    # the explicit IPs share 192.168.1.0/24 across the Regions
+    assert set(network.PMU.prefixlen) == set(network.PDC.prefixlen) == {24}
+    assert all(routes == [] for routes in network.routes.values())
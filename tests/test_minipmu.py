@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('dime')
+pytest.importorskip('synchrophasor')
+
+from ltbnet.minipmu import MiniPMU
+
+
+def test_bus_vn_is_one_indexed():
+    vn = [110., 230., 345., 500.]
+    mini = MiniPMU(name='PMU_test', pmu_idx=[1, 3, 4], dimec=object(), pmu_port=0)
+    mini.SysParam = {'Bus': {'Vn': vn}}
+    mini.SysName = {'Bus': ['B1', 'B2', 'B3', 'B4']}
+
+    mini.get_bus_name()
+    mini.get_bus_Vn()
+    mini.init_frame()
+
+    # bus k gets the name and Vn at k - 1
+    assert mini.bus_name == ['B1', 'B3', 'B4']
+    assert mini.Vn == [110e3, 345e3, 500e3]
+    np.testing.assert_allclose(mini.scale[:3], [110e3, 345e3, 500e3])
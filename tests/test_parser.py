@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from ltbnet.parser import ConfigError, iter_config, make_row, parse_config, to_ms, to_time
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def test_to_ms_units():
+    assert to_ms('5ms') == 5.
+    assert to_ms('1.5s') == 1500.
+    assert to_ms('250us') == pytest.approx(0.25)
+    # numbers without a unit are microseconds as in tc
+    assert to_ms('500') == pytest.approx(0.5)
+    assert to_ms(500) == pytest.approx(0.5)
+    assert to_ms('None') is None
+    with pytest.raises(ValueError):
+        to_ms('5 parsecs')
+
+
+def test_to_time_keeps_the_string():
+    assert to_time(' 2ms ') == '2ms'
+    assert to_time('') is None
+    with pytest.raises(ValueError):
+        to_time('fast')
+
+
+def test_make_row_types_applicable_fields():
+    row = make_row({'Type': 'PMU', 'Idx': 'P1', 'Region': 'R', 'PMU_IDX': '3', 'Longitude': '1.5',
+                    'Delay': '5ms', 'IP': 'None'})
+
+    assert row['PMU_IDX'] == 3
+    assert row['Longitude'] == 1.5
+    assert row['IP'] is None
+    # Delay does not apply to PMUs
+    assert row['Delay'] is None
+
+
+def test_make_row_link_shaping():
+    row = make_row({'Type': 'Link', 'Idx': 'L1', 'From': 'a', 'To': 'b', 'Delay': '5ms', 'Jitter': '1ms',
+                    'BW': '10', 'Loss': 'None'})
+
+    assert (row['Delay'], row['Jitter'], row['BW'], row['Loss']) == ('5ms', '1ms', 10., None)
+
+
+def test_make_row_errors_name_file_and_line():
+    with pytest.raises(ConfigError, match='config.csv:7: invalid Jitter'):
+        make_row({'Type': 'Link', 'From': 'a', 'To': 'b', 'Jitter': 'x'}, 'config.csv', 7)
+    with pytest.raises(ConfigError, match='PMU_IDX is required'):
+        make_row({'Type': 'PMU', 'Idx': 'P1'})
+
+
+def test_make_row_skips_unknown_types():
+    assert make_row({'Type': 'Antenna', 'Idx': 'A1'}) is None
+
+
+def test_csv_and_json_configs_match():
+    csv_rows = parse_config('config_5pmu.csv', DATA)
+    json_rows = parse_config('config_5pmu.json', DATA)
+
+    assert csv_rows == json_rows
+    assert sum(row['Type'] == 'PMU' for row in csv_rows) == 5
+
+
+def test_csv_skips_comments_and_unknown_types(tmp_path):
+    path = tmp_path / 'config.csv'
+    path.write_text('Idx,Type,Region\n'
+                    '# comment\n'
+                    'R1,Region,R1\n'
+                    'X1,Antenna,R1\n')
+
+    rows = list(iter_config(str(path)))
+    assert [row['Idx'] for row in rows] == ['R1']
+
+
+def test_csv_field_count_error(tmp_path):
+    path = tmp_path / 'config.csv'
+    path.write_text('Idx,Type,Region\n'
+                    '\n'
+                    'R1,Region\n')
+
+    with pytest.raises(ConfigError, match=':3: expected 3 fields'):
+        list(iter_config(str(path)))
+
+
+def test_json_errors(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text('{"Idx": "R1"}')
+    with pytest.raises(ConfigError, match='expected a JSON array'):
+        list(iter_config(str(path)))
+
+    path.write_text('[{"Idx": "R1", "Type": "Region"}')
+    with pytest.raises(ConfigError):
+        list(iter_config(str(path)))
@@ -0,0 +1,52 @@
+import os
+
+from ltbnet.network import Network
+from ltbnet.parser import iter_config
+from ltbnet.routing import router_links
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def routed_network():
+    return Network().setup(iter_config('config_5pmu_routed.csv', DATA), topology=False)
+
+
+def test_router_links():
+    network = routed_network()
+    access, transit = router_links(network)
+    router = network.Router
+
+    assert sorted((router.idx[r], switch) for r, switch in access) == [('R_AESO', 'S_AESO'), ('R_BCTC', 'S_BCTC')]
+    assert [(router.idx[a], router.idx[b], network.Link.idx[e]) for a, b, e in transit] == \
+        [('R_BCTC', 'R_AESO', 'L_R_BCTC_AESO')]
+
+
+def test_router_interfaces_and_gateways():
+    network = routed_network()
+    aeso = network.subnets['AESO']
+
+    interfaces = network.interfaces['R_AESO']
+    # the Router holds the gateway of its Region and one end of the /30 transit subnet
+    assert interfaces['s0'] == '{}/24'.format(aeso.replace('.0/24', '.1'))
+    assert interfaces['R_BCTC'].endswith('/30')
+    assert network.interfaces['R_BCTC']['R_AESO'].endswith('/30')
+
+
+def test_routes():
+    network = routed_network()
+    aeso, bctc = network.subnets['AESO'], network.subnets['BCTC']
+    gateway = aeso.replace('.0/24', '.1')
+
+    # hosts reach their subnet on-link and the rest of the supernet through the gateway
+    assert network.routes['DEVERS1'] == [(aeso, None), ('192.168.0.0/16', gateway)]
+
+    # each Router routes the other Region over the transit link
+    transit_bctc = network.interfaces['R_BCTC']['R_AESO'].split('/')[0]
+    transit_aeso = network.interfaces['R_AESO']['R_BCTC'].split('/')[0]
+    assert network.routes['R_AESO'] == [(bctc, transit_bctc)]
+    assert network.routes['R_BCTC'] == [(aeso, transit_aeso)]
+
+
+def test_configs_without_routers_have_no_router_interfaces():
+    network = Network().setup(iter_config('config_5pmu.csv', DATA), topology=False)
+    assert network.interfaces == {}
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from ltbnet.parser import ConfigError
+from ltbnet.schedule import load_schedule, make_step
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def test_make_step_empty_fields_keep_and_none_clears():
+    t, link, changes = make_step({'Time': '5', 'Link': 'L1', 'Delay': '', 'BW': '10', 'Loss': 'None',
+                                  'Jitter': '1ms'})
+
+    assert (t, link) == (5., 'L1')
+    assert changes == {'bw': 10., 'loss': None, 'jitter': '1ms'}
+
+
+def test_make_step_errors():
+    with pytest.raises(ConfigError, match='invalid Time'):
+        make_step({'Time': 'soon', 'Link': 'L1'})
+    with pytest.raises(ConfigError, match='Link is required'):
+        make_step({'Time': '1'})
+    with pytest.raises(ConfigError, match='invalid Delay'):
+        make_step({'Time': '1', 'Link': 'L1', 'Delay': 'long'})
+
+
+def test_example_schedule():
+    steps = load_schedule('schedule_5pmu.csv', DATA)
+
+    assert [t for t, _ in steps] == [10., 20., 30., 40., 45., 60.]
+    assert steps[3][1] == [('L_DEVERS1', {'loss': 100.})]
+    # back to the configured values of L_BCTC_AESO
+    assert steps[-1][1] == [('L_BCTC_AESO', {'delay': None, 'bw': 10., 'loss': None})]
+
+
+def test_steps_at_the_same_time_are_grouped_in_order(tmp_path):
+    path = tmp_path / 'schedule.json'
+    path.write_text('[{"Time": 2, "Link": "L2", "Loss": 1},'
+                    ' {"Time": 1, "Link": "L1", "Delay": "5ms"},'
+                    ' {"Time": 2, "Link": "L1", "Delay": "None"}]')
+
+    steps = load_schedule(str(path))
+    assert steps == [(1., [('L1', {'delay': '5ms'})]),
+                     (2., [('L2', {'loss': 1.}), ('L1', {'delay': None})])]
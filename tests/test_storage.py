@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from ltbnet.storage import RingBuffer, Recording
+
+
+def test_ring_buffer_keeps_latest_rows_in_order():
+    buf = RingBuffer(3, 2)
+    for i in range(5):
+        buf.append([i, 10 * i])
+
+    assert len(buf) == 3
+    assert buf.total == 5
+    np.testing.assert_array_equal(buf.last(), [[2, 20], [3, 30], [4, 40]])
+    np.testing.assert_array_equal(buf.last(2), [[3, 30], [4, 40]])
+    np.testing.assert_array_equal(buf.latest(), [4, 40])
+
+
+def test_ring_buffer_views_are_read_only():
+    buf = RingBuffer(2, 1)
+    buf.append(1.)
+    with pytest.raises(ValueError):
+        buf.last()[0] = 2.
+
+
+def test_ring_buffer_clear():
+    buf = RingBuffer(2, 1)
+    buf.append(1.)
+    buf.clear()
+
+    assert len(buf) == 0
+    assert buf.latest() is None
+    assert buf.last().shape == (0, 1)
+
+
+def test_ring_buffer_rejects_zero_capacity():
+    with pytest.raises(ValueError):
+        RingBuffer(0, 1)
+
+
+def test_recording_in_memory_grows():
+    rec = Recording(None, 2, chunk=2)
+    for i in range(5):
+        rec.append(i / 30., [i, -i])
+
+    assert len(rec) == 5
+    assert rec.capacity >= 5
+    t, values = rec.row(4)
+    assert t == pytest.approx(4 / 30.)
+    np.testing.assert_array_equal(values, [4, -4])
+
+
+def test_recording_file_survives_reopening(tmp_path):
+    path = str(tmp_path / 'pmu.rec')
+    rec = Recording(path, 3, meta={'pmu_idx': [1]}, chunk=2)
+    for i in range(3):
+        rec.append(float(i), [i, i + 1, i + 2])
+    rec.close()
+
+    rec = Recording(path, 3)
+    assert len(rec) == 3
+    assert rec.meta == {'pmu_idx': [1]}
+    np.testing.assert_array_equal(rec.row(2)[1], [2, 3, 4])
+
+    # appending continues after the recorded rows
+    rec.append(3., [0, 0, 0])
+    rec.close()
+    assert len(Recording(path, 3)) == 4
+
+
+def test_recording_clear_resets_the_file_count(tmp_path):
+    path = str(tmp_path / 'pmu.rec')
+    rec = Recording(path, 1)
+    rec.append(0., [1.])
+    rec.clear()
+    rec.close()
+
+    assert len(Recording(path, 1)) == 0
+
+
+def test_recording_rejects_other_files(tmp_path):
+    path = str(tmp_path / 'pmu.rec')
+    Recording(path, 3).close()
+    with pytest.raises(ValueError):
+        Recording(path, 2)
+
+    other = tmp_path / 'other.rec'
+    other.write_bytes(b'\x00' * Recording.HEADER_SIZE)
+    with pytest.raises(ValueError):
+        Recording(str(other), 3)